@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
+import importlib.util
 import os
 from pathlib import Path
 #AUTH_USER_MODEL = 'rentals.CustomUser'
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # في البداية ليشمل القياس استعلامات الجلسة والمستخدم أيضا
+    'rentals.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,9 +55,10 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'bait_alhamad.urls'
 
+# المحرك هو DjangoTemplates نفسه مع قياس زمن العرض لـ PerformanceMiddleware
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'rentals.middleware.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -118,8 +122,93 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# المستندات تُخزن باسم بصمة محتواها فلا يتكرر الملف نفسه على القرص
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'documents': {'BACKEND': 'rentals.storage.ContentAddressedStorage'},
+}
+# plotly.js يُقدَّم كملف ثابت واحد من حزمة plotly بدلا من تضمينه داخل كل صفحة تقرير
+STATICFILES_DIRS = []
+_plotly_spec = importlib.util.find_spec('plotly')
+if _plotly_spec is not None:
+    STATICFILES_DIRS.append(('plotly', os.path.join(_plotly_spec.submodule_search_locations[0], 'package_data')))
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# الكاش: ذاكرة كل عملية افتراضيا، أو مجلد ملفات يتشاركه كل عمال الخادم حتى يصل إبطال
+# الإشارات في عملية إلى البقية (RENTALS_CACHE_BACKEND=file)
+RENTALS_CACHE_BACKEND = os.environ.get('RENTALS_CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {
+        'locmem': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'rentals',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'file': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache', 'django'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }[RENTALS_CACHE_BACKEND],
+}
+# مدة بقاء صفحات القوائم المخزنة؛ الإبطال يتم قبلها برفع الإصدار عند أي تغيير
+RENTALS_RESPONSE_CACHE_TIMEOUT = 24 * 60 * 60
+# مدة بقاء أرقام الإصدارات والقيم المبنية عليها (لقطة لوحة التحكم، الرسوم، ملخص التقارير)
+RENTALS_CACHE_TIMEOUT = 24 * 60 * 60
+
+# عدد الصفوف في كل صفحة من قوائم rentals (يمكن تغييره بالمعامل page_size حتى الحد الأقصى)
+RENTALS_PAGE_SIZE = 50
+RENTALS_MAX_PAGE_SIZE = 500
+# أقصى عدد كائنات في طلب إنشاء أو تحديث جماعي عبر الواجهة البرمجية
+RENTALS_API_MAX_BATCH = 1000
+# رموز الواجهة البرمجية للسكربتات: الطلب بالترويسة Authorization: Bearer <token> يعمل باسم
+# صاحب الرمز دون جلسة ولا CSRF؛ RENTALS_API_TOKENS=username:token,username:token
+RENTALS_API_TOKENS = {
+    token: username
+    for username, token in (item.split(':', 1) for item in os.environ.get('RENTALS_API_TOKENS', '').split(',') if ':' in item)
+}
+
+# توليد فواتير PDF: عدد عمليات WeasyPrint ومكان حفظ الملفات المولدة
+INVOICE_PDF_WORKERS = 2
+INVOICE_PDF_TIMEOUT = 60
+INVOICE_PDF_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'invoice_pdfs')
+
+# خلف nginx: مسار داخلي (internal) يخدم MEDIA_ROOT، فيُرسل الملف بـ X-Accel-Redirect بدلا من Django
+DOCUMENT_ACCEL_REDIRECT = None
+
+# الصور المصغرة للمستندات: عدد عمليات التوليد في الخلفية وأقصى بُعد بالبكسل
+THUMBNAIL_WORKERS = 1
+THUMBNAIL_SIZE = 240
+
+# قياس الأداء: الطلب الذي يتجاوز أحد الحدين يُسجل في rentals.performance، و /metrics/
+# مفتوح للموظفين أو لـ Prometheus بالترويسة Authorization: Bearer <token>
+RENTALS_SLOW_REQUEST_MS = 500
+RENTALS_SLOW_REQUEST_QUERIES = 50
+RENTALS_METRICS_TOKEN = os.environ.get('RENTALS_METRICS_TOKEN')
+
+# طابور مهام الخلفية (manage.py run_jobs): عدد الخيوط أو العمليات، المهلة الأولى لإعادة المحاولة
+# بالثواني وتتضاعف مع كل فشل، مهلة المهمة قبل اعتبار عاملها متوقفا، ومدة بقاء المهام المنتهية وملفاتها
+RENTALS_JOB_WORKERS = 2
+RENTALS_JOB_RETRY_DELAY = 10
+RENTALS_JOB_MAX_RETRY_DELAY = 60 * 60
+RENTALS_JOB_TIMEOUT = 60 * 60
+RENTALS_JOB_RETENTION_DAYS = 7
+RENTALS_JOB_FILES_DIR = os.path.join(BASE_DIR, 'cache', 'jobs')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'rentals.performance': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
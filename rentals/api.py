@@ -0,0 +1,316 @@
+import json
+from base64 import urlsafe_b64encode
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import IntegrityError, transaction
+from django.http import Http404, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+
+from . import caching, fulltext, ledger, occupancy, reconciliation
+from .bulk import Relation, row_form, lookup_maps, validate
+from .forms import PropertyForm, TenantForm, RentalContractForm, InvoiceForm, PaymentForm, MaintenanceRequestForm
+from .imports import deactivate_expired
+from .mixins import KeysetListView
+from .models import Property, Tenant, RentalContract, Invoice, Payment, MaintenanceRequest, Document
+from .search import index_contracts
+from .versions import bump_version
+
+# form None يعني موردا للقراءة فقط؛ index يعيد ما كانت إشارات الحفظ ستفعله لأن
+# bulk_create و bulk_update لا يرسلانها، و versions هي اللقطات التي تُبطل بعد الكتابة.
+# previous للعلاقة التي إذا نقل PATCH السجل منها وجب تحديث طرفها القديم أيضا
+Resource = namedtuple('Resource', 'model form fields relations prepare index versions previous', defaults=(None,))
+# attname حقل العلاقة، و refresh تُستدعى بقيمها القديمة التي تغيرت
+Previous = namedtuple('Previous', 'attname refresh')
+
+RESOURCES = {
+    'properties': Resource(
+        Property, PropertyForm,
+        ('id', 'user', 'name', 'property_type', 'status', 'address', 'description', 'created_at', 'updated_at'),
+        {'user': Relation('user_id', User, 'pk')},
+        None,
+        lambda pks: (
+            fulltext.index_objects('property', Property.objects.filter(pk__in=pks)),
+            index_contracts(RentalContract.objects.filter(unit__in=pks)),
+            occupancy.refresh(pks),
+        ),
+        ('dashboard', 'reports'),
+    ),
+    'tenants': Resource(
+        Tenant, TenantForm,
+        ('id', 'user', 'tenant_type', 'company_name', 'commercial_registration_number', 'address', 'phone_number', 'created_at', 'updated_at'),
+        {'user': Relation('user_id', User, 'pk')},
+        None,
+        lambda pks: (
+            fulltext.index_objects('tenant', Tenant.objects.select_related('user').filter(pk__in=pks)),
+            index_contracts(RentalContract.objects.filter(tenant__in=pks)),
+        ),
+        ('dashboard',),
+    ),
+    'contracts': Resource(
+        RentalContract, RentalContractForm,
+        ('id', 'unit', 'tenant', 'start_date', 'end_date', 'monthly_rent', 'is_active', 'created_at', 'updated_at'),
+        {'unit': Relation('unit_id', Property, 'pk'), 'tenant': Relation('tenant_id', Tenant, 'pk')},
+        deactivate_expired,
+        lambda pks: (index_contracts(RentalContract.objects.filter(pk__in=pks)), ledger.refresh(pks), occupancy.refresh_contracts(pks)),
+        ('dashboard', 'reports'),
+        Previous('unit_id', occupancy.refresh),
+    ),
+    'invoices': Resource(
+        Invoice, InvoiceForm,
+        ('id', 'contract', 'period', 'invoice_date', 'due_date', 'amount', 'status'),
+        {'contract': Relation('contract_id', RentalContract, 'pk')},
+        None,
+        lambda pks: (ledger.refresh_invoices(pks), reconciliation.reconcile(pks)),
+        ('dashboard', 'reports'),
+        Previous('contract_id', ledger.refresh),
+    ),
+    'payments': Resource(
+        Payment, PaymentForm,
+        ('id', 'invoice', 'payment_date', 'amount_paid', 'payment_method'),
+        {'invoice': Relation('invoice_id', Invoice, 'pk')},
+        None,
+        lambda pks: (ledger.refresh_payments(pks), reconciliation.reconcile_payments(pks)),
+        ('dashboard', 'reports'),
+        Previous('invoice_id', lambda pks: (ledger.refresh_invoices(pks), reconciliation.reconcile(pks))),
+    ),
+    'maintenance-requests': Resource(
+        MaintenanceRequest, MaintenanceRequestForm,
+        ('id', 'unit', 'title', 'description', 'status', 'requested_at', 'updated_at'),
+        {'unit': Relation('unit_id', Property, 'pk')},
+        None,
+        lambda pks: fulltext.index_objects('maintenance', MaintenanceRequest.objects.filter(pk__in=pks)),
+        (),
+    ),
+    # رفع الملفات يتم من نموذج المستندات؛ الواجهة تعرض بياناتها فقط
+    'documents': Resource(
+        Document, None,
+        ('id', 'title', 'description', 'file', 'updated_at'),
+        {}, None, None, (),
+    ),
+}
+SCALARS = (str, int, float, bool, type(None))
+
+
+def record_id(value):
+    # True و False من نوع int في بايثون، وتساويان السجلين 1 و 0 عند البحث
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+class ApiError(Exception):
+    def __init__(self, errors, status=400):
+        super().__init__(errors)
+        self.errors = errors
+        self.status = status
+
+
+def token_user(header):
+    """صاحب الرمز في ترويسة Authorization: Bearer <token> من RENTALS_API_TOKENS، أو مستخدم مجهول"""
+    scheme, _, token = header.partition(' ')
+    username = None
+    for key, name in getattr(settings, 'RENTALS_API_TOKENS', {}).items():
+        if scheme == 'Bearer' and constant_time_compare(key, token):
+            username = name
+    return User.objects.filter(username=username, is_active=True).first() or AnonymousUser()
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ResourceView(KeysetListView):
+    """واجهة JSON لمورد واحد.
+
+    GET قائمة بترقيم المؤشر (after/before) مع fields لاختيار الحقول، POST مصفوفة كائنات
+    تُنشأ كلها أو لا يُنشأ شيء، و PATCH مصفوفة كائنات فيها id لتحديث الحقول المرسلة فقط.
+    """
+    keyset = ('id',)
+    http_method_names = ['get', 'post', 'patch']
+
+    def dispatch(self, request, *args, **kwargs):
+        # الطلب بالرمز لا يحمل كوكي جلسة فلا يحتاج CSRF، وطلبات الجلسة يُتحقق منها هنا كما في الوسيط
+        if 'Authorization' in request.headers:
+            request.user = token_user(request.headers['Authorization'])
+        else:
+            rejected = CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {})
+            if rejected:
+                return rejected
+        # الموارد كلها تتبع المستخدم، والواجهة تجيب JSON بدل التحويل إلى صفحة الدخول
+        if not request.user.is_authenticated:
+            return JsonResponse({'errors': 'يلزم تسجيل الدخول'}, status=401)
+        self.resource = RESOURCES.get(kwargs['resource'])
+        if self.resource is None:
+            return JsonResponse({'errors': 'مورد غير معروف'}, status=404)
+        self.model = self.resource.model
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as exc:
+            return JsonResponse({'errors': exc.errors}, status=exc.status)
+
+    def scoped(self, queryset):
+        # المستأجرون والمستندات مشتركة، وبقية الموارد تتبع عقارات المستخدم
+        if hasattr(self.model, 'owner_field'):
+            return queryset.for_owner(self.request.user)
+        return queryset
+
+    # القراءة
+
+    def get_fields(self):
+        requested = self.request.GET.get('fields')
+        if not requested:
+            return list(self.resource.fields)
+        fields = [field.strip() for field in requested.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in self.resource.fields]
+        if unknown:
+            raise ApiError({'fields': ['حقول غير معروفة: %s' % ', '.join(unknown)]})
+        return fields
+
+    def get_queryset(self):
+        self.fields = self.get_fields()
+        columns = list(dict.fromkeys(self.fields + [field.lstrip('-') for field in self.keyset]))
+        return self.scoped(super().get_queryset()).values(*columns)
+
+    def encode_cursor(self, row):
+        values = [str(row[field.lstrip('-')]) for field in self.keyset]
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            return super().decode_cursor(cursor)
+        except Http404:
+            raise ApiError({'cursor': ['مؤشر الصفحة غير صالح']})
+
+    def page_url(self, param, cursor):
+        if cursor is None:
+            return None
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query[param] = cursor
+        return self.request.build_absolute_uri('?' + query.urlencode())
+
+    def render_to_response(self, context, **response_kwargs):
+        page = context['page_obj']
+        return JsonResponse({
+            'results': [{field: row[field] for field in self.fields} for row in page],
+            'next': self.page_url('after', page.next_cursor),
+            'previous': self.page_url('before', page.previous_cursor),
+        })
+
+    # الكتابة الجماعية
+
+    def read_rows(self, keys=()):
+        if self.resource.form is None:
+            raise ApiError('هذا المورد للقراءة فقط', status=405)
+        try:
+            rows = json.loads(self.request.body)
+        except ValueError:
+            raise ApiError('محتوى JSON غير صالح')
+        max_batch = getattr(settings, 'RENTALS_API_MAX_BATCH', 1000)
+        if not isinstance(rows, list) or not rows:
+            raise ApiError('المتوقع مصفوفة كائنات غير فارغة')
+        if len(rows) > max_batch:
+            raise ApiError('الحد الأقصى %d كائن في الطلب الواحد' % max_batch, status=413)
+        errors = [
+            {'index': index, 'errors': {'__all__': ['المتوقع كائن قيمه بسيطة']}}
+            for index, row in enumerate(rows)
+            if not isinstance(row, dict) or not all(isinstance(value, SCALARS) for value in row.values())
+        ]
+        if errors:
+            raise ApiError(errors)
+        # الحقول خارج النموذج، كالحالة المشتقة وتواريخ السجل، تُرفض بدل أن تُقبل ثم تُهمل
+        writable = set(self.resource.form._meta.fields).union(self.resource.relations, keys)
+        errors = [
+            {'index': index, 'errors': {key: ['حقل للقراءة فقط أو غير معروف'] for key in row if key not in writable}}
+            for index, row in enumerate(rows)
+            if not writable.issuperset(row)
+        ]
+        if errors:
+            raise ApiError(errors)
+        return rows
+
+    def save(self, objects, write, moved=()):
+        try:
+            with transaction.atomic():
+                saved = write(objects)
+                if self.resource.index:
+                    self.resource.index([obj.pk for obj in saved])
+                if moved:
+                    self.resource.previous.refresh(moved)
+        except IntegrityError as exc:
+            raise ApiError({'__all__': [str(exc)]}, status=409)
+        if self.resource.versions:
+            bump_version(*self.resource.versions)
+        caching.invalidate(self.model, [obj.pk for obj in saved])
+        return [obj.pk for obj in saved]
+
+    def post(self, request, *args, **kwargs):
+        rows = self.read_rows()
+        form_class = row_form(self.model, self.resource.form, self.resource.relations)
+        objects, errors = validate(
+            form_class, lookup_maps(self.resource.relations, request.user), list(enumerate(rows)), prepare=self.resource.prepare,
+        )
+        if errors:
+            raise ApiError([{'index': index, 'errors': row_errors} for index, row_errors in errors])
+        return JsonResponse({'created': self.save(objects, self.model.objects.bulk_create)}, status=201)
+
+    def patch(self, request, *args, **kwargs):
+        rows = self.read_rows(keys=('id',))
+        ids = [record_id(row.get('id')) for row in rows]
+        instances = self.scoped(self.model.objects.all()).in_bulk([pk for pk in ids if pk is not None])
+        errors, seen = [], set()
+        for index, pk in enumerate(ids):
+            if pk not in instances:
+                errors.append({'index': index, 'errors': {'id': ['لا يوجد سجل بهذا الرقم']}})
+            elif pk in seen:
+                errors.append({'index': index, 'errors': {'id': ['السجل مكرر في الطلب']}})
+            seen.add(pk)
+        if errors:
+            raise ApiError(errors)
+        # validate يعدل الكائنات نفسها، فالعلاقات السابقة تُحفظ قبله
+        previous = self.resource.previous
+        links = {pk: getattr(instance, previous.attname) for pk, instance in instances.items()} if previous else {}
+
+        form_class = row_form(self.model, self.resource.form, self.resource.relations)
+        objects, errors = validate(
+            form_class, lookup_maps(self.resource.relations, request.user),
+            [(index, {key: value for key, value in row.items() if key != 'id'}) for index, row in enumerate(rows)],
+            instances=dict(enumerate(instances[pk] for pk in ids)), prepare=self.resource.prepare,
+        )
+        if errors:
+            raise ApiError([{'index': index, 'errors': row_errors} for index, row_errors in errors])
+
+        # bulk_update لا يستدعي pre_save، فتاريخ التحديث يُضبط هنا
+        fields = [field for field in self.resource.form._meta.fields]
+        opts = self.model._meta
+        for name in ('updated_at', 'is_active'):
+            if name not in fields and any(field.name == name for field in opts.fields):
+                fields.append(name)
+        if 'updated_at' in fields:
+            now = timezone.now()
+            for obj in objects:
+                obj.updated_at = now
+
+        def write(objects):
+            self.model.objects.bulk_update(objects, fields, batch_size=500)
+            return objects
+        moved = {links[obj.pk] for obj in objects if getattr(obj, previous.attname) != links[obj.pk]} if previous else ()
+        return JsonResponse({'updated': self.save(objects, write, moved)})
+
+
+def api_index(request):
+    """الموارد المتاحة وحقول كل منها"""
+    return JsonResponse({
+        'version': 1,
+        'resources': {
+            name: {
+                'url': request.build_absolute_uri(reverse('api_resource', args=[name])),
+                'fields': resource.fields,
+                'writable': resource.form is not None,
+            }
+            for name, resource in RESOURCES.items()
+        },
+    })
@@ -0,0 +1,73 @@
+import calendar
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from . import ledger
+from .models import RentalContract, Invoice
+from .versions import bump_version
+
+
+def billing_period(day):
+    """أول يوم من شهر الفوترة"""
+    return day.replace(day=1)
+
+
+def period_end(period):
+    return period.replace(day=calendar.monthrange(period.year, period.month)[1])
+
+
+def billable_contracts(period):
+    """العقود النشطة التي تغطي الفترة ولم تُصدر لها فاتورة بعد"""
+    already_billed = Invoice.objects.filter(contract=OuterRef('pk'), period=period)
+    return RentalContract.objects.filter(
+        is_active=True,
+        start_date__lte=period_end(period),
+        end_date__gte=period,
+    ).exclude(Exists(already_billed))
+
+
+def generate_invoices(period, due_day=1, chunk_size=1000):
+    """إصدار فواتير الفترة لكل العقود النشطة في دفعات bulk_create داخل معاملات.
+
+    القيد الفريد (contract, period) يجعل إعادة التشغيل آمنة؛ العقود المفوترة
+    مسبقا تُستبعد من الاستعلام، وأي تعارض متزامن يُتجاهل عند الإدراج.
+    """
+    period = billing_period(period)
+    due_date = period.replace(day=min(due_day, period_end(period).day))
+    rows = billable_contracts(period).order_by('pk').values_list('pk', 'monthly_rent')
+
+    created = 0
+    chunk = []
+    for contract_id, monthly_rent in rows.iterator(chunk_size=chunk_size):
+        chunk.append(Invoice(contract_id=contract_id, period=period, due_date=due_date, amount=monthly_rent))
+        if len(chunk) >= chunk_size:
+            created += _insert(chunk, period)
+            chunk = []
+    if chunk:
+        created += _insert(chunk, period)
+
+    # bulk_create لا يرسل إشارات الحفظ، لذلك نبطل لقطات لوحة التحكم والتقارير يدويا
+    if created:
+        bump_version('dashboard', 'reports')
+    return created
+
+
+def _insert(invoices, period):
+    # ignore_conflicts يتجاهل الفواتير المكررة دون أن يخبر بعددها، فالمُنشأ هو فرق
+    # فواتير عقود الدفعة في الفترة قبل الإدراج وبعده
+    contract_ids = [invoice.contract_id for invoice in invoices]
+    billed = Invoice.objects.filter(contract__in=contract_ids, period=period)
+    with transaction.atomic():
+        before = billed.count()
+        Invoice.objects.bulk_create(invoices, ignore_conflicts=True)
+        created = billed.count() - before
+        ledger.refresh(contract_ids)
+    return created
+
+
+def parse_period(value):
+    """قراءة الفترة بصيغة YYYY-MM"""
+    year, month = value.split('-')
+    return date(int(year), int(month), 1)
@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models import F
+
+from .models import Blob
+from .storage import document_storage
+
+
+def retain(name):
+    """زيادة عدد المراجع للملف، وإنشاء سجله عند أول مرجع.
+
+    الإنشاء والزيادة في معاملة واحدة مع قفل السجل، فلا يحذف release متزامن سجلا بين الخطوتين.
+    """
+    storage = document_storage()
+    digest = storage.digest(name) if name else None
+    if not digest:
+        return
+    with transaction.atomic():
+        blob, created = Blob.objects.select_for_update().get_or_create(
+            name=name, defaults={'digest': digest, 'size': storage.size(name)},
+        )
+        Blob.objects.filter(pk=blob.pk).update(references=F('references') + 1)
+
+
+def release(name):
+    """إنقاص عدد المراجع، وحذف الملف من القرص بعد نجاح المعاملة إذا لم يبق له مرجع"""
+    if not name or not document_storage().digest(name):
+        return
+    with transaction.atomic():
+        # القفل يجعل الإنقاص وفحص الصفر خطوة واحدة أمام retain و release المتزامنين
+        blob = Blob.objects.select_for_update().filter(name=name).first()
+        if blob is None:
+            return
+        if blob.references > 1:
+            Blob.objects.filter(pk=blob.pk).update(references=F('references') - 1)
+            return
+        blob.delete()
+    transaction.on_commit(lambda: _delete(name))
+
+
+def _delete(name):
+    # retain بعد الحذف وقبل نجاح المعاملة يعيد إنشاء السجل، فيبقى الملف
+    if Blob.objects.filter(name=name, references__gt=0).exists():
+        return
+    storage = document_storage()
+    storage.delete(name)
+    storage.delete(storage.thumbnail_name(name))
@@ -0,0 +1,127 @@
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.forms import modelform_factory
+from django.forms.models import model_to_dict
+
+# relations: اسم الحقل في البيانات -> (الحقل في النموذج، نموذج البحث، حقل المطابقة)؛ المفاتيح
+# الأجنبية تُحل من خرائط في الذاكرة تُملأ باستعلام واحد لكل دفعة بدلا من استعلام لكل صف
+Relation = namedtuple('Relation', 'attname model lookup')
+
+# قيمة في الخريطة تعني أكثر من سجل بالمفتاح نفسه
+AMBIGUOUS = object()
+
+
+class SharedFields(dict):
+    # حقول النموذج لا تتغير أثناء التحقق، فتُشارك بين الصفوف بدلا من نسخها لكل صف
+    def __deepcopy__(self, memo):
+        return self
+
+
+def _lookup_field(model, lookup):
+    *relations, name = lookup.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+
+class LookupMap:
+    """مفتاح -> رقم السجل، يُستعلم عن المفاتيح الجديدة فقط مرة لكل دفعة"""
+
+    def __init__(self, relation, queryset=None):
+        self.relation = relation
+        self.queryset = relation.model.objects.all() if queryset is None else queryset
+        self.field = _lookup_field(relation.model, relation.lookup)
+        self.known = {}
+
+    def load(self, keys):
+        missing = {key for key in keys if key and key not in self.known}
+        if not missing:
+            return
+        # المفاتيح تُحوّل لنوع الحقل أولا، فـ "12" و 12 مفتاح واحد والقيمة غير الصالحة لا تصل للاستعلام
+        values = {}
+        for key in missing:
+            try:
+                values.setdefault(self.field.to_python(key), []).append(key)
+            except ValidationError:
+                pass
+        found = {}
+        if values:
+            rows = self.queryset.filter(**{self.relation.lookup + '__in': values})
+            for value, pk in rows.values_list(self.relation.lookup, 'pk'):
+                found[value] = AMBIGUOUS if value in found else pk
+        for value, keys in values.items():
+            for key in keys:
+                self.known[key] = found.get(value)
+        for key in missing:
+            self.known.setdefault(key, None)
+
+    def get(self, key):
+        return self.known.get(key)
+
+
+def row_form(model, form, relations):
+    """النموذج دون حقول العلاقات حتى لا يستعلم ModelChoiceField عن كل صف"""
+    form_class = modelform_factory(model, form=form, fields=[field for field in form._meta.fields if field not in relations])
+    form_class.base_fields = SharedFields(form_class.base_fields)
+    return form_class
+
+
+def owned_queryset(model, user):
+    """السجلات التي يجوز للمستخدم ربط الصفوف بها: عقاراته وما يتبعها، وحسابه هو للمستخدمين"""
+    if user is None or user.is_superuser:
+        return model.objects.all()
+    if hasattr(model, 'owner_field'):
+        return model.objects.for_owner(user)
+    if model is get_user_model():
+        return model.objects.filter(pk=user.pk)
+    return model.objects.all()
+
+
+def lookup_maps(relations, user=None):
+    """user None يعني دون تقييد، كما في أوامر الإدارة"""
+    return {column: LookupMap(relation, owned_queryset(relation.model, user)) for column, relation in relations.items()}
+
+
+def _key(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def validate(form_class, maps, rows, defaults=None, instances=None, prepare=None):
+    """التحقق من صفوف (مرجع، بيانات) بقواعد النموذج، وتُرجع الكائنات الصالحة وقائمة (المرجع، الأخطاء).
+
+    instances للتحديث الجزئي: الكائن الحالي لكل مرجع، والعلاقات الغائبة عن الصف تبقى كما هي.
+    """
+    defaults = defaults or {}
+    for column, lookup in maps.items():
+        lookup.load({_key(row.get(column)) or defaults.get(column) for ref, row in rows})
+
+    objects, errors = [], []
+    for ref, row in rows:
+        instance = instances[ref] if instances is not None else form_class._meta.model()
+        row_errors = {}
+        for column, lookup in maps.items():
+            key = _key(row.get(column)) or defaults.get(column)
+            if not key and instances is not None and column not in row:
+                continue
+            pk = lookup.get(key)
+            if not key:
+                row_errors[column] = ['هذا الحقل مطلوب.']
+            elif pk is None:
+                row_errors[column] = ['لا يوجد سجل بالقيمة "%s".' % key]
+            elif pk is AMBIGUOUS:
+                row_errors[column] = ['أكثر من سجل بالقيمة "%s".' % key]
+            else:
+                setattr(instance, lookup.relation.attname, pk)
+        # الحقول الغائبة تأخذ قيمتها الحالية، أو القيمة الافتراضية في النموذج عند الإنشاء
+        data = {**model_to_dict(instance, fields=form_class._meta.fields), **row}
+        form = form_class(data=data, instance=instance)
+        if form.is_valid() and not row_errors:
+            if prepare:
+                prepare(form.instance)
+            objects.append(form.instance)
+        else:
+            row_errors.update((field, list(messages)) for field, messages in form.errors.items())
+            errors.append((ref, row_errors))
+    return objects, errors
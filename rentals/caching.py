@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from .models import Property, Tenant, RentalContract, MaintenanceRequest, Document
+from .versions import get_version, bump_version
+
+# النموذج -> (قطعة الصف في القالب، إصدار القائمة التي تعرضه)
+FRAGMENTS = {
+    Property: ('property_row', 'properties'),
+    Tenant: ('tenant_row', 'tenants'),
+    RentalContract: ('contract_row', 'contracts'),
+    MaintenanceRequest: ('maintenance_row', 'maintenance'),
+    Document: ('document_row', 'documents'),
+}
+# الصفوف التي تعرض بيانات نموذج آخر: (النموذج التابع، مسار العلاقة إليه)
+DEPENDENTS = {
+    Property: ((RentalContract, 'unit'), (MaintenanceRequest, 'unit')),
+    Tenant: ((RentalContract, 'tenant'),),
+    User: ((Tenant, 'user'), (RentalContract, 'tenant__user')),
+}
+
+
+def row_generation(fragment):
+    # المسارات الجماعية (update و bulk_update) ترفعه فتبطل كل صفوف القطعة مرة واحدة
+    return get_version('rows:%s' % fragment)
+
+
+def row_generations():
+    return {fragment: row_generation(fragment) for fragment, version in FRAGMENTS.values()}
+
+
+def row_keys(fragment, pks):
+    generation = row_generation(fragment)
+    return [make_template_fragment_key(fragment, [pk, generation]) for pk in pks]
+
+
+def invalidate(model, pks):
+    """حذف صفوف الكائنات ومن يعرض بياناتها من الكاش، ورفع إصدار القوائم المتأثرة"""
+    pks = list(pks)
+    keys, versions = [], set()
+    if model in FRAGMENTS:
+        fragment, version = FRAGMENTS[model]
+        keys += row_keys(fragment, pks)
+        versions.add(version)
+    for dependent, path in DEPENDENTS.get(model, ()):
+        fragment, version = FRAGMENTS[dependent]
+        keys += row_keys(fragment, dependent.objects.filter(**{path + '__in': pks}).values_list('pk', flat=True))
+        versions.add(version)
+    cache.delete_many(keys)
+    bump_version(*versions)
+
+
+def invalidate_all(*models):
+    """لتحديثات لا تُعرف صفوفها مسبقا، مثل update() في sweeper"""
+    fragments = [FRAGMENTS[model] for model in models]
+    bump_version(*['rows:%s' % fragment for fragment, version in fragments], *[version for fragment, version in fragments])
@@ -0,0 +1,33 @@
+from .versions import acached, cached
+
+
+def bar_chart(labels, values, title, x_title, y_title):
+    """مواصفات رسم أعمدة بصيغة JSON مختصرة، تُرسم في المتصفح عبر plotly.js"""
+    return {
+        'data': [{'type': 'bar', 'x': list(labels), 'y': [float(value) for value in values]}],
+        'layout': {
+            'title': {'text': title},
+            'xaxis': {'title': {'text': x_title}, 'type': 'category'},
+            'yaxis': {'title': {'text': y_title}},
+        },
+    }
+
+
+def grouped_bar_chart(labels, series, title, x_title, y_title):
+    """مثل bar_chart لعدة سلاسل متجاورة؛ series أزواج (الاسم، القيم) والقيمة None فراغ"""
+    chart = bar_chart(labels, [], title, x_title, y_title)
+    chart['data'] = [
+        {'type': 'bar', 'name': name, 'x': list(labels), 'y': [None if value is None else float(value) for value in values]}
+        for name, values in series
+    ]
+    chart['layout']['barmode'] = 'group'
+    return chart
+
+
+def cached_chart(name, version_name, params, build):
+    """الرسوم تُخزن في الكاش حسب إصدار البيانات التي بُنيت منها"""
+    return cached('chart:%s' % name, version_name, params, build)
+
+
+async def acached_chart(name, version_name, params, build):
+    return await acached('chart:%s' % name, version_name, params, build)
@@ -0,0 +1,34 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+
+
+def _in_transaction(using=DEFAULT_DB_ALIAS):
+    return connections[using].in_atomic_block
+
+
+def _run_in_own_connection(func):
+    # كل خيط من مجمع الخيوط يفتح اتصاله الخاص، ويُغلق بعد الاستعلام ما لم يكن CONN_MAX_AGE يسمح بإبقائه
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+async def gather_queries(calls):
+    """تشغيل استعلامات مستقلة معا وإرجاع نتائجها بالأسماء نفسها.
+
+    calls قاموس اسم -> دالة متزامنة بلا معاملات. كل دالة تعمل في خيط واتصال منفصلين
+    فيقترب زمن الانتظار من أبطأ استعلام لا من مجموعها. إذا كان اتصال الطلب داخل
+    معاملة (ATOMIC_REQUESTS أو الاختبارات) تعمل بالتتابع على الاتصال نفسه، لأن
+    الاتصالات الأخرى لا ترى ما لم يُثبت بعد.
+    """
+    names = list(calls)
+    if await sync_to_async(_in_transaction)():
+        results = [await sync_to_async(calls[name])() for name in names]
+    else:
+        results = await asyncio.gather(*(
+            sync_to_async(_run_in_own_connection, thread_sensitive=False)(calls[name]) for name in names
+        ))
+    return dict(zip(names, results))
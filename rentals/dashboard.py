@@ -0,0 +1,107 @@
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from .concurrency import gather_queries
+from .models import Property, Tenant, RentalContract, Invoice
+from .versions import aget_version, get_version, bump_version, cache_timeout
+
+# مفتاح لقطة لوحة التحكم، مرتبط برقم إصدار بياناتها وبالمالك
+SNAPSHOT_KEY = 'rentals:dashboard:snapshot:%s:%s'
+
+PROPERTY_STATUSES = ('available', 'rented', 'maintenance')
+INVOICE_STATUSES = ('overdue', 'paid', 'pending')
+
+
+def invalidate_snapshot():
+    """إبطال لقطة لوحة التحكم برفع رقم الإصدار"""
+    bump_version('dashboard')
+
+
+def _tenant_count(user):
+    if user is None or user.is_superuser:
+        return Tenant.objects.count()
+    # المستأجرون مشتركون بين الملاك، فيُعد منهم من له عقد في عقارات المالك
+    return RentalContract.objects.for_owner(user).values('tenant').distinct().count()
+
+
+def metric_queries(user=None):
+    """استعلامات المؤشرات المستقلة، استعلام مجمع واحد لكل نموذج، لعقارات user أو للجميع"""
+    properties, invoices = Property.objects.all(), Invoice.objects.all()
+    if user is not None:
+        properties, invoices = properties.for_owner(user), invoices.for_owner(user)
+    return {
+        'properties': lambda: list(properties.order_by().values('status').annotate(count=Count('id'))),
+        'invoices': lambda: list(invoices.order_by().values('status').annotate(count=Count('id'), total=Sum('amount'))),
+        'tenants': lambda: _tenant_count(user),
+    }
+
+
+def assemble_metrics(results):
+    property_counts = dict.fromkeys(PROPERTY_STATUSES, 0)
+    for row in results['properties']:
+        property_counts[row['status']] = row['count']
+
+    invoice_counts = dict.fromkeys(INVOICE_STATUSES, 0)
+    invoice_totals = dict.fromkeys(INVOICE_STATUSES, 0)
+    for row in results['invoices']:
+        invoice_counts[row['status']] = row['count']
+        invoice_totals[row['status']] = row['total'] or 0
+
+    return {
+        'total_units': sum(property_counts.values()),
+        'available_units': property_counts['available'],
+        'rented_units': property_counts['rented'],
+        'total_tenants': results['tenants'],
+        'total_invoices': sum(invoice_counts.values()),
+        'overdue_invoices': invoice_counts['overdue'],
+        'total_income': invoice_totals['paid'],
+        # chart.js البيانات لتكامل الرسوم البيانية مع
+        'unit_data': {
+            'labels': ['متوفر', 'مؤجرة', 'تحت الصيانة'],
+            'data': [property_counts[status] for status in PROPERTY_STATUSES],
+        },
+        'overdue_data': {
+            'labels': ['متأخرة', 'مدفوعة', 'معلق'],
+            'data': [invoice_counts[status] for status in INVOICE_STATUSES],
+        },
+    }
+
+
+def compute_metrics(user=None):
+    """حساب مؤشرات لوحة التحكم باستعلاماتها واحدا بعد الآخر"""
+    return assemble_metrics({name: query() for name, query in metric_queries(user).items()})
+
+
+async def acompute_metrics(user=None):
+    """حساب المؤشرات باستعلامات متزامنة في اتصالات منفصلة"""
+    return assemble_metrics(await gather_queries(metric_queries(user)))
+
+
+def _snapshot_key(version, user):
+    # لقطة واحدة لكل مالك، والمشرف يشارك لقطة البيانات كاملة
+    scope = 'all' if user is None or user.is_superuser else user.pk
+    return SNAPSHOT_KEY % (version, scope)
+
+
+def get_dashboard_snapshot(user=None):
+    """إرجاع لقطة المؤشرات من الكاش، وحسابها فقط عند تغير الإصدار"""
+    version = get_version('dashboard')
+    key = _snapshot_key(version, user)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = compute_metrics(user)
+        snapshot['version'] = version
+        cache.set(key, snapshot, timeout=cache_timeout())
+    return snapshot
+
+
+async def aget_dashboard_snapshot(user=None):
+    """النسخة غير المتزامنة من get_dashboard_snapshot لواجهات ASGI"""
+    version = await aget_version('dashboard')
+    key = _snapshot_key(version, user)
+    snapshot = await cache.aget(key)
+    if snapshot is None:
+        snapshot = await acompute_metrics(user)
+        snapshot['version'] = version
+        await cache.aset(key, snapshot, timeout=cache_timeout())
+    return snapshot
@@ -0,0 +1,103 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+class RangeFile:
+    # قارئ محدود بطول النطاق المطلوب من الملف
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def byte_range(request, etag, last_modified, size):
+    """النطاق (البداية، الطول) من ترويسة Range، أو None لإرسال الملف كاملا.
+
+    تُدعم الطلبات ذات النطاق الواحد فقط؛ النطاقات المتعددة تُرسل ملفا كاملا كما يسمح المعيار.
+    """
+    header = request.headers.get('Range', '')
+    match = RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        return None
+    first, last = match.groups()
+    if not first:
+        length = min(int(last), size)
+        if not length:
+            raise ValueError(header)
+        return size - length, length
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        raise ValueError(header)
+    return first, last - first + 1
+
+
+def serve(request, storage, name, filename):
+    """إرسال ملف مع ETag ونطاقات جزئية؛ الملف الكامل يُمرر لـ wsgi.file_wrapper (sendfile)"""
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('الملف غير موجود')
+    digest = storage.digest(name) if hasattr(storage, 'digest') else None
+    etag = '"%s"' % (digest or '%x-%x' % (int(stat.st_mtime), stat.st_size))
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(request, path, name, filename, etag, last_modified, stat.st_size)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _file_response(request, path, name, filename, etag, last_modified, size):
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if settings.DOCUMENT_ACCEL_REDIRECT:
+        # nginx يرسل الملف ويعالج Range بنفسه
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.DOCUMENT_ACCEL_REDIRECT + quote(name)
+        response['Content-Disposition'] = "inline; filename*=UTF-8''%s" % quote(filename)
+        return response
+
+    try:
+        requested = byte_range(request, etag, last_modified, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % size
+        return response
+
+    if requested is None:
+        response = FileResponse(open(path, 'rb'), filename=filename, content_type=content_type)
+    else:
+        start, length = requested
+        response = FileResponse(RangeFile(open(path, 'rb'), start, length), status=206, filename=filename, content_type=content_type)
+        response['Content-Length'] = length
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, start + length - 1, size)
+    response.block_size = BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,215 @@
+import csv
+import zipfile
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import chain
+from xml.sax.saxutils import escape
+
+from .models import RentalContract, Invoice, Payment
+from .streaming import ZipStream
+
+CHUNK_SIZE = 2000
+# النص الذي يبدأ بأحد هذه الأحرف يعده Excel صيغة عند فتح CSV
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# columns: (العنوان، مسار الحقل في values_list)؛ date_field يُستخدم لتصفية الفترة
+Export = namedtuple('Export', 'model columns date_field filename')
+
+EXPORTS = {
+    'contracts': Export(
+        RentalContract,
+        [
+            ('رقم العقد', 'id'),
+            ('العقار', 'unit__name'),
+            ('المستأجر', 'tenant__user__username'),
+            ('اسم الشركة', 'tenant__company_name'),
+            ('تاريخ البدء', 'start_date'),
+            ('تاريخ النهاية', 'end_date'),
+            ('الإيجار الشهري', 'monthly_rent'),
+            ('نشط', 'is_active'),
+        ],
+        'start_date',
+        'contracts',
+    ),
+    'invoices': Export(
+        Invoice,
+        [
+            ('رقم الفاتورة', 'id'),
+            ('رقم العقد', 'contract_id'),
+            ('العقار', 'contract__unit__name'),
+            ('فترة الفوترة', 'period'),
+            ('تاريخ الفاتورة', 'invoice_date'),
+            ('تاريخ الاستحقاق', 'due_date'),
+            ('المبلغ', 'amount'),
+            ('الحالة', 'status'),
+        ],
+        'due_date',
+        'invoices',
+    ),
+    'payments': Export(
+        Payment,
+        [
+            ('رقم الدفعة', 'id'),
+            ('رقم الفاتورة', 'invoice_id'),
+            ('العقار', 'invoice__contract__unit__name'),
+            ('تاريخ الدفع', 'payment_date'),
+            ('المبلغ المدفوع', 'amount_paid'),
+            ('طريقة الدفع', 'payment_method'),
+        ],
+        'payment_date',
+        'payments',
+    ),
+}
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _field(model, lookup):
+    *relations, name = lookup.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def header(name):
+    return [title for title, lookup in EXPORTS[name].columns]
+
+
+def rows(name, start_date=None, end_date=None, chunk_size=CHUNK_SIZE, user=None):
+    """صفوف التصدير بترتيب المفتاح؛ values_list مع iterator يقرأ الجدول على دفعات
+    بلا إنشاء كائنات، والحقول ذات الخيارات تُستبدل بعناوينها المعروضة.
+    user يقصر الصفوف على عقاراته، ودونه يُصدّر كل شيء كما في أمر الإدارة.
+    """
+    export = EXPORTS[name]
+    lookups = [lookup for title, lookup in export.columns]
+    queryset = export.model.objects.order_by('pk')
+    if user is not None:
+        queryset = queryset.for_owner(user)
+    if start_date:
+        queryset = queryset.filter(**{export.date_field + '__gte': start_date})
+    if end_date:
+        queryset = queryset.filter(**{export.date_field + '__lte': end_date})
+
+    labels = {}
+    for index, lookup in enumerate(lookups):
+        field = _field(export.model, lookup)
+        if field.choices:
+            labels[index] = {key: str(label) for key, label in field.flatchoices}
+    for row in queryset.values_list(*lookups).iterator(chunk_size=chunk_size):
+        if labels:
+            row = list(row)
+            for index, choices in labels.items():
+                row[index] = choices.get(row[index], row[index])
+        yield row
+
+
+class Echo:
+    # يُعيد ما كُتب إليه مباشرة ليُرسل للعميل دون تجميعه في الذاكرة
+    def write(self, value):
+        return value
+
+
+def csv_cell(value):
+    # ' في البداية يجعل Excel يعرض النص كما هو بدلا من تنفيذه صيغة
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(header, rows):
+    # BOM في البداية ليتعرف Excel على الترميز ويعرض النص العربي صحيحا
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+XLSX_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+     '</Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+     '</Relationships>'),
+)
+SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView rightToLeft="1" workbookViewId="0"/></sheetViews><sheetData>'
+)
+SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(ref, value):
+    if value is None:
+        return ''
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return '<c r="%s"><v>%s</v></c>' % (ref, value)
+    if isinstance(value, bool):
+        value = 'نعم' if value else 'لا'
+    elif isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    # النص خلية inlineStr دائما لا <f>، فلا يُنفذ صيغة حتى لو بدأ بـ = أو + أو - أو @
+    return '<c r="%s" t="inlineStr"><is><t>%s</t></is></c>' % (ref, escape(str(value)))
+
+
+def stream_xlsx(header, rows, flush_every=500):
+    """ملف XLSX يُكتب صفا بعد صف داخل أرشيف ZIP يُبث أثناء الكتابة.
+
+    النصوص تُكتب مضمنة (inlineStr) فلا حاجة لجدول نصوص مشترك يُبنى في الذاكرة.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS:
+            archive.writestr(name, content)
+        yield stream.pop()
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(SHEET_HEAD.encode())
+            for number, row in enumerate(chain([header], rows), 1):
+                cells = ''.join(_xlsx_cell('%s%d' % (_column_letter(index), number), value) for index, value in enumerate(row))
+                sheet.write(('<row r="%d">%s</row>' % (number, cells)).encode())
+                if number % flush_every == 0:
+                    yield stream.pop()
+            sheet.write(SHEET_TAIL.encode())
+        yield stream.pop()
+    yield stream.pop()
+
+
+WRITERS = {'csv': stream_csv, 'xlsx': stream_xlsx}
+
+
+def stream(name, fmt, start_date=None, end_date=None, user=None):
+    return WRITERS[fmt](header(name), rows(name, start_date=start_date, end_date=end_date, user=user))
+
+
+def filename(name, fmt):
+    return '%s-%s.%s' % (EXPORTS[name].filename, date.today().isoformat(), fmt)
@@ -0,0 +1,145 @@
+from datetime import date
+from decimal import Decimal
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import CharField, FloatField, Sum
+from django.db.models.functions import Cast, TruncMonth
+
+from .billing import billing_period, period_end
+from .models import RentalContract, Payment
+
+MIN_MONTHS, MAX_MONTHS = 12, 36
+# المبالغ تُجمع أعدادا صحيحة بأصغر وحدة للعملة حتى لا تتراكم أخطاء الفاصلة العشرية
+PLACES = RentalContract._meta.get_field('monthly_rent').decimal_places
+CENTS = 10 ** PLACES
+QUANTUM = Decimal(1).scaleb(-PLACES)
+# month_index لشهر 1970-01، بداية ترقيم الأشهر في datetime64 الخاص بـ numpy
+EPOCH_MONTH = 1970 * 12
+
+
+def month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def month_start(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _money(value):
+    return Decimal(int(value)).scaleb(-PLACES).quantize(QUANTUM)
+
+
+def _fetch(queryset):
+    # الصفوف تُقرأ من المؤشر مباشرة دون محولات الحقول في Django، فهي لكل صف تكلف أكثر من الحساب كله
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return []
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def contract_intervals(start, end, user=None, unit=None, tenant=None):
+    """(نشط، البداية، النهاية، الإيجار) لكل عقد يمس الأشهر من start إلى end، باستعلام واحد"""
+    contracts = RentalContract.objects.filter(start_date__lte=period_end(end), end_date__gte=start)
+    if user is not None:
+        contracts = contracts.for_owner(user)
+    if unit:
+        contracts = contracts.filter(unit=unit)
+    if tenant:
+        contracts = contracts.filter(tenant=tenant)
+    # التواريخ نصوص ISO تحللها numpy دفعة واحدة، والإيجار رقم عشري؛ الأعمدة المحسوبة
+    # تأتي في SQL بعد حقول النموذج أيا كان ترتيبها في values_list
+    rows = contracts.order_by().annotate(
+        start=Cast('start_date', CharField()), end=Cast('end_date', CharField()), rent=Cast('monthly_rent', FloatField()),
+    )
+    return _fetch(rows.values_list('is_active', 'start', 'end', 'rent'))
+
+
+def rent_roll(intervals, first_month, months, current_month):
+    """عدد العقود والإيجار المتوقع والإيجار المنتهي لكل شهر من first_month، مصفوفات numpy.
+
+    الشهر المتوقع كما تفوتره generate_invoices: الإيجار كاملا لكل شهر يمسه العقد، فالعقد
+    المنتهي في منتصف الشهر يُحسب في شهره الأخير. العقد الموقوف قبل نهايته لا يُحسب بعد
+    الشهر السابق للشهر الحالي. الحساب بمصفوفة فروق: الإيجار يُضاف في أول شهر للعقد داخل
+    النافذة ويُطرح بعد آخر شهر، ثم يُجمع تراكميا، فلا تمر حلقة على العقود ولا على الأشهر.
+    """
+    import numpy as np
+
+    def months_from_first(days):
+        # التواريخ كائنات date أو نصوص ISO
+        return np.array(days, dtype='datetime64[D]').astype('datetime64[M]').astype(np.int64) + EPOCH_MONTH - first_month
+
+    active, starts, ends, rents = zip(*intervals) if intervals else ((), (), (), ())
+    start, end = months_from_first(starts), months_from_first(ends)
+    rent = np.rint(np.array(rents, dtype=np.float64) * CENTS)
+    end = np.where(np.array(active, dtype=bool), end, np.minimum(end, current_month - first_month - 1))
+
+    first, last = np.maximum(start, 0), np.minimum(end, months - 1)
+    inside = first <= last
+    first, last, end, rent = first[inside], last[inside] + 1, end[inside], rent[inside]
+    # أوزان bincount أعداد صحيحة بأصغر وحدة، ومجموعها أقل بكثير من حد الدقة في float64
+    expected = np.cumsum(np.bincount(first, rent, months + 1) - np.bincount(last, rent, months + 1))[:months]
+    contracts = np.cumsum(np.bincount(first, minlength=months + 1) - np.bincount(last, minlength=months + 1))[:months]
+    ending = end < months
+    expiring = np.bincount(end[ending], rent[ending], months)
+    return contracts, expected, expiring
+
+
+def actual_payments(start, end, user=None, unit=None, tenant=None):
+    """مجموع الدفعات المستلمة لكل شهر بين start و end"""
+    payments = Payment.objects.filter(payment_date__gte=start, payment_date__lte=end)
+    if user is not None:
+        payments = payments.for_owner(user)
+    if unit:
+        payments = payments.filter(invoice__contract__unit=unit)
+    if tenant:
+        payments = payments.filter(invoice__contract__tenant=tenant)
+    rows = payments.annotate(bucket=TruncMonth('payment_date')).values('bucket').annotate(total=Sum('amount_paid')).order_by()
+    return {row['bucket']: row['total'] for row in rows}
+
+
+def forecast(start=None, months=MIN_MONTHS, user=None, unit=None, tenant=None, today=None):
+    """الدخل المتوقع من العقود لكل شهر من start (الافتراضي الشهر الحالي) لمدة months شهرا.
+
+    الأشهر التي بدأت تُقارن بالدفعات المستلمة فيها؛ الفعلي والفرق None للأشهر القادمة.
+    expiring إيجار العقود التي ينتهي آخر شهر لها في ذلك الشهر، أي الدخل الذي يتوقف بعده.
+    """
+    today = today or date.today()
+    first, current = month_index(billing_period(start or today)), month_index(today)
+    contracts, expected, expiring = rent_roll(
+        contract_intervals(month_start(first), month_start(first + months - 1), user=user, unit=unit, tenant=tenant),
+        first, months, current,
+    )
+    actual = {}
+    if first <= current:
+        actual = actual_payments(month_start(first), today, user=user, unit=unit, tenant=tenant)
+
+    series = []
+    for offset in range(months):
+        month = month_start(first + offset)
+        row = {
+            'month': month,
+            'contracts': int(contracts[offset]),
+            'expected': _money(expected[offset]),
+            'expiring': _money(expiring[offset]),
+            'actual': None,
+            'variance': None,
+        }
+        if first + offset <= current:
+            row['actual'] = (actual.get(month) or Decimal(0)).quantize(QUANTUM)
+            row['variance'] = row['actual'] - row['expected']
+        series.append(row)
+
+    elapsed = [row for row in series if row['actual'] is not None]
+    expected_to_date = sum((row['expected'] for row in elapsed), Decimal(0))
+    actual_to_date = sum((row['actual'] for row in elapsed), Decimal(0))
+    return {
+        'months': series,
+        'expected_total': sum((row['expected'] for row in series), Decimal(0)),
+        'expected_to_date': expected_to_date,
+        'actual_to_date': actual_to_date,
+        'collection_rate': float(actual_to_date * 100 / expected_to_date) if expected_to_date else None,
+    }
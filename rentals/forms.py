@@ -1,5 +1,8 @@
+from decimal import Decimal
+
 from django import forms
-from .models import Property, Tenant, RentalContract, Payment, MaintenanceRequest, Document, CustomUser
+from .forecast import MIN_MONTHS, MAX_MONTHS
+from .models import Property, Tenant, RentalContract, Invoice, Payment, MaintenanceRequest, Document, CustomUser
 from django.contrib.auth.forms import PasswordChangeForm
 
 class ProfileUpdateForm(forms.ModelForm):
@@ -65,6 +68,18 @@ class RentalContractForm(forms.ModelForm):
             'end_date': forms.DateInput(attrs={'type': 'date'}),
         }
 
+class InvoiceForm(forms.ModelForm):
+    class Meta:
+        model = Invoice
+        # الحالة تُشتق من الدفعات في reconciliation ولا تُكتب يدويا
+        fields = ['contract', 'period', 'due_date', 'amount']
+        labels = {
+            'contract': 'العقد',
+            'period': 'فترة الفوترة',
+            'due_date': 'تاريخ الاستحقاق',
+            'amount': 'المبلغ',
+        }
+
 class PaymentForm(forms.ModelForm):
     class Meta:
         model = Payment
@@ -75,6 +90,11 @@ class PaymentForm(forms.ModelForm):
             'payment_method': 'طريقة الدفع',
         }
 
+class PaymentAllocationForm(forms.Form):
+    contract = forms.ModelChoiceField(queryset=RentalContract.objects.select_related('unit', 'tenant__user'), label='العقد')
+    amount = forms.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'), label='مبلغ التحويل')
+    payment_method = forms.ChoiceField(choices=Payment._meta.get_field('payment_method').choices, initial='bank_transfer', label='طريقة الدفع')
+
 class MaintenanceRequestForm(forms.ModelForm):
     class Meta:
         model = MaintenanceRequest
@@ -97,4 +117,48 @@ class DocumentForm(forms.ModelForm):
             'title': 'عنوان المستند',
             'description': 'وصف',
             'file': 'الملف',
-        }
\ No newline at end of file
+        }
+
+class RevenueFilterForm(forms.Form):
+    period = forms.ChoiceField(choices=(('month', 'شهري'), ('quarter', 'ربع سنوي')), required=False, label='الفترة')
+    start_date = forms.DateField(required=False, label='من تاريخ', widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(required=False, label='إلى تاريخ', widget=forms.DateInput(attrs={'type': 'date'}))
+    unit = forms.ModelChoiceField(queryset=Property.objects.all(), required=False, label='العقار')
+    tenant = forms.ModelChoiceField(queryset=Tenant.objects.select_related('user'), required=False, label='المستأجر')
+
+    def clean_period(self):
+        return self.cleaned_data['period'] or 'month'
+
+
+class ForecastForm(forms.Form):
+    start = forms.DateField(
+        required=False, label='من شهر', input_formats=['%Y-%m', '%Y-%m-%d'],
+        widget=forms.DateInput(attrs={'type': 'month'}, format='%Y-%m'),
+    )
+    months = forms.IntegerField(min_value=MIN_MONTHS, max_value=MAX_MONTHS, required=False, label='عدد الأشهر')
+    unit = forms.ModelChoiceField(queryset=Property.objects.all(), required=False, label='العقار')
+    tenant = forms.ModelChoiceField(queryset=Tenant.objects.select_related('user'), required=False, label='المستأجر')
+
+    def clean_months(self):
+        return self.cleaned_data['months'] or MIN_MONTHS
+
+
+class ContractSearchForm(forms.Form):
+    tenant_name = forms.CharField(required=False, label='اسم المستأجر')
+    company_name = forms.CharField(required=False, label='اسم الشركة')
+    registration_number = forms.CharField(required=False, label='رقم التسجيل التجاري')
+    property_name = forms.CharField(required=False, label='اسم العقار')
+    start_date = forms.DateField(required=False, label='من تاريخ', widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(required=False, label='إلى تاريخ', widget=forms.DateInput(attrs={'type': 'date'}))
+
+
+class ExportFilterForm(forms.Form):
+    start_date = forms.DateField(required=False, label='من تاريخ', widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(required=False, label='إلى تاريخ', widget=forms.DateInput(attrs={'type': 'date'}))
+
+
+class ImportForm(forms.Form):
+    name = forms.ChoiceField(choices=(('properties', 'العقارات'), ('tenants', 'المستأجرون'), ('contracts', 'العقود')), label='نوع البيانات')
+    file = forms.FileField(label='ملف CSV')
+    dry_run = forms.BooleanField(required=False, label='تحقق فقط دون حفظ')
+    background = forms.BooleanField(required=False, label='تنفيذ في الخلفية (للملفات الكبيرة)')
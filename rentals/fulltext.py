@@ -0,0 +1,156 @@
+from collections import namedtuple
+
+from django.db import connection
+from django.urls import reverse
+
+from .models import Property, Tenant, MaintenanceRequest, Document
+from .search import WORD, normalize_arabic, strip_article, query_words
+
+# جدول FTS5 ظلّي ينشئه الترحيل 0005: rowid = رقم الكائن * 8 + رمز النوع، فالتحديث والحذف يتمان بالمفتاح مباشرة
+TABLE = 'rentals_search'
+KIND_BITS = 8
+
+Source = namedtuple('Source', 'code label model select_related title body url_name')
+
+SOURCES = {
+    'property': Source(
+        1, 'عقار', Property, (),
+        lambda obj: obj.name,
+        lambda obj: [obj.address, obj.description],
+        'property_update',
+    ),
+    'tenant': Source(
+        2, 'مستأجر', Tenant, ('user',),
+        lambda obj: obj.company_name or ' '.join(filter(None, [obj.user.first_name, obj.user.last_name])) or obj.user.username,
+        lambda obj: [obj.user.username, obj.user.first_name, obj.user.last_name, obj.commercial_registration_number, obj.address, obj.phone_number],
+        'tenant_update',
+    ),
+    'maintenance': Source(
+        3, 'طلب صيانة', MaintenanceRequest, (),
+        lambda obj: obj.title,
+        lambda obj: [obj.description],
+        'maintenance_request_update',
+    ),
+    'document': Source(
+        4, 'مستند', Document, (),
+        lambda obj: obj.title,
+        lambda obj: [obj.description],
+        'document_update',
+    ),
+}
+SOURCES_BY_CODE = {source.code: (kind, source) for kind, source in SOURCES.items()}
+SOURCES_BY_MODEL = {source.model: kind for kind, source in SOURCES.items()}
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def index_text(*values):
+    """النص المطبّع، مضافا إليه صيغ الكلمات دون أداة التعريف"""
+    text = normalize_arabic(' '.join(value for value in values if value))
+    words = WORD.findall(text)
+    return ' '.join([text] + [strip_article(word) for word in words if strip_article(word) != word])
+
+
+def _rowid(kind, pk):
+    return pk * KIND_BITS + SOURCES[kind].code
+
+
+def index_objects(kind, objects):
+    if not is_available():
+        return 0
+    source = SOURCES[kind]
+    rows = []
+    for obj in objects:
+        title = source.title(obj) or ''
+        rows.append((_rowid(kind, obj.pk), title, index_text(title), index_text(*source.body(obj))))
+    with connection.cursor() as cursor:
+        cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % TABLE, [(row[0],) for row in rows])
+        cursor.executemany('INSERT INTO %s (rowid, label, title, body) VALUES (%%s, %%s, %%s, %%s)' % TABLE, rows)
+    return len(rows)
+
+
+def index_object(obj):
+    kind = SOURCES_BY_MODEL[type(obj)]
+    source = SOURCES[kind]
+    if source.select_related:
+        obj = source.model.objects.select_related(*source.select_related).get(pk=obj.pk)
+    return index_objects(kind, [obj])
+
+
+def remove_object(obj):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE rowid = %%s' % TABLE, [_rowid(SOURCES_BY_MODEL[type(obj)], obj.pk)])
+
+
+def rebuild(chunk_size=1000):
+    """إعادة بناء الفهرس بالكامل من الجداول الأصلية"""
+    if not is_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s' % TABLE)
+    total = 0
+    for kind, source in SOURCES.items():
+        objects = source.model.objects.select_related(*source.select_related).iterator(chunk_size=chunk_size)
+        chunk = []
+        for obj in objects:
+            chunk.append(obj)
+            if len(chunk) >= chunk_size:
+                total += index_objects(kind, chunk)
+                chunk = []
+        total += index_objects(kind, chunk)
+    return total
+
+
+def search(query, kind=None, limit=50, user=None):
+    """بحث مرتب بـ bm25 من الفهرس وحده دون المرور على الجداول الأصلية.
+
+    مع user تُستبعد نتائج العقارات وطلبات الصيانة التي لا يملكها، باستعلام واحد لكل نوع في كل دفعة؛
+    والاستبعاد بعد LIMIT، فتُجلب دفعات تالية حتى تكتمل limit نتيجة أو تنفد المطابقات.
+    """
+    words = query_words(query)
+    if not words or not is_available():
+        return []
+    match = ' '.join('"%s"*' % word.replace('"', '""') for word in sorted(words))
+    sql = 'SELECT rowid, label, bm25(%s, 0, 10.0, 1.0) AS rank FROM %s WHERE %s MATCH %%s' % (TABLE, TABLE, TABLE)
+    params = [match]
+    if kind:
+        sql += ' AND rowid %%%% %d = %%s' % KIND_BITS
+        params.append(SOURCES[kind].code)
+    sql += ' ORDER BY rank LIMIT %s OFFSET %s'
+    scoped = user is not None and not user.is_superuser
+
+    results = []
+    offset = 0
+    while len(results) < limit:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit, offset])
+            rows = cursor.fetchall()
+        offset += len(rows)
+
+        allowed = {}
+        if scoped:
+            for kind_name, source in SOURCES.items():
+                if hasattr(source.model, 'owner_field'):
+                    pks = [rowid // KIND_BITS for rowid, label, rank in rows if rowid % KIND_BITS == source.code]
+                    allowed[kind_name] = set(source.model.objects.for_owner(user).filter(pk__in=pks).values_list('pk', flat=True)) if pks else set()
+
+        for rowid, label, rank in rows:
+            kind_name, source = SOURCES_BY_CODE[rowid % KIND_BITS]
+            pk = rowid // KIND_BITS
+            if kind_name in allowed and pk not in allowed[kind_name]:
+                continue
+            results.append({
+                'kind': kind_name,
+                'kind_label': source.label,
+                'id': pk,
+                'label': label,
+                'url': reverse(source.url_name, args=[pk]),
+                'rank': rank,
+            })
+        if len(rows) < limit:
+            break
+    return results[:limit]
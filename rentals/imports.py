@@ -0,0 +1,112 @@
+import csv
+from collections import namedtuple
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import caching, fulltext, occupancy
+from .bulk import Relation, row_form, lookup_maps, validate
+from .forms import PropertyForm, TenantForm, RentalContractForm
+from .models import Property, Tenant, RentalContract
+from .search import index_contracts
+from .versions import bump_version
+
+CHUNK_SIZE = 1000
+
+Importer = namedtuple('Importer', 'model form relations prepare index')
+
+
+def deactivate_expired(contract):
+    # bulk_create لا يستدعي save()، فنطبق قاعدة العقود المنتهية هنا
+    if contract.end_date < date.today():
+        contract.is_active = False
+
+
+IMPORTERS = {
+    'properties': Importer(
+        Property, PropertyForm,
+        {'user': Relation('user_id', User, 'username')},
+        None,
+        lambda pks: (fulltext.index_objects('property', Property.objects.filter(pk__in=pks)), occupancy.refresh(pks)),
+    ),
+    'tenants': Importer(
+        Tenant, TenantForm,
+        {'user': Relation('user_id', User, 'username')},
+        None,
+        lambda pks: fulltext.index_objects('tenant', Tenant.objects.select_related('user').filter(pk__in=pks)),
+    ),
+    'contracts': Importer(
+        RentalContract, RentalContractForm,
+        {
+            'unit': Relation('unit_id', Property, 'name'),
+            'tenant': Relation('tenant_id', Tenant, 'user__username'),
+        },
+        deactivate_expired,
+        lambda pks: (index_contracts(RentalContract.objects.filter(pk__in=pks)), occupancy.refresh_contracts(pks)),
+    ),
+}
+
+
+def columns(name):
+    """أسماء الأعمدة المقبولة: اسم الحقل أو عنوانه العربي في النموذج"""
+    importer = IMPORTERS[name]
+    form = importer.form.base_fields
+    aliases = {}
+    for field in list(form) + [column for column in importer.relations if column not in form]:
+        aliases[field] = field
+        label = form[field].label if field in form else importer.model._meta.get_field(field).verbose_name
+        aliases[str(label)] = field
+    return aliases
+
+
+def import_rows(name, lines, defaults=None, chunk_size=CHUNK_SIZE, dry_run=False, user=None):
+    """استيراد ملف CSV بالتحقق من كل صف بقواعد النموذج وإدراج الصحيح منها على دفعات.
+
+    defaults قيم بديلة لأعمدة العلاقات الفارغة (مثل مالك العقارات)، و user يقصر العلاقات على سجلاته.
+    تُرجع عدد السجلات المنشأة وقائمة (رقم السطر، الأخطاء) للصفوف المرفوضة.
+    """
+    importer = IMPORTERS[name]
+    defaults = defaults or {}
+    aliases = columns(name)
+    reader = csv.reader(lines)
+    try:
+        header = [aliases.get(column.strip(), column.strip()) for column in next(reader)]
+    except StopIteration:
+        raise ValueError('الملف فارغ')
+    required = {field for field, form_field in importer.form.base_fields.items() if form_field.required} | set(importer.relations)
+    missing = [field for field in required if field not in header and field not in defaults]
+    if missing:
+        raise ValueError('أعمدة ناقصة: %s' % '، '.join(sorted(missing)))
+
+    form_class = row_form(importer.model, importer.form, importer.relations)
+    maps = lookup_maps(importer.relations, user)
+    result = {'created': 0, 'errors': []}
+    chunk = []
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        chunk.append((reader.line_num, dict(zip(header, values))))
+        if len(chunk) >= chunk_size:
+            _import_chunk(importer, form_class, maps, defaults, chunk, result, dry_run)
+            chunk = []
+    if chunk:
+        _import_chunk(importer, form_class, maps, defaults, chunk, result, dry_run)
+
+    # bulk_create لا يرسل إشارات الحفظ، لذلك نبطل لقطات لوحة التحكم والتقارير يدويا
+    if result['created'] and not dry_run:
+        bump_version('dashboard', 'reports')
+        caching.invalidate(importer.model, [])
+    return result
+
+
+def _import_chunk(importer, form_class, maps, defaults, chunk, result, dry_run):
+    objects, errors = validate(form_class, maps, chunk, defaults=defaults, prepare=importer.prepare)
+    result['errors'].extend(errors)
+    if dry_run:
+        result['created'] += len(objects)
+        return
+    with transaction.atomic():
+        created = importer.model.objects.bulk_create(objects)
+        importer.index([obj.pk for obj in created])
+    result['created'] += len(created)
@@ -0,0 +1,11 @@
+# نقاط دخول عمليات العامل المنفصلة؛ تُستورد قبل تهيئة Django فلا تستورد النماذج في أعلى الملف
+
+
+def setup():
+    import django
+    django.setup()
+
+
+def execute(pk):
+    from .jobs import execute
+    execute(pk)
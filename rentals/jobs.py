@@ -0,0 +1,250 @@
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from . import billing, imports, job_worker, ledger, occupancy, pdf, reconciliation, streaming, sweeper
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+# مهام الطابور: func تستقبل المهمة ثم معاملاتها وتُرجع نتيجة تُحفظ بصيغة JSON.
+# max_attempts 1 للمهام التي تكتب على دفعات، فإعادتها بعد فشل جزئي تكرر ما كُتب
+Task = namedtuple('Task', 'func max_attempts')
+
+
+def job_dir(pk):
+    return os.path.join(settings.RENTALS_JOB_FILES_DIR, str(pk))
+
+
+def job_file(pk, name):
+    return os.path.join(job_dir(pk), os.path.basename(name))
+
+
+def save_upload(upload):
+    """حفظ ملف مرفوع على القرص حتى يقرأه العامل بعد انتهاء الطلب"""
+    directory = os.path.join(settings.RENTALS_JOB_FILES_DIR, 'uploads')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, '%s%s' % (uuid.uuid4().hex, os.path.splitext(upload.name)[1]))
+    with open(path, 'wb') as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+    return path
+
+
+def _import_rows(job, name, path, dry_run=False):
+    defaults = {'user': job.user.username} if job.user else None
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as lines:
+            return imports.import_rows(name, lines, defaults=defaults, dry_run=dry_run, user=job.user)
+    finally:
+        os.remove(path)
+
+
+def _invoice_pdf_batch(job, period):
+    period = billing.parse_period(period)
+    name = 'invoices-%s.zip' % period.strftime('%Y-%m')
+    path = job_file(job.pk, name)
+    os.makedirs(job_dir(job.pk), exist_ok=True)
+    files = list(pdf.invoice_batch(job.user, period))
+    with open(path + '.tmp', 'wb') as f:
+        for chunk in streaming.stream_zip(files):
+            f.write(chunk)
+    os.replace(path + '.tmp', path)
+    return {'file': name, 'invoices': len(files)}
+
+
+def _generate_invoices(job, period, due_day=1):
+    return {'created': billing.generate_invoices(billing.parse_period(period), due_day=due_day)}
+
+
+TASKS = {
+    'import_rows': Task(_import_rows, 1),
+    'invoice_pdf_batch': Task(_invoice_pdf_batch, 3),
+    'generate_invoices': Task(_generate_invoices, 1),
+    'sweep_statuses': Task(lambda job: sweeper.sweep(), 3),
+    'reconcile_invoices': Task(lambda job: reconciliation.reconcile(), 3),
+    'rebuild_balances': Task(lambda job: {'contracts': ledger.rebuild()}, 3),
+    'rebuild_occupancy': Task(lambda job: {'properties': occupancy.rebuild()}, 3),
+    'extend_occupancy': Task(lambda job: {'properties': occupancy.extend()}, 3),
+}
+
+
+def enqueue(task, user=None, run_at=None, **payload):
+    """إضافة مهمة للطابور وإرجاعها؛ داخل معاملة لا يراها العامل قبل تثبيتها"""
+    if task not in TASKS:
+        raise ValueError('مهمة غير معروفة: %s' % task)
+    return Job.objects.create(
+        task=task, payload=payload, user=user, run_at=run_at or timezone.now(), max_attempts=TASKS[task].max_attempts,
+    )
+
+
+def status(job):
+    """حالة المهمة للاستعلام الدوري؛ الخطأ يُختصر إلى سطره الأخير دون تتبع الاستدعاءات"""
+    return {
+        'id': job.pk,
+        'task': job.task,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_at': job.run_at,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error.strip() else None,
+    }
+
+
+# الحجز والتنفيذ
+
+def claim(worker, limit):
+    """حجز حتى limit مهمة مستحقة، الأقدم أولا.
+
+    الحجز UPDATE مشروط بأن المهمة ما زالت في الانتظار، فإذا سبق عامل آخر إليها لا يتغير
+    صف ولا تؤخذ مرتين؛ يعمل على SQLite و PostgreSQL دون أقفال صفوف.
+    """
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(status='queued', run_at__lte=now).order_by('run_at', 'pk').values_list('pk', flat=True)[:limit * 2]
+    )
+    claimed = []
+    for pk in candidates:
+        if len(claimed) == limit:
+            break
+        if Job.objects.filter(pk=pk, status='queued').update(status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1):
+            claimed.append(pk)
+    return claimed
+
+
+def retry_delay(attempts):
+    """مهلة أسية قبل المحاولة التالية مع تفاوت عشوائي حتى لا تعود المهام الفاشلة معا"""
+    base = getattr(settings, 'RENTALS_JOB_RETRY_DELAY', 10)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, 'RENTALS_JOB_MAX_RETRY_DELAY', 3600))
+    return delay * random.uniform(1, 1.25)
+
+
+def _fail(job, error):
+    # الشرط على المحاولة يمنع كتابة نتيجة محاولة أُعيدت للطابور بعد انتهاء مهلتها
+    running = Job.objects.filter(pk=job.pk, status='running', attempts=job.attempts)
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        running.update(status='queued', error=error, locked_by='', locked_at=None, run_at=now + timedelta(seconds=retry_delay(job.attempts)))
+    else:
+        running.update(status='failed', error=error, finished_at=now)
+
+
+def execute(pk):
+    """تنفيذ مهمة محجوزة وحفظ نتيجتها، أو إعادتها للطابور عند الفشل ما بقيت لها محاولات"""
+    try:
+        job = Job.objects.select_related('user').get(pk=pk)
+        task = TASKS.get(job.task)
+        try:
+            if task is None:
+                raise LookupError('مهمة غير معروفة: %s' % job.task)
+            result = task.func(job, **job.payload)
+        except Exception:
+            error = traceback.format_exc()
+            logger.warning('فشلت المهمة %s في المحاولة %d من %d\n%s', job, job.attempts, job.max_attempts, error)
+            _fail(job, error)
+        else:
+            Job.objects.filter(pk=pk, status='running', attempts=job.attempts).update(
+                status='succeeded', result=result, error='', finished_at=timezone.now(),
+            )
+    finally:
+        close_old_connections()
+
+
+def release_stale(timeout=None):
+    """المهام التي بقيت قيد التنفيذ بعد المهلة توقف عاملها، فتُعاد للطابور أو تفشل"""
+    timeout = timeout or getattr(settings, 'RENTALS_JOB_TIMEOUT', 3600)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = list(Job.objects.filter(status='running', locked_at__lt=cutoff))
+    for job in stale:
+        _fail(job, 'انتهت مهلة التنفيذ (%d ثانية) لدى العامل %s' % (timeout, job.locked_by))
+    return len(stale)
+
+
+def purge(days=None):
+    """حذف المهام المنتهية الأقدم من RENTALS_JOB_RETENTION_DAYS مع ملفاتها"""
+    days = days or getattr(settings, 'RENTALS_JOB_RETENTION_DAYS', 7)
+    finished = Job.objects.filter(status__in=('succeeded', 'failed'), finished_at__lt=timezone.now() - timedelta(days=days))
+    pks = list(finished.values_list('pk', flat=True))
+    for pk in pks:
+        shutil.rmtree(job_dir(pk), ignore_errors=True)
+    Job.objects.filter(pk__in=pks).delete()
+    return len(pks)
+
+
+# العامل
+
+def _pool(workers, processes):
+    # العمليات تبدأ بـ spawn فتُهيأ Django فيها قبل أول مهمة (job_worker)
+    if processes:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=job_worker.setup)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rentals-job')
+
+
+def work(workers=2, processes=False, poll_interval=1.0, once=False, stop=None, name=None):
+    """حلقة العامل: تحجز من المهام بقدر ما في المجمع من أماكن فارغة وتنتظر انتهاء إحداها.
+
+    processes يستخدم عمليات بدل الخيوط للمهام التي تشغل المعالج. once يُنهي الحلقة
+    عندما يفرغ الطابور، و stop (threading.Event) يوقفها بعد إكمال المهام الجارية.
+    تُرجع عدد المهام المنفذة.
+    """
+    name = name or '%s:%d' % (socket.gethostname(), os.getpid())
+    stop = stop or threading.Event()
+    executor = _pool(workers, processes)
+    running, processed, maintenance_at = {}, 0, 0
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            if time.monotonic() >= maintenance_at:
+                release_stale()
+                purge()
+                maintenance_at = time.monotonic() + 60
+            free = workers - len(running)
+            claimed = claim(name, free) if free else []
+            target = job_worker.execute if processes else execute
+            for pk in claimed:
+                running[executor.submit(target, pk)] = pk
+            processed += len(claimed)
+            if once and not running:
+                break
+            if claimed and len(running) < workers:
+                continue
+            if not running:
+                stop.wait(poll_interval)
+                continue
+            done, pending = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                pk = running.pop(future)
+                if future.exception() is None:
+                    continue
+                # execute يسجل أخطاء المهام بنفسه؛ هنا تصل فقط أعطال العامل مثل موت عملية
+                logger.error('توقف تنفيذ المهمة %d في العامل %s: %r', pk, name, future.exception())
+                job = Job.objects.filter(pk=pk, status='running').first()
+                if job is not None:
+                    _fail(job, repr(future.exception()))
+                if isinstance(future.exception(), BrokenProcessPool):
+                    executor.shutdown(wait=False)
+                    executor = _pool(workers, processes)
+    finally:
+        executor.shutdown(wait=True)
+        close_old_connections()
+    return processed
@@ -0,0 +1,107 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Sum
+
+from .models import Property, Tenant, RentalContract, Invoice, Payment, Balance
+
+ZERO = Decimal('0.00')
+
+# نطاق الرصيد -> حقل الصف في جدول الأرصدة
+GROUPS = (('tenant', 'tenant'), ('property', 'unit'))
+SCOPES = {RentalContract: ('contract', 'contract'), Tenant: ('tenant', 'tenant'), Property: ('property', 'unit')}
+
+
+def _contract_rows(contract_ids):
+    """صفوف أرصدة العقود باستعلامين مجمعين: الفواتير والدفعات"""
+    contracts = RentalContract.objects.filter(pk__in=contract_ids).values_list('pk', 'tenant_id', 'unit_id')
+    invoiced = dict(
+        Invoice.objects.filter(contract__in=contract_ids).order_by()
+        .values('contract').annotate(total=Sum('amount')).values_list('contract', 'total')
+    )
+    paid = {
+        row['invoice__contract']: row
+        for row in Payment.objects.filter(invoice__contract__in=contract_ids).order_by()
+        .values('invoice__contract').annotate(total=Sum('amount_paid'), last=Max('payment_date'))
+    }
+    rows = []
+    for pk, tenant_id, unit_id in contracts:
+        total_invoiced = invoiced.get(pk) or ZERO
+        payments = paid.get(pk, {})
+        total_paid = payments.get('total') or ZERO
+        rows.append(Balance(
+            scope='contract', contract_id=pk, tenant_id=tenant_id, unit_id=unit_id,
+            invoiced=total_invoiced, paid=total_paid, outstanding=total_invoiced - total_paid,
+            last_payment_date=payments.get('last'),
+        ))
+    return rows
+
+
+def _group_rows(scope, field, contract_balances):
+    """أرصدة المستأجرين أو العقارات مجمعة من صفوف عقودها"""
+    rows = (
+        contract_balances.order_by()
+        .values(field).annotate(invoiced=Sum('invoiced'), paid=Sum('paid'), last=Max('last_payment_date'))
+        .iterator()
+    )
+    return (
+        Balance(
+            scope=scope, **{field + '_id': row[field]},
+            invoiced=row['invoiced'], paid=row['paid'], outstanding=row['invoiced'] - row['paid'],
+            last_payment_date=row['last'],
+        )
+        for row in rows
+    )
+
+
+def refresh(contract_ids=()):
+    """إعادة حساب أرصدة العقود المحددة ومستأجريها وعقاراتها داخل معاملة واحدة.
+
+    الصفوف تُحذف وتُدرج من جديد؛ العقد المحذوف يختفي صفه، والعقد الذي تغير مستأجره
+    أو عقاره يُعاد حساب المستأجر أو العقار السابق من صف العقد القديم.
+    """
+    contract_ids = set(contract_ids)
+    if not contract_ids:
+        return
+    with transaction.atomic():
+        affected = {field: set() for scope, field in GROUPS}
+        old = Balance.objects.filter(scope='contract', contract__in=contract_ids).values_list('tenant_id', 'unit_id')
+        rows = _contract_rows(contract_ids)
+        for tenant_id, unit_id in list(old) + [(row.tenant_id, row.unit_id) for row in rows]:
+            affected['tenant'].add(tenant_id)
+            affected['unit'].add(unit_id)
+
+        Balance.objects.filter(scope='contract', contract__in=contract_ids).delete()
+        Balance.objects.bulk_create(rows)
+        for scope, field in GROUPS:
+            ids = affected[field]
+            Balance.objects.filter(scope=scope, **{field + '__in': ids}).delete()
+            contract_balances = Balance.objects.filter(scope='contract', **{field + '__in': ids})
+            Balance.objects.bulk_create(list(_group_rows(scope, field, contract_balances)))
+
+
+def refresh_invoices(invoice_ids):
+    refresh(Invoice.objects.filter(pk__in=invoice_ids).values_list('contract_id', flat=True))
+
+
+def refresh_payments(payment_ids):
+    refresh(Payment.objects.filter(pk__in=payment_ids).values_list('invoice__contract_id', flat=True))
+
+
+def rebuild(chunk_size=1000):
+    """إعادة بناء جدول الأرصدة كاملا: العقود على دفعات ثم المستأجرون والعقارات باستعلام مجمع لكل منهما"""
+    with transaction.atomic():
+        Balance.objects.all().delete()
+        ids = list(RentalContract.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(ids), chunk_size):
+            Balance.objects.bulk_create(_contract_rows(ids[start:start + chunk_size]))
+        for scope, field in GROUPS:
+            Balance.objects.bulk_create(_group_rows(scope, field, Balance.objects.filter(scope='contract')), batch_size=chunk_size)
+    return len(ids)
+
+
+def balance_of(obj):
+    """رصيد عقد أو مستأجر أو عقار بقراءة صف واحد، وأصفار لمن لا فواتير له"""
+    scope, field = SCOPES[type(obj)]
+    balance = Balance.objects.filter(scope=scope, **{field: obj}).first()
+    return balance or Balance(scope=scope, **{field: obj})
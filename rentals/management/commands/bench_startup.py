@@ -0,0 +1,81 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# يُنفَّذ في عملية مستقلة لمحاكاة إقلاع عامل WSGI جديد. eager يستورد ما كانت views.py
+# تستورده قبل الفصل؛ lazy يقلع دونه ثم يقيس أول تقرير: بناء مواصفات الرسم وحساب التوقع
+# الذي يحمّل numpy عند أول استدعاء، أي التكلفة التي انتقلت من الإقلاع إلى أول طلب.
+# pandas لم تعد من متطلبات المشروع و plotly.express تتطلبها، فتُتخطيان إذا لم تكن مثبتة
+WORKER_SCRIPT = """
+import json, resource, sys, time
+from datetime import date
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+pandas = None
+if sys.argv[1] == 'eager':
+    try:
+        import pandas
+        import plotly.express
+    except ImportError:
+        pass
+    import plotly.offline
+elapsed = time.perf_counter() - start
+first_report = None
+if sys.argv[1] == 'lazy':
+    start = time.perf_counter()
+    from rentals import forecast, reports
+    month = forecast.month_index(date.today())
+    reports.chart_from_series([{'period': date.today(), 'total': 1}], 'month')
+    forecast.rent_roll([(True, date.today(), date.today(), 1.0)], month, forecast.MIN_MONTHS, month)
+    first_report = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss //= 1024
+print(json.dumps({'seconds': elapsed, 'first_report_seconds': first_report, 'rss_kb': rss, 'pandas': pandas is not None}))
+"""
+
+MODES = (
+    ('eager', 'قبل الفصل (تحميل pandas و plotly عند الإقلاع)'),
+    ('lazy', 'بعد الفصل (تحميل numpy عند أول تقرير، والرسوم تُبنى في المتصفح)'),
+)
+
+
+class Command(BaseCommand):
+    help = 'قياس زمن الإقلاع والذاكرة لكل عامل قبل وبعد فصل مكتبات التقارير'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='عدد مرات القياس لكل وضع')
+
+    def run_worker(self, mode):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'bait_alhamad.settings'))
+        result = subprocess.run(
+            [sys.executable, '-c', WORKER_SCRIPT, mode],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode, label in MODES:
+            samples = [self.run_worker(mode) for _ in range(options['runs'])]
+            seconds = statistics.median(sample['seconds'] for sample in samples)
+            rss_mb = statistics.median(sample['rss_kb'] for sample in samples) / 1024
+            results[mode] = (seconds, rss_mb)
+            self.stdout.write(f'{label}: {seconds * 1000:.0f} ms, {rss_mb:.1f} MB')
+            if mode == 'eager' and not samples[0]['pandas']:
+                self.stdout.write(self.style.WARNING('  pandas غير مثبتة، فالقياس دون pandas و plotly.express ويقل عن التكلفة الفعلية'))
+            if mode == 'lazy':
+                first_report = statistics.median(sample['first_report_seconds'] for sample in samples)
+                self.stdout.write(f'  أول تقرير بعد الإقلاع: {first_report * 1000:.0f} ms (الذاكرة أعلاه تشمله)')
+
+        saved_seconds = results['eager'][0] - results['lazy'][0]
+        saved_mb = results['eager'][1] - results['lazy'][1]
+        self.stdout.write(self.style.SUCCESS(f'التوفير لكل عامل: {saved_seconds * 1000:.0f} ms, {saved_mb:.1f} MB'))
@@ -0,0 +1,44 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals import exports
+from rentals.billing import parse_period, period_end
+
+
+class Command(BaseCommand):
+    help = 'تصدير العقود أو الفواتير أو الدفعات إلى ملف CSV أو XLSX دون تحميل الجدول في الذاكرة'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(exports.EXPORTS), help='نوع البيانات المصدّرة')
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv', help='صيغة الملف')
+        parser.add_argument('--output', help='مسار الملف (الافتراضي: اسم تلقائي في المجلد الحالي، و - للمخرج القياسي)')
+        parser.add_argument('--period', help='حصر التصدير في شهر بصيغة YYYY-MM')
+
+    def handle(self, *args, **options):
+        name, fmt = options['name'], options['format']
+        start_date = end_date = None
+        if options['period']:
+            try:
+                start_date = parse_period(options['period'])
+            except ValueError:
+                raise CommandError('صيغة الفترة غير صحيحة، استخدم YYYY-MM')
+            end_date = period_end(start_date)
+
+        output = options['output'] or exports.filename(name, fmt)
+        started = time.perf_counter()
+        chunks = exports.stream(name, fmt, start_date=start_date, end_date=end_date)
+        if output == '-':
+            target = sys.stdout.buffer
+            self._write(target, chunks)
+            target.flush()
+            return
+        with open(output, 'wb') as target:
+            self._write(target, chunks)
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(f'تم التصدير إلى {output} خلال {elapsed:.2f} ثانية'))
+
+    def _write(self, target, chunks):
+        for chunk in chunks:
+            target.write(chunk.encode() if isinstance(chunk, str) else chunk)
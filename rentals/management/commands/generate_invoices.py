@@ -0,0 +1,28 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals.billing import generate_invoices, parse_period
+
+
+class Command(BaseCommand):
+    help = 'إصدار فواتير الشهر لكل عقود الإيجار النشطة'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', help='شهر الفوترة بصيغة YYYY-MM (الافتراضي: الشهر الحالي)')
+        parser.add_argument('--due-day', type=int, default=1, help='يوم الاستحقاق داخل الشهر')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='عدد الفواتير في كل معاملة')
+
+    def handle(self, *args, **options):
+        try:
+            period = parse_period(options['period']) if options['period'] else date.today()
+        except ValueError:
+            raise CommandError('صيغة الفترة غير صحيحة، استخدم YYYY-MM')
+        if not 1 <= options['due_day'] <= 31:
+            raise CommandError('يوم الاستحقاق يجب أن يكون بين 1 و 31')
+
+        started = time.perf_counter()
+        created = generate_invoices(period, due_day=options['due_day'], chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'تم إصدار {created} فاتورة للفترة {period:%Y-%m} خلال {elapsed:.2f} ثانية'))
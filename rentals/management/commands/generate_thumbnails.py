@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rentals import thumbnails
+from rentals.models import Document
+
+
+class Command(BaseCommand):
+    help = 'توليد الصور المصغرة للمستندات التي لا صورة لها (مثل الملفات المرفوعة قبل تفعيل المعاينة)'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        names = Document.objects.exclude(file='').order_by().values_list('file', flat=True).distinct()
+        futures = [future for future in map(thumbnails.schedule, names.iterator(chunk_size=500)) if future is not None]
+        created = sum(1 for future in futures if future.exception() is None and future.result())
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'تم توليد {created} صورة مصغرة من {len(futures)} ملف خلال {elapsed:.2f} ثانية'))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals import imports
+
+
+class Command(BaseCommand):
+    help = 'استيراد العقارات أو المستأجرين أو العقود من ملف CSV مع التحقق من كل صف'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(imports.IMPORTERS), help='نوع البيانات المستوردة')
+        parser.add_argument('path', help='مسار ملف CSV (UTF-8)')
+        parser.add_argument('--owner', help='اسم مستخدم المالك للعقارات التي لا تحدد عمود user')
+        parser.add_argument('--chunk-size', type=int, default=imports.CHUNK_SIZE, help='عدد الصفوف في كل معاملة')
+        parser.add_argument('--dry-run', action='store_true', help='التحقق من الملف دون حفظ')
+
+    def handle(self, *args, **options):
+        defaults = {'user': options['owner']} if options['owner'] else None
+        started = time.perf_counter()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+                result = imports.import_rows(
+                    options['name'], lines, defaults=defaults,
+                    chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+                )
+        except (OSError, UnicodeDecodeError, ValueError) as exc:
+            raise CommandError(exc)
+        elapsed = time.perf_counter() - started
+
+        for line, errors in result['errors']:
+            for field, messages in errors.items():
+                self.stderr.write(f'سطر {line}: {field}: {" ".join(messages)}')
+        verb = 'صف صالح' if options['dry_run'] else 'سجل مستورد'
+        self.stdout.write(self.style.SUCCESS(
+            f'{result["created"]} {verb}، {len(result["errors"])} صف مرفوض، خلال {elapsed:.2f} ثانية'
+        ))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rentals import ledger
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء أرصدة العقود والمستأجرين والعقارات من الفواتير والدفعات'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='عدد العقود في كل دفعة')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = ledger.rebuild(chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'أعيد حساب أرصدة {total} عقد في {elapsed:.2f} ثانية'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from rentals.models import RentalContract
+from rentals.search import index_contracts
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء فهرس بحث العقود بالكامل'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='عدد العقود في كل دفعة')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        ids = list(RentalContract.objects.order_by('pk').values_list('pk', flat=True))
+        total = 0
+        for start in range(0, len(ids), chunk_size):
+            total += index_contracts(RentalContract.objects.filter(pk__in=ids[start:start + chunk_size]))
+        self.stdout.write(self.style.SUCCESS(f'تمت فهرسة {len(ids)} عقد ({total} كلمة)'))
@@ -0,0 +1,43 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from rentals.models import Blob, Document
+from rentals.storage import document_storage
+
+
+class Command(BaseCommand):
+    help = 'نقل المستندات القديمة إلى التخزين حسب بصمة المحتوى وإعادة حساب مراجع الملفات'
+
+    def handle(self, *args, **options):
+        storage = document_storage()
+        moved = 0
+        legacy = Document.objects.exclude(file='').only('pk', 'file').order_by('pk')
+        for document in legacy.iterator(chunk_size=500):
+            old = document.file.name
+            if storage.digest(old) or not storage.exists(old):
+                continue
+            with storage.open(old) as content:
+                new = storage.save(old, File(content))
+            # update() بدلا من save() حتى لا تُعد المراجع مرتين؛ تُحسب كلها في الخطوة التالية
+            Document.objects.filter(pk=document.pk).update(file=new)
+            if not Document.objects.filter(file=old).exists():
+                storage.delete(old)
+            moved += 1
+
+        # عدد المراجع من استعلام مجمّع واحد، ثم حذف الملفات التي لا يشير إليها أي مستند
+        counts = {
+            row['file']: row['references']
+            for row in Document.objects.exclude(file='').values('file').annotate(references=Count('pk'))
+            if storage.digest(row['file'])
+        }
+        for name, references in counts.items():
+            Blob.objects.update_or_create(
+                name=name,
+                defaults={'digest': storage.digest(name), 'size': storage.size(name), 'references': references},
+            )
+        orphans = list(Blob.objects.exclude(name__in=counts).values_list('name', flat=True))
+        for name in orphans:
+            storage.delete(name)
+        Blob.objects.filter(name__in=orphans).delete()
+        self.stdout.write(self.style.SUCCESS(f'نُقل {moved} مستند، {len(counts)} ملف مخزن، حُذف {len(orphans)} ملف دون مراجع'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals import fulltext
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء فهرس البحث النصي للعقارات والمستأجرين وطلبات الصيانة والمستندات'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='عدد السجلات في كل دفعة')
+
+    def handle(self, *args, **options):
+        if not fulltext.is_available():
+            raise CommandError('البحث النصي يتطلب قاعدة بيانات SQLite مع FTS5')
+        total = fulltext.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'تمت فهرسة {total} سجل'))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rentals import occupancy
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء جدول الإشغال الشهري من فترات العقود، أو إضافة صفوف الشهر الجديد فقط (--extend، يوميا عبر cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=occupancy.CHUNK_SIZE, help='عدد العقارات في كل دفعة')
+        parser.add_argument('--extend', action='store_true', help='حساب العقارات التي ليس لها صف للشهر الحالي فقط')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['extend']:
+            total = occupancy.extend()
+        else:
+            total = occupancy.rebuild(chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'أعيد حساب إشغال {total} عقار في {elapsed:.2f} ثانية'))
@@ -0,0 +1,32 @@
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from rentals import jobs
+
+
+class Command(BaseCommand):
+    help = 'تشغيل عامل طابور مهام الخلفية (الاستيراد، ملفات PDF، التحديثات الدورية) دون وسيط خارجي'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'RENTALS_JOB_WORKERS', 2), help='عدد المهام المنفذة في الوقت نفسه')
+        parser.add_argument('--processes', action='store_true', help='عمليات منفصلة بدل الخيوط للمهام التي تشغل المعالج')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='الثواني بين فحص الطابور عندما يكون فارغا')
+        parser.add_argument('--once', action='store_true', help='التوقف عندما يفرغ الطابور')
+
+    def handle(self, *args, **options):
+        # SIGTERM و Ctrl+C يوقفان أخذ مهام جديدة وتكتمل المهام الجارية
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        started = time.perf_counter()
+        processed = jobs.work(
+            workers=options['workers'], processes=options['processes'],
+            poll_interval=options['poll_interval'], once=options['once'], stop=stop,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'نُفذت {processed} مهمة خلال {elapsed:.2f} ثانية'))
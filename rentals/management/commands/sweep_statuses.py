@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rentals.sweeper import sweep
+
+
+class Command(BaseCommand):
+    help = 'إنهاء العقود المنتهية وتعليم الفواتير المتأخرة ومزامنة حالة العقارات (يُشغّل دوريا عبر cron)'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        changed = sweep()
+        elapsed = time.perf_counter() - started
+        for name, count in changed.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'اكتمل التحديث خلال {elapsed:.3f} ثانية'))
@@ -0,0 +1,109 @@
+import threading
+from bisect import bisect_left
+
+# حدود مدرج زمن الطلب بالثواني، كما في عملاء Prometheus الافتراضية
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class ViewStats:
+    __slots__ = ('requests', 'buckets', 'duration', 'queries', 'duplicates', 'query_time', 'template_time', 'max_queries')
+
+    def __init__(self):
+        self.requests = 0
+        self.buckets = [0] * len(BUCKETS)
+        self.duration = 0.0
+        self.queries = 0
+        self.duplicates = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.max_queries = 0
+
+
+class Registry:
+    """مجاميع القياسات لكل view داخل العملية الحالية.
+
+    كل عملية خادم تحتفظ بمجاميعها، و Prometheus يجمعها من كل عملية حسب الوسم instance.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view, duration, queries, duplicates, query_time, template_time):
+        with self.lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats()
+            stats.requests += 1
+            index = bisect_left(BUCKETS, duration)
+            if index < len(BUCKETS):
+                stats.buckets[index] += 1
+            stats.duration += duration
+            stats.queries += queries
+            stats.duplicates += duplicates
+            stats.query_time += query_time
+            stats.template_time += template_time
+            stats.max_queries = max(stats.max_queries, queries)
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def snapshot(self):
+        with self.lock:
+            return {view: _copy(stats) for view, stats in self.views.items()}
+
+
+def _copy(stats):
+    copy = ViewStats()
+    for name in ViewStats.__slots__:
+        value = getattr(stats, name)
+        setattr(copy, name, list(value) if isinstance(value, list) else value)
+    return copy
+
+
+registry = Registry()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# (الاسم، النوع، الوصف، الحقل في ViewStats)
+COUNTERS = (
+    ('rentals_request_queries_total', 'counter', 'SQL queries executed while handling requests', 'queries'),
+    ('rentals_request_duplicate_queries_total', 'counter', 'Queries repeating SQL already run in the same request (N+1)', 'duplicates'),
+    ('rentals_request_query_seconds_total', 'counter', 'Time spent in SQL queries', 'query_time'),
+    ('rentals_template_render_seconds_total', 'counter', 'Time spent rendering templates', 'template_time'),
+    ('rentals_request_max_queries', 'gauge', 'Most queries seen in a single request', 'max_queries'),
+)
+
+
+def render_prometheus(snapshot=None):
+    """القياسات بصيغة Prometheus النصية (text/plain; version=0.0.4)"""
+    snapshot = registry.snapshot() if snapshot is None else snapshot
+    views = sorted(snapshot)
+    lines = [
+        '# HELP rentals_request_duration_seconds Wall time of requests by view',
+        '# TYPE rentals_request_duration_seconds histogram',
+    ]
+    for view in views:
+        stats = snapshot[view]
+        label = 'view="%s"' % _label(view)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, stats.buckets):
+            cumulative += count
+            lines.append('rentals_request_duration_seconds_bucket{%s,le="%s"} %d' % (label, bound, cumulative))
+        lines.append('rentals_request_duration_seconds_bucket{%s,le="+Inf"} %d' % (label, stats.requests))
+        lines.append('rentals_request_duration_seconds_sum{%s} %s' % (label, _number(stats.duration)))
+        lines.append('rentals_request_duration_seconds_count{%s} %d' % (label, stats.requests))
+    for name, kind, help_text, field in COUNTERS:
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for view in views:
+            lines.append('%s{view="%s"} %s' % (name, _label(view), _number(getattr(snapshot[view], field))))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+from .metrics import registry
+
+logger = logging.getLogger('rentals.performance')
+
+# قياسات الطلب الجاري؛ ContextVar حتى لا تختلط الطلبات بين الخيوط
+_current = ContextVar('rentals_request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.statements = Counter()
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        # الاستعلامات المتزامنة في الواجهات غير المتزامنة تُسجل من عدة خيوط
+        self.lock = threading.Lock()
+
+    @property
+    def queries(self):
+        return sum(self.statements.values())
+
+    @property
+    def duplicates(self):
+        # نص SQL نفسه بمعاملات مختلفة يتكرر في كل صف عند N+1
+        return sum(count - 1 for count in self.statements.values())
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.query_time += elapsed
+                self.statements[sql] += 1
+
+
+def _record_query(execute, sql, params, many, context):
+    # ContextVar ينتقل مع sync_to_async، فاستعلامات خيوط الواجهات غير المتزامنة تُحسب على طلبها
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def _watch_connection(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install_query_counter():
+    # الاتصالات تُنشأ لكل خيط، فيُضاف المسجل لكل اتصال جديد وللمفتوح منها الآن
+    connection_created.connect(_watch_connection, dispatch_uid='rentals_query_counter')
+    for connection in connections.all(initialized_only=True):
+        _watch_connection(connection)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        # القالب الخارجي فقط يُحسب؛ include و extends تُعرض داخله دون المرور بالمحرك
+        metrics = _current.get()
+        if metrics is None or metrics.template_depth:
+            return super().render(context, request)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics.template_depth -= 1
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """محرك قوالب Django يقيس زمن العرض للطلب الجاري؛ يُفعّل في BACKEND ضمن TEMPLATES.
+
+    render و TemplateResponse و render_to_string تمر كلها بالمحرك، فلا حاجة لتعديل
+    Template على مستوى العملية.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match._func_path
+
+
+class PerformanceMiddleware:
+    """زمن كل طلب وعدد استعلاماته ومكرراتها وزمن القوالب، مجمعة لكل view.
+
+    المجاميع تُعرض في /metrics/ بصيغة Prometheus، والطلبات التي تتجاوز
+    RENTALS_SLOW_REQUEST_MS أو RENTALS_SLOW_REQUEST_QUERIES تُسجل في rentals.performance.
+    الاستجابات المبثوثة تُقاس حتى بداية البث فقط. تعمل مع WSGI و ASGI معا.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        install_query_counter()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, time.perf_counter() - started, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, time.perf_counter() - started, metrics)
+        return response
+
+    def finish(self, request, duration, metrics):
+        view = view_name(request)
+        registry.record(view, duration, metrics.queries, metrics.duplicates, metrics.query_time, metrics.template_time)
+        self.log_slow(request, view, duration, metrics)
+
+    def log_slow(self, request, view, duration, metrics):
+        slow_ms = getattr(settings, 'RENTALS_SLOW_REQUEST_MS', 500)
+        max_queries = getattr(settings, 'RENTALS_SLOW_REQUEST_QUERIES', 50)
+        if duration * 1000 < slow_ms and metrics.queries < max_queries:
+            return
+        repeated = [(count, sql) for sql, count in metrics.statements.most_common(3) if count > 1]
+        logger.warning(
+            'طلب بطيء %s %s (%s): %.0f ms، %d استعلام (%d مكرر، %.0f ms)، القوالب %.0f ms%s',
+            request.method, request.get_full_path(), view, duration * 1000,
+            metrics.queries, metrics.duplicates, metrics.query_time * 1000, metrics.template_time * 1000,
+            ''.join('\n  ×%d %s' % (count, sql[:300]) for count, sql in repeated),
+        )
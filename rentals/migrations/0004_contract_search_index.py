@@ -0,0 +1,90 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:43
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# نسخة مجمدة من المُقسِّم في rentals.search كما كان عند كتابة الترحيل، حتى لا يتغير
+# ناتج الترحيل أو ينكسر إذا تغيرت وحدة البحث لاحقا
+ARABIC_DIACRITICS = re.compile('[\u064b-\u0652\u0670\u0640]')
+ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+WORD = re.compile(r'\w+')
+ARTICLE = 'ال'
+TERM_MAX_LENGTH = 100
+
+CONTRACT_FIELDS = {
+    'tenant_name': lambda contract: [contract.tenant.user.username, contract.tenant.user.first_name, contract.tenant.user.last_name],
+    'company_name': lambda contract: [contract.tenant.company_name],
+    'registration_number': lambda contract: [contract.tenant.commercial_registration_number],
+    'property_name': lambda contract: [contract.unit.name],
+}
+
+
+def tokenize(text):
+    words = set()
+    for word in WORD.findall(ARABIC_DIACRITICS.sub('', text or '').translate(ARABIC_FOLDING).casefold()):
+        words.add(word[:TERM_MAX_LENGTH])
+        if word.startswith(ARTICLE) and len(word) > len(ARTICLE) + 1:
+            word = word[len(ARTICLE):]
+        words.add(word[:TERM_MAX_LENGTH])
+    return words
+
+
+def index_existing_contracts(apps, schema_editor):
+    RentalContract = apps.get_model('rentals', 'RentalContract')
+    ContractSearchTerm = apps.get_model('rentals', 'ContractSearchTerm')
+    terms = []
+    for contract in RentalContract.objects.select_related('tenant__user', 'unit').iterator(chunk_size=1000):
+        for field, values in CONTRACT_FIELDS.items():
+            words = set()
+            for value in values(contract):
+                words |= tokenize(value)
+            terms.extend(ContractSearchTerm(contract_id=contract.pk, field=field, term=word) for word in words)
+    ContractSearchTerm.objects.bulk_create(terms, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0003_invoice_payment_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=30, verbose_name='الحقل')),
+                ('term', models.CharField(max_length=100, verbose_name='الكلمة')),
+            ],
+            options={
+                'verbose_name': 'كلمة بحث العقود',
+                'verbose_name_plural': 'فهرس بحث العقود',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='rentalcontract',
+            index=models.Index(fields=['start_date'], name='contract_start_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentalcontract',
+            index=models.Index(fields=['end_date'], name='contract_end_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='contractsearchterm',
+            name='contract',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='rentals.rentalcontract', verbose_name='عقد الإيجار'),
+        ),
+        migrations.AddIndex(
+            model_name='contractsearchterm',
+            index=models.Index(fields=['field', 'term'], name='contract_search_term_idx'),
+        ),
+        migrations.RunPython(index_existing_contracts, migrations.RunPython.noop),
+    ]
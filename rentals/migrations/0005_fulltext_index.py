@@ -0,0 +1,88 @@
+import re
+
+from django.db import migrations
+
+# نسخة مجمدة من rentals.fulltext كما كانت عند كتابة الترحيل، حتى لا يتغير ناتج الترحيل
+# أو ينكسر إذا تغيرت الوحدة لاحقا؛ أمر rebuild_fulltext_index يعيد البناء بالكود الحالي
+TABLE = 'rentals_search'
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5("
+    "label UNINDEXED, title, body, tokenize='unicode61 remove_diacritics 2', prefix='2 3')" % TABLE
+)
+DROP_TABLE = 'DROP TABLE IF EXISTS %s' % TABLE
+KIND_BITS = 8
+
+ARABIC_DIACRITICS = re.compile('[\u064b-\u0652\u0670\u0640]')
+ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+WORD = re.compile(r'\w+')
+ARTICLE = 'ال'
+
+# (النموذج، رمز النوع في rowid، select_related، العنوان، النص)
+SOURCES = (
+    ('Property', 1, (),
+     lambda obj: obj.name,
+     lambda obj: [obj.address, obj.description]),
+    ('Tenant', 2, ('user',),
+     lambda obj: obj.company_name or ' '.join(filter(None, [obj.user.first_name, obj.user.last_name])) or obj.user.username,
+     lambda obj: [obj.user.username, obj.user.first_name, obj.user.last_name, obj.commercial_registration_number, obj.address, obj.phone_number]),
+    ('MaintenanceRequest', 3, (),
+     lambda obj: obj.title,
+     lambda obj: [obj.description]),
+    ('Document', 4, (),
+     lambda obj: obj.title,
+     lambda obj: [obj.description]),
+)
+
+
+def strip_article(word):
+    if word.startswith(ARTICLE) and len(word) > len(ARTICLE) + 1:
+        return word[len(ARTICLE):]
+    return word
+
+
+def index_text(*values):
+    text = ARABIC_DIACRITICS.sub('', ' '.join(value for value in values if value)).translate(ARABIC_FOLDING).casefold()
+    words = WORD.findall(text)
+    return ' '.join([text] + [strip_article(word) for word in words if strip_article(word) != word])
+
+
+def create_index(apps, schema_editor):
+    # الفهرس النصي يعتمد على FTS5 في SQLite فقط
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    insert = 'INSERT INTO %s (rowid, label, title, body) VALUES (%%s, %%s, %%s, %%s)' % TABLE
+    with schema_editor.connection.cursor() as cursor:
+        for model_name, code, select_related, title, body in SOURCES:
+            model = apps.get_model('rentals', model_name)
+            rows = []
+            for obj in model.objects.select_related(*select_related).iterator(chunk_size=1000):
+                label = title(obj) or ''
+                rows.append((obj.pk * KIND_BITS + code, label, index_text(label), index_text(*body(obj))))
+                if len(rows) >= 1000:
+                    cursor.executemany(insert, rows)
+                    rows = []
+            cursor.executemany(insert, rows)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(DROP_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0004_contract_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0005_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='period',
+            field=models.DateField(blank=True, null=True, verbose_name='فترة الفوترة'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('contract', 'period'), name='invoice_contract_period_unique'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:10
+
+import rentals.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0007_invoice_status_due_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='مسار الملف')),
+                ('digest', models.CharField(max_length=64, verbose_name='البصمة')),
+                ('size', models.PositiveBigIntegerField(verbose_name='الحجم')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='عدد المراجع')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+            ],
+            options={
+                'verbose_name': 'ملف مخزن',
+                'verbose_name_plural': 'الملفات المخزنة',
+            },
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=rentals.storage.document_storage, upload_to='documents/', verbose_name='ملف المستند'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0008_document_blobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['contract', 'status', 'due_date'], name='invoice_contract_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenancerequest',
+            index=models.Index(fields=['unit', 'status'], name='maintenance_unit_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['user', 'status'], name='property_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentalcontract',
+            index=models.Index(fields=['unit', 'is_active'], name='contract_unit_active_idx'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:21
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Sum
+
+# نسخة مجمدة من ledger.rebuild كما كانت عند كتابة الترحيل، حتى لا يتغير ناتج الترحيل
+# أو ينكسر إذا تغيرت الوحدة لاحقا؛ أمر rebuild_balances يعيد البناء بالكود الحالي
+CHUNK_SIZE = 1000
+ZERO = Decimal('0.00')
+GROUPS = (('tenant', 'tenant'), ('property', 'unit'))
+
+
+def backfill_balances(apps, schema_editor):
+    RentalContract = apps.get_model('rentals', 'RentalContract')
+    Invoice = apps.get_model('rentals', 'Invoice')
+    Payment = apps.get_model('rentals', 'Payment')
+    Balance = apps.get_model('rentals', 'Balance')
+    ids = list(RentalContract.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        invoiced = dict(
+            Invoice.objects.filter(contract__in=chunk).order_by()
+            .values('contract').annotate(total=Sum('amount')).values_list('contract', 'total')
+        )
+        paid = {
+            row['invoice__contract']: row
+            for row in Payment.objects.filter(invoice__contract__in=chunk).order_by()
+            .values('invoice__contract').annotate(total=Sum('amount_paid'), last=Max('payment_date'))
+        }
+        rows = []
+        for pk, tenant_id, unit_id in RentalContract.objects.filter(pk__in=chunk).values_list('pk', 'tenant_id', 'unit_id'):
+            total_invoiced = invoiced.get(pk) or ZERO
+            total_paid = paid.get(pk, {}).get('total') or ZERO
+            rows.append(Balance(
+                scope='contract', contract_id=pk, tenant_id=tenant_id, unit_id=unit_id,
+                invoiced=total_invoiced, paid=total_paid, outstanding=total_invoiced - total_paid,
+                last_payment_date=paid.get(pk, {}).get('last'),
+            ))
+        Balance.objects.bulk_create(rows)
+    for scope, field in GROUPS:
+        rows = (
+            Balance.objects.filter(scope='contract').order_by()
+            .values(field).annotate(invoiced=Sum('invoiced'), paid=Sum('paid'), last=Max('last_payment_date'))
+        )
+        Balance.objects.bulk_create([
+            Balance(
+                scope=scope, **{field + '_id': row[field]},
+                invoiced=row['invoiced'], paid=row['paid'], outstanding=row['invoiced'] - row['paid'],
+                last_payment_date=row['last'],
+            )
+            for row in rows
+        ], batch_size=CHUNK_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0009_owner_scope_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Balance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('contract', 'عقد'), ('tenant', 'مستأجر'), ('property', 'عقار')], max_length=10, verbose_name='النطاق')),
+                ('invoiced', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='إجمالي الفواتير')),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='إجمالي المدفوع')),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='المتبقي')),
+                ('last_payment_date', models.DateField(blank=True, null=True, verbose_name='تاريخ آخر دفعة')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ التحديث')),
+                ('contract', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='rentals.rentalcontract', verbose_name='عقد الإيجار')),
+                ('tenant', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='rentals.tenant', verbose_name='المستأجر')),
+                ('unit', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='rentals.property', verbose_name='العقار')),
+            ],
+            options={
+                'verbose_name': 'رصيد',
+                'verbose_name_plural': 'الأرصدة',
+                'indexes': [models.Index(fields=['scope', '-outstanding'], name='balance_scope_outstanding_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('scope', 'contract')), fields=('contract',), name='balance_contract_unique'), models.UniqueConstraint(condition=models.Q(('scope', 'tenant')), fields=('tenant',), name='balance_tenant_unique'), models.UniqueConstraint(condition=models.Q(('scope', 'property')), fields=('unit',), name='balance_property_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:40
+
+import calendar
+from datetime import date, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+# نسخة مجمدة من occupancy.rebuild كما كانت عند كتابة الترحيل، حتى لا يتغير ناتج الترحيل
+# أو ينكسر إذا تغيرت الوحدة لاحقا؛ أمر rebuild_occupancy يعيد البناء بالكود الحالي
+CHUNK_SIZE = 1000
+ONE_DAY = timedelta(days=1)
+
+
+def period_end(period):
+    return period.replace(day=calendar.monthrange(period.year, period.month)[1])
+
+
+def merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if end < start:
+            continue
+        if merged and start <= merged[-1][1] + ONE_DAY:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def unit_months(unit_id, since, intervals, today):
+    merged = merge(intervals)
+    last = max([today] + [end for start, end in merged]).replace(day=1)
+    rows, month = {}, since.replace(day=1)
+    while month <= last:
+        rows[month] = [unit_id, month, (period_end(month) - max(month, since)).days + 1, 0, 0, 0]
+        month = period_end(month) + ONE_DAY
+    for start, end in merged:
+        day = start
+        while day <= end:
+            month_last = min(end, period_end(day))
+            rows[day.replace(day=1)][3] += (month_last - day).days + 1
+            day = month_last + ONE_DAY
+    for previous, current in zip(merged, merged[1:]):
+        row = rows[current[0].replace(day=1)]
+        row[4] += 1
+        row[5] += (current[0] - previous[1]).days - 1
+    return rows.values()
+
+
+def backfill_occupancy(apps, schema_editor):
+    Property = apps.get_model('rentals', 'Property')
+    RentalContract = apps.get_model('rentals', 'RentalContract')
+    OccupancyMonth = apps.get_model('rentals', 'OccupancyMonth')
+    today = date.today()
+    ids = list(Property.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        intervals = {
+            unit_id: [(start_date, end_date) for _, start_date, end_date in contracts]
+            for unit_id, contracts in groupby(
+                RentalContract.objects.filter(unit__in=chunk).order_by('unit').values_list('unit_id', 'start_date', 'end_date'),
+                key=itemgetter(0),
+            )
+        }
+        rows = []
+        for unit_id, created_at in Property.objects.filter(pk__in=chunk).values_list('pk', 'created_at'):
+            unit_intervals = intervals.get(unit_id, [])
+            since = min([timezone.localdate(created_at)] + [start_date for start_date, end_date in unit_intervals])
+            rows.extend(
+                OccupancyMonth(unit_id=unit_id, month=month, days=days, occupied_days=occupied, vacancy_gaps=gaps, vacancy_days=vacant)
+                for unit_id, month, days, occupied, gaps, vacant in unit_months(unit_id, since, unit_intervals, today)
+            )
+        OccupancyMonth.objects.bulk_create(rows, batch_size=CHUNK_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0011_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='الشهر')),
+                ('days', models.PositiveSmallIntegerField(verbose_name='أيام الشهر في المحفظة')),
+                ('occupied_days', models.PositiveSmallIntegerField(default=0, verbose_name='أيام الإشغال')),
+                ('vacancy_gaps', models.PositiveSmallIntegerField(default=0, verbose_name='فترات الشغور المنتهية')),
+                ('vacancy_days', models.PositiveIntegerField(default=0, verbose_name='أيام الشغور')),
+                ('unit', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='rentals.property', verbose_name='العقار')),
+            ],
+            options={
+                'verbose_name': 'إشغال شهري',
+                'verbose_name_plural': 'الإشغال الشهري',
+                'indexes': [models.Index(fields=['month'], name='occupancy_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('unit', 'month'), name='occupancy_unit_month_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,189 @@
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.generic import ListView
+
+from .caching import FRAGMENTS, row_generations
+from .versions import versioned_key
+
+
+class OwnerScopedMixin(LoginRequiredMixin):
+    """يقصر الكائنات على عقارات المستخدم الحالي، وخيارات العلاقات في النموذج كذلك؛ للمستخدمين المسجلين فقط"""
+    # حقول النموذج التي تُعرض خياراتها من سجلات المالك فقط
+    owner_choice_fields = ()
+
+    def get_queryset(self):
+        return super().get_queryset().for_owner(self.request.user)
+
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        for name in self.owner_choice_fields:
+            form.fields[name].queryset = form.fields[name].queryset.for_owner(self.request.user)
+        return form
+
+
+class CachedListMixin:
+    """الصفحة المعروضة تُخزن كاملة في الكاش حسب إصدار بياناتها، مع ETag و Last-Modified.
+
+    الطلب المكرر لصفحة لم تتغير يُجاب من الكاش دون استعلامات، و If-None-Match المطابق
+    يُجاب بـ 304. الإصدارات تُرفع من الإشارات في caching.invalidate، وصفوف الجدول
+    مخزنة بدورها في قطع {% cache %} فلا يُعاد عرض إلا الصف الذي تغير.
+    """
+    # إصدارات القوائم التي تتغير الصفحة بتغيرها، وافتراضيا إصدار نموذج القائمة
+    cache_versions = None
+
+    def response_cache_key(self):
+        versions = self.cache_versions or (FRAGMENTS[self.model][1],)
+        params = dict(self.request.GET.items())
+        # أيام العقود المتبقية تتغير يوميا دون أي حفظ
+        params['date'] = date.today().isoformat()
+        if hasattr(self.model, 'owner_field'):
+            user = self.request.user
+            params['owner'] = 'all' if user.is_superuser else user.pk
+        return versioned_key('response:%s' % type(self).__name__, versions, params)
+
+    def get(self, request, *args, **kwargs):
+        key = self.response_cache_key()
+        entry = cache.get(key)
+        if entry is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response.render()
+            modified = [obj.updated_at for obj in response.context_data['object_list']]
+            entry = (response.content, response['Content-Type'], int(max(modified).timestamp()) if modified else None)
+            cache.set(key, entry, getattr(settings, 'RENTALS_RESPONSE_CACHE_TIMEOUT', 86400))
+        content, content_type, last_modified = entry
+
+        etag = '"%s"' % hashlib.md5(key.encode()).hexdigest()
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['row_generations'] = row_generations()
+        return context
+
+
+class RelatedListView(ListView):
+    """قائمة مرقمة تجلب مسبقا العلاقات التي يعرضها القالب لكل صف"""
+    # العلاقات التي يحتاجها القالب، تُجلب بـ JOIN أو باستعلام إضافي واحد
+    list_select_related = ()
+    list_prefetch_related = ()
+    page_size_param = 'page_size'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.list_select_related:
+            queryset = queryset.select_related(*self.list_select_related)
+        if self.list_prefetch_related:
+            queryset = queryset.prefetch_related(*self.list_prefetch_related)
+        return queryset
+
+    def get_paginate_by(self, queryset):
+        page_size = getattr(settings, 'RENTALS_PAGE_SIZE', 50)
+        max_page_size = getattr(settings, 'RENTALS_MAX_PAGE_SIZE', 500)
+        try:
+            page_size = int(self.request.GET.get(self.page_size_param, page_size))
+        except ValueError:
+            pass
+        return min(max(page_size, 1), max_page_size)
+
+
+class CursorPage:
+    def __init__(self, object_list, page_size, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetListView(RelatedListView):
+    """ترقيم بالمؤشر: كل صفحة تبدأ بعد آخر صف في الصفحة السابقة بدلا من OFFSET،
+    فتكلفة الصفحة الأخيرة مثل الأولى ما دام هناك فهرس مركب على حقول keyset"""
+    # حقول الترتيب، ويجب أن ينتهي بحقل فريد مثل id
+    keyset = ('-id',)
+
+    def get_ordering(self):
+        return self.keyset
+
+    def encode_cursor(self, obj):
+        values = [str(getattr(obj, field.lstrip('-'))) for field in self.keyset]
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+            opts = self.model._meta
+            return [opts.get_field(field.lstrip('-')).to_python(value) for field, value in zip(self.keyset, values, strict=True)]
+        except (ValueError, TypeError, ValidationError):
+            raise Http404('مؤشر الصفحة غير صالح')
+
+    def keyset_filter(self, values, forward):
+        # (a, b) بعد (x, y) تعني a بعد x أو (a = x و b بعد y)
+        condition = Q()
+        for i, field in enumerate(self.keyset):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            term = Q(**{'%s__%s' % (name, lookup): values[i]})
+            for previous, value in zip(self.keyset[:i], values[:i]):
+                term &= Q(**{previous.lstrip('-'): value})
+            condition |= term
+        return condition
+
+    def paginate_queryset(self, queryset, page_size):
+        after = self.request.GET.get('after')
+        before = self.request.GET.get('before')
+        if before:
+            # الرجوع للخلف: نعكس الترتيب ثم نعيد الصفوف لترتيبها الأصلي
+            reverse = [field[1:] if field.startswith('-') else '-' + field for field in self.keyset]
+            queryset = queryset.filter(self.keyset_filter(self.decode_cursor(before), forward=False)).order_by(*reverse)
+        elif after:
+            queryset = queryset.filter(self.keyset_filter(self.decode_cursor(after), forward=True))
+
+        # نجلب صفا إضافيا لمعرفة وجود صفحة تالية دون استعلام COUNT
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if before:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(after)
+
+        page = CursorPage(
+            rows,
+            page_size,
+            self.encode_cursor(rows[-1]) if rows and has_next else None,
+            self.encode_cursor(rows[0]) if rows and has_previous else None,
+        )
+        return None, page, rows, has_next or has_previous
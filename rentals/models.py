@@ -1,9 +1,21 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, Group, Permission
 from django.utils.timezone import now
 from datetime import date
 from django.contrib.auth.models import AbstractUser
+from .storage import document_storage
+
+class OwnedQuerySet(models.QuerySet):
+  """تصفية السجلات حسب مالك العقار عبر المسار owner_field في النموذج"""
+  def for_owner(self, user):
+    # المشرف يرى كل السجلات والزائر لا يرى شيئا
+    if user.is_superuser:
+      return self
+    if not user.is_authenticated:
+      return self.none()
+    return self.filter(**{self.model.owner_field: user})
 
 class CustomUser(AbstractUser):
   USER_TYPE_CHOICES = (
@@ -11,7 +23,10 @@ class CustomUser(AbstractUser):
     ('tenant', _('مستأجر')),
   )
   user_type = models.CharField(max_length=10, choices=USER_TYPE_CHOICES, verbose_name=_('نوع المستخدم'))
-  phone_number = models.CharField(max_length=15, blank=True, null=True, verbose_name=_('رقم الهاتف')),
+  phone_number = models.CharField(max_length=15, blank=True, null=True, verbose_name=_('رقم الهاتف'))
+  # AUTH_USER_MODEL غير مفعل بعد، لذلك نفصل العلاقات العكسية عن auth.User لتجنب التعارض
+  groups = models.ManyToManyField(Group, blank=True, related_name='custom_users', verbose_name=_('المجموعات'))
+  user_permissions = models.ManyToManyField(Permission, blank=True, related_name='custom_users', verbose_name=_('الصلاحيات'))
 
   class Meta:
     verbose_name = _('مستخدم')
@@ -40,9 +55,17 @@ class Property(models.Model):
   created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('تاريخ الإنشاء'))
   updated_at = models.DateTimeField(auto_now=True, verbose_name=_('تاريخ التحديث'))
 
+  # مسار مالك العقار الذي يصفي به for_owner
+  owner_field = 'user'
+  objects = OwnedQuerySet.as_manager()
+
   class Meta:
     verbose_name = _('عقار')
     verbose_name_plural = _('العقارات')
+    indexes = [
+      # يخدم عد عقارات المالك حسب الحالة في لوحة التحكم
+      models.Index(fields=['user', 'status'], name='property_user_status_idx'),
+    ]
 
   def __str__(self):
     return self.name
@@ -78,6 +101,9 @@ class RentalContract(models.Model):
   created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('تاريخ الإنشاء'))
   updated_at = models.DateTimeField(auto_now=True, verbose_name=_('تاريخ التحديث'))
 
+  owner_field = 'unit__user'
+  objects = OwnedQuerySet.as_manager()
+
   @property
   def days_left(self):
     """عدد الأيام المتبقية لانتهاء العقد"""
@@ -93,9 +119,32 @@ class RentalContract(models.Model):
   class Meta:
     verbose_name = _('عقد الايجار')
     verbose_name_plural = _('عقود الإيجار')
+    indexes = [
+      # البحث بفترة زمنية يقارن تاريخي البدء والنهاية
+      models.Index(fields=['start_date'], name='contract_start_date_idx'),
+      models.Index(fields=['end_date'], name='contract_end_date_idx'),
+      # عقود المالك تُصفى عبر وحداته، ومعها حالة العقد
+      models.Index(fields=['unit', 'is_active'], name='contract_unit_active_idx'),
+    ]
 
   def __str__(self):
-    return f"عقد إيجار للوحدة {self.Property.Property_number} - {self.tenant.user.username}"
+    return f"عقد إيجار للوحدة {self.unit.name} - {self.tenant.user.username}"
+
+class ContractSearchTerm(models.Model):
+  """فهرس كلمات مطبّعة لبحث العقود، يُحدّث عبر الإشارات في signals.py"""
+  contract = models.ForeignKey(RentalContract, on_delete=models.CASCADE, related_name='search_terms', verbose_name=_('عقد الإيجار'))
+  field = models.CharField(max_length=30, verbose_name=_('الحقل'))
+  term = models.CharField(max_length=100, verbose_name=_('الكلمة'))
+
+  class Meta:
+    verbose_name = _('كلمة بحث العقود')
+    verbose_name_plural = _('فهرس بحث العقود')
+    indexes = [
+      models.Index(fields=['field', 'term'], name='contract_search_term_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.field}: {self.term}"
 
 class Invoice(models.Model):
   STATUS_CHOICES = (
@@ -108,10 +157,27 @@ class Invoice(models.Model):
   due_date = models.DateField(verbose_name=_('تاريخ الاستحقاق'))
   amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_('المبلغ المستحق'))
   status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name=_('الحالة'))
+  # أول يوم من شهر الفوترة، ويبقى فارغا للفواتير المدخلة يدويا
+  period = models.DateField(blank=True, null=True, verbose_name=_('فترة الفوترة'))
+
+  owner_field = 'contract__unit__user'
+  objects = OwnedQuerySet.as_manager()
 
   class Meta:
     verbose_name = _('فاتورة')
     verbose_name_plural = _('الفواتير')
+    indexes = [
+      # يخدم ترقيم قائمة الفواتير بالمؤشر (due_date, id)
+      models.Index(fields=['due_date', 'id'], name='invoice_due_date_id_idx'),
+      # يخدم تعليم الفواتير المتأخرة وعدّها حسب الحالة
+      models.Index(fields=['status', 'due_date'], name='invoice_status_due_date_idx'),
+      # فواتير عقود المالك حسب الحالة وتاريخ الاستحقاق
+      models.Index(fields=['contract', 'status', 'due_date'], name='invoice_contract_status_idx'),
+    ]
+    constraints = [
+      # فاتورة واحدة لكل عقد في كل فترة، حتى تكون إعادة تشغيل الفوترة آمنة
+      models.UniqueConstraint(fields=['contract', 'period'], name='invoice_contract_period_unique'),
+    ]
 
   def __str__(self):
     return f"فاتورة للعقد {self.contract} بمبلغ {self.amount}"
@@ -122,13 +188,92 @@ class Payment(models.Model):
   amount_paid = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_('المبلغ المدفوع'))
   payment_method = models.CharField(max_length=50, choices=(('credit_card', _('بطاقة الائتمان')), ('bank_transfer', _('تحويل بنكي'))), verbose_name=_('طريقة الدفع'))
 
+  owner_field = 'invoice__contract__unit__user'
+  objects = OwnedQuerySet.as_manager()
+
   class Meta:
     verbose_name = _('دفعة')
     verbose_name_plural = _('الدفعات')
+    indexes = [
+      # يخدم ترقيم سجل الدفعات بالمؤشر (payment_date, id)
+      models.Index(fields=['payment_date', 'id'], name='payment_date_id_idx'),
+    ]
 
   def __str__(self):
     return f"دفعة بقيمة {self.amount_paid} للفاتورة {self.invoice.id}"
 
+class Balance(models.Model):
+  """رصيد مجمع يُحدّث مع كل تغيير في الفواتير والدفعات (ledger.py) بدلا من جمعها عند كل طلب.
+
+  صف العقد يحمل المستأجر والعقار أيضا، فصفوف المستأجر والعقار تُجمع من صفوف عقودها.
+  العلاقات بلا قيود في قاعدة البيانات لأن الصفوف تُحذف وتُعاد من الإشارات نفسها.
+  """
+  SCOPE_CHOICES = (
+    ('contract', _('عقد')),
+    ('tenant', _('مستأجر')),
+    ('property', _('عقار')),
+  )
+  scope = models.CharField(max_length=10, choices=SCOPE_CHOICES, verbose_name=_('النطاق'))
+  contract = models.ForeignKey(RentalContract, null=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name=_('عقد الإيجار'))
+  tenant = models.ForeignKey(Tenant, null=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name=_('المستأجر'))
+  unit = models.ForeignKey(Property, null=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name=_('العقار'))
+  invoiced = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name=_('إجمالي الفواتير'))
+  paid = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name=_('إجمالي المدفوع'))
+  outstanding = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name=_('المتبقي'))
+  last_payment_date = models.DateField(blank=True, null=True, verbose_name=_('تاريخ آخر دفعة'))
+  updated_at = models.DateTimeField(auto_now=True, verbose_name=_('تاريخ التحديث'))
+
+  # أرصدة المستأجرين تجمع عقودا لأكثر من مالك، فلا تظهر إلا للمشرف
+  owner_field = 'unit__user'
+  objects = OwnedQuerySet.as_manager()
+
+  class Meta:
+    verbose_name = _('رصيد')
+    verbose_name_plural = _('الأرصدة')
+    indexes = [
+      # قوائم المتأخرات: أكبر المبالغ المتبقية في كل نطاق
+      models.Index(fields=['scope', '-outstanding'], name='balance_scope_outstanding_idx'),
+    ]
+    constraints = [
+      models.UniqueConstraint(fields=['contract'], condition=models.Q(scope='contract'), name='balance_contract_unique'),
+      models.UniqueConstraint(fields=['tenant'], condition=models.Q(scope='tenant'), name='balance_tenant_unique'),
+      models.UniqueConstraint(fields=['unit'], condition=models.Q(scope='property'), name='balance_property_unique'),
+    ]
+
+  def __str__(self):
+    return f"رصيد {self.get_scope_display()}: {self.outstanding}"
+
+class OccupancyMonth(models.Model):
+  """أيام إشغال العقار في شهر، مشتقة من فترات عقوده بعد دمج المتداخل منها (occupancy.py).
+
+  الصفوف متصلة من أول شهر للعقار في المحفظة، فمجموع الأيام هو المقام في نسب الإشغال.
+  فترات الشغور بين عقدين تُنسب لشهر بداية العقد التالي. العقار بلا قيد في قاعدة البيانات
+  كما في الأرصدة، لأن حذف عقود العقار يعيد حساب صفوفه قبل حذفه هو.
+  """
+  unit = models.ForeignKey(Property, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name=_('العقار'))
+  month = models.DateField(verbose_name=_('الشهر'))
+  days = models.PositiveSmallIntegerField(verbose_name=_('أيام الشهر في المحفظة'))
+  occupied_days = models.PositiveSmallIntegerField(default=0, verbose_name=_('أيام الإشغال'))
+  vacancy_gaps = models.PositiveSmallIntegerField(default=0, verbose_name=_('فترات الشغور المنتهية'))
+  vacancy_days = models.PositiveIntegerField(default=0, verbose_name=_('أيام الشغور'))
+
+  owner_field = 'unit__user'
+  objects = OwnedQuerySet.as_manager()
+
+  class Meta:
+    verbose_name = _('إشغال شهري')
+    verbose_name_plural = _('الإشغال الشهري')
+    indexes = [
+      # رسوم المحفظة تجمع الصفوف حسب الشهر
+      models.Index(fields=['month'], name='occupancy_month_idx'),
+    ]
+    constraints = [
+      models.UniqueConstraint(fields=['unit', 'month'], name='occupancy_unit_month_unique'),
+    ]
+
+  def __str__(self):
+    return f"{self.unit_id} {self.month:%Y-%m}: {self.occupied_days}/{self.days}"
+
 class MaintenanceRequest(models.Model):
   STATUS_CHOICES = (
     ('pending', _('قيد الانتظار')),
@@ -142,9 +287,15 @@ class MaintenanceRequest(models.Model):
   requested_at = models.DateTimeField(auto_now_add=True, verbose_name=_('تاريخ الطلب'))
   updated_at = models.DateTimeField(auto_now=True, verbose_name=_('تاريخ التحديث'))
 
+  owner_field = 'unit__user'
+  objects = OwnedQuerySet.as_manager()
+
   class Meta:
     verbose_name = _('طلب الصيانة')
     verbose_name_plural = _('طلبات الصيانة')
+    indexes = [
+      models.Index(fields=['unit', 'status'], name='maintenance_unit_status_idx'),
+    ]
 
   def __str__(self):
     return f"طلب صيانة {self.title} - {self.get_status_display()}"
@@ -152,12 +303,72 @@ class MaintenanceRequest(models.Model):
 class Document(models.Model):
   title = models.CharField(max_length=255, verbose_name=_('عنوان المستند'))
   description = models.TextField(blank=True, null=True, verbose_name=_('وصف'))
-  file = models.FileField(upload_to='documents/', verbose_name=_('ملف المستند'))
+  file = models.FileField(upload_to='documents/', storage=document_storage, verbose_name=_('ملف المستند'))
   updated_at = models.DateTimeField(auto_now=True, verbose_name=_('تاريخ الرفع'))
 
+  @property
+  def has_thumbnail(self):
+    """هل وُلدت الصورة المصغرة للملف بعد"""
+    return bool(self.file) and self.file.storage.exists(self.file.storage.thumbnail_name(self.file.name))
+
   class Meta:
     verbose_name = _('مستند')
     verbose_name_plural = _('المستندات')
 
   def __str__(self):
-    return self.title
\ No newline at end of file
+    return self.title
+
+class Blob(models.Model):
+  """ملف مخزن باسم بصمة محتواه، ويُحذف من القرص عندما لا يشير إليه أي مستند"""
+  name = models.CharField(max_length=255, unique=True, verbose_name=_('مسار الملف'))
+  digest = models.CharField(max_length=64, verbose_name=_('البصمة'))
+  size = models.PositiveBigIntegerField(verbose_name=_('الحجم'))
+  references = models.PositiveIntegerField(default=0, verbose_name=_('عدد المراجع'))
+  created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('تاريخ الإنشاء'))
+
+  class Meta:
+    verbose_name = _('ملف مخزن')
+    verbose_name_plural = _('الملفات المخزنة')
+
+  def __str__(self):
+    return self.name
+
+class Job(models.Model):
+  """مهمة في طابور الخلفية (jobs.py)، يأخذها أمر run_jobs بدلا من تنفيذها داخل الطلب"""
+  STATUS_CHOICES = (
+    ('queued', _('في الانتظار')),
+    ('running', _('قيد التنفيذ')),
+    ('succeeded', _('اكتملت')),
+    ('failed', _('فشلت')),
+  )
+  task = models.CharField(max_length=50, verbose_name=_('المهمة'))
+  payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name=_('المعاملات'))
+  user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='jobs', verbose_name=_('المستخدم'))
+  status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', verbose_name=_('الحالة'))
+  attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('المحاولات'))
+  max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name=_('أقصى عدد محاولات'))
+  run_at = models.DateTimeField(default=now, verbose_name=_('موعد التنفيذ'))
+  locked_by = models.CharField(max_length=100, blank=True, verbose_name=_('العامل'))
+  locked_at = models.DateTimeField(blank=True, null=True, verbose_name=_('بداية التنفيذ'))
+  result = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder, verbose_name=_('النتيجة'))
+  error = models.TextField(blank=True, verbose_name=_('الخطأ'))
+  created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('تاريخ الإنشاء'))
+  finished_at = models.DateTimeField(blank=True, null=True, verbose_name=_('تاريخ الانتهاء'))
+
+  owner_field = 'user'
+  objects = OwnedQuerySet.as_manager()
+
+  class Meta:
+    verbose_name = _('مهمة خلفية')
+    verbose_name_plural = _('مهام الخلفية')
+    indexes = [
+      # العامل يأخذ أقدم المهام المستحقة
+      models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.task} #{self.pk} ({self.get_status_display()})"
+
+  @property
+  def finished(self):
+    return self.status in ('succeeded', 'failed')
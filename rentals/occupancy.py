@@ -0,0 +1,186 @@
+from collections import Counter
+from datetime import date, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .billing import billing_period, period_end
+from .models import Property, RentalContract, OccupancyMonth
+from .versions import bump_version
+
+CHUNK_SIZE = 1000
+ONE_DAY = timedelta(days=1)
+COLUMNS = ('unit_id', 'month', 'days', 'occupied_days', 'vacancy_gaps', 'vacancy_days')
+
+
+def merge(intervals):
+    """دمج فترات (البداية، النهاية) المتداخلة أو المتلاصقة بعد ترتيبها؛ النهاية داخلة في الفترة"""
+    merged = []
+    for start, end in sorted(intervals):
+        if end < start:
+            continue
+        if merged and start <= merged[-1][1] + ONE_DAY:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def unit_months(unit_id, since, intervals, today):
+    """صفوف الإشغال الشهرية لعقار بترتيب COLUMNS، من شهر دخوله المحفظة حتى الشهر الحالي أو نهاية آخر عقد"""
+    merged = merge(intervals)
+    last = billing_period(max([today] + [end for start, end in merged]))
+    rows, month = {}, billing_period(since)
+    while month <= last:
+        rows[month] = [unit_id, month, (period_end(month) - max(month, since)).days + 1, 0, 0, 0]
+        month = period_end(month) + ONE_DAY
+
+    # كل فترة مدمجة تُقسم على الأشهر التي تمر بها
+    for start, end in merged:
+        day = start
+        while day <= end:
+            month_last = min(end, period_end(day))
+            rows[billing_period(day)][3] += (month_last - day).days + 1
+            day = month_last + ONE_DAY
+
+    for previous, current in zip(merged, merged[1:]):
+        row = rows[billing_period(current[0])]
+        row[4] += 1
+        row[5] += (current[0] - previous[1]).days - 1
+    return list(rows.values())
+
+
+def _rows(unit_ids, today):
+    # استعلامان: تواريخ إضافة العقارات وفترات كل عقودها
+    intervals = {
+        unit_id: [(start, end) for _, start, end in contracts]
+        for unit_id, contracts in groupby(
+            RentalContract.objects.filter(unit__in=unit_ids).order_by('unit').values_list('unit_id', 'start_date', 'end_date'),
+            key=itemgetter(0),
+        )
+    }
+    rows = []
+    for unit_id, created_at in Property.objects.filter(pk__in=unit_ids).values_list('pk', 'created_at'):
+        unit_intervals = intervals.get(unit_id, [])
+        # العقار المضاف لاحقا بعقود سابقة (استيراد) يدخل المحفظة من بداية أول عقد
+        since = min([timezone.localdate(created_at)] + [start for start, end in unit_intervals])
+        rows.extend(unit_months(unit_id, since, unit_intervals, today))
+    return rows
+
+
+def _insert(rows):
+    # bulk_create يبني كائنا لكل صف ويجهز كل قيمة على حدة، وهنا مئات آلاف الصفوف من أرقام وتواريخ فقط
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        connection.ops.quote_name(OccupancyMonth._meta.db_table), ', '.join(COLUMNS), ', '.join(['%s'] * len(COLUMNS)),
+    )
+    adapt = connection.ops.adapt_datefield_value
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(unit_id, adapt(month), *counts) for unit_id, month, *counts in rows])
+
+
+def _replace(unit_ids, today):
+    rows = _rows(unit_ids, today)
+    with transaction.atomic():
+        OccupancyMonth.objects.filter(unit__in=unit_ids).delete()
+        _insert(rows)
+
+
+def refresh(unit_ids=(), today=None):
+    """إعادة حساب صفوف العقارات المحددة فقط؛ تُستدعى عند تغير عقودها"""
+    unit_ids = set(unit_ids) - {None}
+    if not unit_ids:
+        return
+    _replace(unit_ids, today or date.today())
+    bump_version('reports')
+
+
+def refresh_contracts(contract_ids):
+    refresh(RentalContract.objects.filter(pk__in=contract_ids).values_list('unit_id', flat=True))
+
+
+def extend(today=None):
+    """إضافة صفوف الشهر الجديد للعقارات التي لم يتغير عليها شيء منذ بدايته (مهمة يومية)"""
+    today = today or date.today()
+    covered = OccupancyMonth.objects.filter(month=billing_period(today)).values('unit')
+    unit_ids = list(Property.objects.exclude(pk__in=covered).values_list('pk', flat=True))
+    for start in range(0, len(unit_ids), CHUNK_SIZE):
+        _replace(unit_ids[start:start + CHUNK_SIZE], today)
+    if unit_ids:
+        bump_version('reports')
+    return len(unit_ids)
+
+
+def rebuild(chunk_size=CHUNK_SIZE, today=None):
+    """إعادة بناء جدول الإشغال كاملا على دفعات من العقارات"""
+    today = today or date.today()
+    ids = list(Property.objects.order_by('pk').values_list('pk', flat=True))
+    with transaction.atomic():
+        OccupancyMonth.objects.all().delete()
+        for start in range(0, len(ids), chunk_size):
+            _insert(_rows(ids[start:start + chunk_size], today))
+    bump_version('reports')
+    return len(ids)
+
+
+# القراءة
+
+def monthly_series(user=None, start_date=None, end_date=None, unit=None):
+    """نسبة الإشغال ومتوسط أيام الشغور لكل شهر، باستعلام مجمع واحد على الصفوف المحسوبة"""
+    rows = OccupancyMonth.objects.all()
+    if user is not None:
+        rows = rows.for_owner(user)
+    if start_date:
+        rows = rows.filter(month__gte=billing_period(start_date))
+    if end_date:
+        rows = rows.filter(month__lte=end_date)
+    if unit:
+        rows = rows.filter(unit=unit)
+    totals = (
+        rows.order_by().values('month')
+        .annotate(units=Count('id'), days=Sum('days'), occupied=Sum('occupied_days'), gaps=Sum('vacancy_gaps'), vacancy=Sum('vacancy_days'))
+        .order_by('month')
+    )
+    return [
+        {
+            'month': row['month'],
+            'units': row['units'],
+            'occupancy_rate': row['occupied'] * 100 / row['days'] if row['days'] else 0,
+            'vacancy_gaps': row['gaps'],
+            'vacancy_days': row['vacancy'],
+        }
+        for row in totals
+    ]
+
+
+def average_vacancy_days(series):
+    """متوسط أيام الشغور بين عقدين متتاليين خلال أشهر السلسلة"""
+    gaps = sum(row['vacancy_gaps'] for row in series)
+    return sum(row['vacancy_days'] for row in series) / gaps if gaps else None
+
+
+def daily_timeline(start, end, user=None, unit=None):
+    """عدد العقارات المشغولة في كل يوم من start إلى end بخوارزمية خط المسح.
+
+    فترات العقود تُقرأ باستعلام واحد وتُدمج لكل عقار حتى لا يُعد مرتين في يوم تتداخل فيه
+    عقوده، ثم يُضاف +1 في بداية كل فترة و -1 في اليوم التالي لنهايتها ويُجمع التراكم يوما بيوم.
+    """
+    contracts = RentalContract.objects.filter(start_date__lte=end, end_date__gte=start)
+    if user is not None:
+        contracts = contracts.for_owner(user)
+    if unit:
+        contracts = contracts.filter(unit=unit)
+    events = Counter()
+    rows = contracts.order_by('unit').values_list('unit_id', 'start_date', 'end_date').iterator(chunk_size=CHUNK_SIZE)
+    for unit_id, intervals in groupby(rows, key=itemgetter(0)):
+        for first, last in merge((first, last) for _, first, last in intervals):
+            events[max(first, start)] += 1
+            events[min(last, end) + ONE_DAY] -= 1
+    timeline, occupied, day = [], 0, start
+    while day <= end:
+        occupied += events[day]
+        timeline.append((day, occupied))
+        day += ONE_DAY
+    return timeline
@@ -0,0 +1,112 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .billing import period_end
+from .models import Invoice
+from .pdf_worker import render_pdf
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class RenderTimeout(Exception):
+    """لم ينته توليد الملف خلال INVOICE_PDF_TIMEOUT"""
+
+
+def get_executor():
+    """مجمع عمليات مشترك لـ WeasyPrint حتى لا تنشغل عمليات الطلبات بتكلفة التوليد"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'INVOICE_PDF_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def invoice_html(invoice):
+    return render_to_string('invoices/invoice_pdf.html', {'invoice': invoice})
+
+
+def cache_path(html):
+    # المفتاح هو بصمة محتوى الفاتورة، فأي تعديل عليها ينتج ملفا جديدا
+    digest = hashlib.sha256(html.encode()).hexdigest()
+    return os.path.join(settings.INVOICE_PDF_CACHE_DIR, digest[:2], digest + '.pdf')
+
+
+def _result(future, timeout):
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        # الإلغاء يمنع بدء التوليد إن كان في الانتظار؛ الجاري يكمل في العامل وتُهمل نتيجته
+        future.cancel()
+        raise RenderTimeout(timeout) from None
+
+
+def _store(path, pdf):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+
+
+def invoice_pdf_path(invoice):
+    """مسار ملف PDF للفاتورة، يُولَّد في مجمع العمليات فقط إذا لم يكن في الكاش"""
+    html = invoice_html(invoice)
+    path = cache_path(html)
+    if not os.path.exists(path):
+        pdf = _result(get_executor().submit(render_pdf, html), getattr(settings, 'INVOICE_PDF_TIMEOUT', 60))
+        _store(path, pdf)
+    return path
+
+
+def invoice_pdf_paths(invoices, window=None):
+    """توليد ملفات عدة فواتير بالتوازي، وإرجاع (الفاتورة، المسار) بترتيبها الأصلي.
+
+    لا يُرسل إلى المجمع أكثر من window فاتورة في الوقت نفسه حتى يبدأ البث مبكرا
+    وتبقى الذاكرة ثابتة مهما كان عدد الفواتير.
+    """
+    window = window or getattr(settings, 'INVOICE_PDF_WORKERS', 2) * 4
+    timeout = getattr(settings, 'INVOICE_PDF_TIMEOUT', 60)
+    pending = deque()
+    try:
+        for invoice in invoices:
+            html = invoice_html(invoice)
+            path = cache_path(html)
+            future = None if os.path.exists(path) else get_executor().submit(render_pdf, html)
+            pending.append((invoice, path, future))
+            while len(pending) > window or (pending and pending[0][2] is None):
+                yield _collect(pending.popleft(), timeout)
+        while pending:
+            yield _collect(pending.popleft(), timeout)
+    finally:
+        # بعد انتهاء المهلة أو انقطاع العميل لا يبقى في المجمع عمل لن يُقرأ
+        for invoice, path, future in pending:
+            if future is not None:
+                future.cancel()
+
+
+def _collect(item, timeout):
+    invoice, path, future = item
+    if future is not None:
+        _store(path, _result(future, timeout))
+    return invoice, path
+
+
+def invoice_batch(user, period):
+    """ملفات فواتير المالك المستحقة خلال الشهر بصيغة (الاسم داخل الأرشيف، المسار)"""
+    invoices = (
+        Invoice.objects.for_owner(user).filter(due_date__range=(period, period_end(period)))
+        .select_related('contract__unit', 'contract__tenant__user')
+        .order_by('due_date', 'id')
+    )
+    return (('invoice-%d.pdf' % invoice.pk, path) for invoice, path in invoice_pdf_paths(invoices.iterator(chunk_size=500)))
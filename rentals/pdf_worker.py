@@ -0,0 +1,6 @@
+# تُنفَّذ داخل عمليات منفصلة، لذلك لا تستورد Django حتى تبقى العملية خفيفة
+
+
+def render_pdf(html, base_url=None):
+    from weasyprint import HTML
+    return HTML(string=html, base_url=base_url).write_pdf()
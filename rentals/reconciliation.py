@@ -0,0 +1,88 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from . import ledger
+from .models import RentalContract, Invoice, Payment
+from .versions import bump_version
+
+CHUNK_SIZE = 1000
+ZERO = Decimal('0.00')
+OPEN_STATUSES = ('pending', 'overdue')
+
+
+def invoice_status(amount, paid, due_date, today):
+    """حالة الفاتورة من مجموع دفعاتها: مدفوعة عند السداد الكامل، وإلا متأخرة بعد الاستحقاق"""
+    if paid >= amount:
+        return 'paid'
+    return 'overdue' if due_date < today else 'pending'
+
+
+def paid_totals(invoices):
+    # استعلام مجمع واحد: (رقم الفاتورة، المبلغ، الاستحقاق، الحالة، مجموع الدفعات)
+    return (
+        invoices.order_by()
+        .values_list('pk', 'amount', 'due_date', 'status')
+        .annotate(paid=Sum('payments__amount_paid'))
+    )
+
+
+def reconcile(invoice_ids=None, today=None, chunk_size=CHUNK_SIZE):
+    """مطابقة حالة الفواتير مع دفعاتها، وتُرجع عدد الفواتير التي تغيرت إلى كل حالة.
+
+    invoice_ids None يعني كل الفواتير (المهمة الدورية)؛ الحالات الجديدة تُكتب بعبارة
+    UPDATE واحدة لكل حالة ودفعة، فلا تُرسل إشارات الحفظ وتُبطل اللقطات يدويا.
+    """
+    today = today or date.today()
+    invoices = Invoice.objects.all() if invoice_ids is None else Invoice.objects.filter(pk__in=invoice_ids)
+    changes = {status: [] for status, label in Invoice.STATUS_CHOICES}
+    for pk, amount, due_date, status, paid in paid_totals(invoices).iterator(chunk_size=chunk_size):
+        new_status = invoice_status(amount, paid or ZERO, due_date, today)
+        if new_status != status:
+            changes[new_status].append(pk)
+
+    with transaction.atomic():
+        for status, pks in changes.items():
+            for start in range(0, len(pks), chunk_size):
+                Invoice.objects.filter(pk__in=pks[start:start + chunk_size]).update(status=status)
+    changed = {status: len(pks) for status, pks in changes.items()}
+    if any(changed.values()):
+        bump_version('dashboard', 'reports')
+    return changed
+
+
+def reconcile_payments(payment_ids):
+    reconcile(Invoice.objects.filter(payments__in=payment_ids).values('pk'))
+
+
+def allocate(contract, amount, payment_method='bank_transfer'):
+    """توزيع مبلغ تحويل واحد على فواتير العقد المفتوحة، الأقدم استحقاقا أولا.
+
+    تُنشأ دفعة لكل فاتورة بقدر المتبقي منها، وترفع ValueError إذا زاد المبلغ على
+    مجموع المستحق حتى لا يُسجل جزء من التحويل دون فاتورة.
+    """
+    with transaction.atomic():
+        # قفل العقد يمنع توزيعين متزامنين من سداد الفاتورة نفسها مرتين
+        RentalContract.objects.select_for_update().filter(pk=contract.pk).first()
+        rows = paid_totals(Invoice.objects.filter(contract=contract, status__in=OPEN_STATUSES)).order_by('due_date', 'pk')
+        payments, remaining = [], amount
+        for pk, invoice_amount, due_date, status, paid in rows:
+            due = invoice_amount - (paid or ZERO)
+            if remaining <= 0:
+                break
+            if due <= 0:
+                continue
+            share = min(due, remaining)
+            payments.append(Payment(invoice_id=pk, amount_paid=share, payment_method=payment_method))
+            remaining -= share
+        if remaining > 0:
+            raise ValueError('المبلغ أكبر من مستحقات العقد بمقدار %s' % remaining)
+
+        # bulk_create لا يرسل إشارات الحفظ، فالحالات والأرصدة تُحدّث هنا في المعاملة نفسها
+        Payment.objects.bulk_create(payments)
+        reconcile([payment.invoice_id for payment in payments])
+        ledger.refresh([contract.pk])
+    bump_version('reports')
+    return payments
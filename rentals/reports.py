@@ -0,0 +1,179 @@
+import asyncio
+from datetime import date
+
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncQuarter
+
+from . import forecast, occupancy
+from .charts import acached_chart, bar_chart, cached_chart, grouped_bar_chart
+from .concurrency import gather_queries
+from .models import Property, Invoice, Payment
+from .versions import acached, cached
+
+
+PERIOD_FUNCTIONS = {
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+}
+# عنوان الرسم وعنوان محوره لكل تجميع
+PERIOD_TITLES = {
+    'month': ('الإيرادات الشهرية', 'الشهر'),
+    'quarter': ('الإيرادات الربعية', 'الربع'),
+}
+
+
+def period_label(value, period):
+    if period == 'quarter':
+        return '%d-Q%d' % (value.year, (value.month - 1) // 3 + 1)
+    return value.strftime('%Y-%m')
+
+
+def revenue_series(period='month', start_date=None, end_date=None, unit=None, tenant=None, user=None):
+    """إجمالي الفواتير لكل شهر أو ربع، مجمعة داخل قاعدة البيانات"""
+    invoices = Invoice.objects.all()
+    if user is not None:
+        invoices = invoices.for_owner(user)
+    if start_date:
+        invoices = invoices.filter(invoice_date__gte=start_date)
+    if end_date:
+        invoices = invoices.filter(invoice_date__lte=end_date)
+    if unit:
+        invoices = invoices.filter(contract__unit=unit)
+    if tenant:
+        invoices = invoices.filter(contract__tenant=tenant)
+    # الاسم bucket لأن للفاتورة حقلا باسم period
+    rows = (
+        invoices.annotate(bucket=PERIOD_FUNCTIONS[period]('invoice_date'))
+        .values('bucket')
+        .annotate(total=Sum('amount'))
+        .order_by('bucket')
+    )
+    return [{'period': row['bucket'], 'total': row['total']} for row in rows]
+
+
+def chart_from_series(buckets, period):
+    """مواصفات رسم الإيرادات من السلسلة الجاهزة، أو None عند عدم وجود بيانات؛ لا تلمس قاعدة البيانات"""
+    if not buckets:
+        return None
+    title, x_title = PERIOD_TITLES[period]
+    return bar_chart(
+        [period_label(bucket['period'], period) for bucket in buckets],
+        [bucket['total'] for bucket in buckets],
+        title, x_title, 'الإيرادات',
+    )
+
+
+def revenue_chart(filters):
+    return chart_from_series(revenue_series(**filters), filters.get('period', 'month'))
+
+
+async def arevenue_chart(filters):
+    results = await gather_queries({'buckets': lambda: revenue_series(**filters)})
+    return chart_from_series(results['buckets'], filters.get('period', 'month'))
+
+
+def occupancy_filters(filters):
+    """فلاتر سلسلة الإشغال من فلاتر التقرير؛ الافتراضي آخر 12 شهرا"""
+    end = filters.get('end_date') or date.today()
+    months = end.year * 12 + end.month - 12
+    return {
+        'user': filters.get('user'),
+        'start_date': filters.get('start_date') or date(months // 12, months % 12 + 1, 1),
+        'end_date': end,
+        'unit': filters.get('unit'),
+    }
+
+
+def occupancy_from_series(series):
+    """رسم نسبة الإشغال الشهرية ومتوسط أيام الشغور من الصفوف المحسوبة مسبقا"""
+    if not series:
+        return None
+    return {
+        'chart': bar_chart(
+            [row['month'].strftime('%Y-%m') for row in series],
+            [row['occupancy_rate'] for row in series],
+            'نسبة الإشغال الشهرية', 'الشهر', 'الإشغال %',
+        ),
+        'average_vacancy_days': occupancy.average_vacancy_days(series),
+    }
+
+
+def occupancy_report(filters):
+    return occupancy_from_series(occupancy.monthly_series(**occupancy_filters(filters)))
+
+
+async def aoccupancy_report(filters):
+    results = await gather_queries({'series': lambda: occupancy.monthly_series(**occupancy_filters(filters))})
+    return occupancy_from_series(results['series'])
+
+
+def cash_flow_forecast(filters=None, user=None):
+    """توقع الدخل من العقود مقابل الدفعات، مخزنا حسب إصدار بيانات التقارير ولكل مستخدم.
+
+    اليوم جزء من المفتاح لأن الأشهر المنقضية والعقود الموقوفة تُحسب بالنسبة إليه.
+    """
+    filters = dict(filters or {}, user=user)
+    today = date.today()
+    return cached('forecast', 'reports', dict(filters, today=today), lambda: forecast.forecast(today=today, **filters))
+
+
+def forecast_chart(result):
+    months = result['months']
+    return grouped_bar_chart(
+        [row['month'].strftime('%Y-%m') for row in months],
+        [('المتوقع', [row['expected'] for row in months]), ('المستلم', [row['actual'] for row in months])],
+        'الدخل المتوقع والمستلم', 'الشهر', 'ريال عماني',
+    )
+
+
+def summary_queries(user=None):
+    """استعلامات الملخص المستقلة"""
+    payments, properties = Payment.objects.all(), Property.objects.all()
+    if user is not None:
+        payments, properties = payments.for_owner(user), properties.for_owner(user)
+    return {
+        # 1. الايرادات
+        'total_revenue': lambda: payments.aggregate(total=Sum('amount_paid'))['total'] or 0,
+        # 3. معدلات الإشغال
+        'total_unit': lambda: properties.count(),
+        'occupied_units': lambda: properties.filter(status='rented').count(),
+    }
+
+
+def summarize(results):
+    total_unit, occupied_units = results['total_unit'], results['occupied_units']
+    occupancy_rate = (occupied_units / total_unit) * 100 if total_unit > 0 else 0
+    return {
+        'total_revenue': results['total_revenue'],
+        # 2. المصروفات: طلبات الصيانة لا تحتوي على حقل للتكلفة بعد
+        'maintenance_expenses': 0,
+        'occupancy_rate': occupancy_rate,
+    }
+
+
+def report_summary(user=None):
+    return summarize({name: query() for name, query in summary_queries(user).items()})
+
+
+async def areport_summary(user=None):
+    return summarize(await gather_queries(summary_queries(user)))
+
+
+def build_report_context(filters=None, user=None):
+    filters = dict(filters or {}, user=user)
+    # الملخص والرسم يُخزنان في الكاش حسب إصدار بيانات التقارير ولكل مستخدم
+    context = dict(cached('report_summary', 'reports', {'user': user}, lambda: report_summary(user)))
+    context['revenue_chart'] = cached_chart('revenue', 'reports', filters, lambda: revenue_chart(filters))
+    context['occupancy'] = cached_chart('occupancy', 'reports', filters, lambda: occupancy_report(filters))
+    return context
+
+
+async def abuild_report_context(filters=None, user=None):
+    """مثل build_report_context، واستعلامات الملخص والرسم غير المخزنة تعمل كلها معا"""
+    filters = dict(filters or {}, user=user)
+    summary, chart, occupancy_trend = await asyncio.gather(
+        acached('report_summary', 'reports', {'user': user}, lambda: areport_summary(user)),
+        acached_chart('revenue', 'reports', filters, lambda: arevenue_chart(filters)),
+        acached_chart('occupancy', 'reports', filters, lambda: aoccupancy_report(filters)),
+    )
+    return dict(summary, revenue_chart=chart, occupancy=occupancy_trend)
@@ -0,0 +1,91 @@
+import re
+
+from django.db import transaction
+
+from .models import RentalContract, ContractSearchTerm
+
+# التشكيل والتطويل تُحذف، والحروف المتشابهة تُوحّد قبل الفهرسة والبحث
+ARABIC_DIACRITICS = re.compile('[\u064b-\u0652\u0670\u0640]')
+ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+WORD = re.compile(r'\w+')
+ARTICLE = 'ال'
+TERM_MAX_LENGTH = 100
+
+
+def normalize_arabic(text):
+    return ARABIC_DIACRITICS.sub('', text or '').translate(ARABIC_FOLDING).casefold()
+
+
+def strip_article(word):
+    if word.startswith(ARTICLE) and len(word) > len(ARTICLE) + 1:
+        return word[len(ARTICLE):]
+    return word
+
+
+def tokenize(text):
+    """كلمات الفهرسة: كل كلمة مطبّعة، ومعها صيغتها دون أداة التعريف"""
+    words = set()
+    for word in WORD.findall(normalize_arabic(text)):
+        words.add(word[:TERM_MAX_LENGTH])
+        words.add(strip_article(word)[:TERM_MAX_LENGTH])
+    return words
+
+
+def query_words(text):
+    # كلمات الاستعلام تُطابق دون أداة التعريف حتى يجد "البلوشي" و"بلوشي" النتائج نفسها
+    return {strip_article(word)[:TERM_MAX_LENGTH] for word in WORD.findall(normalize_arabic(text))}
+
+
+# الحقول القابلة للبحث في العقود ومصدر نصها
+CONTRACT_FIELDS = {
+    'tenant_name': lambda contract: [contract.tenant.user.username, contract.tenant.user.first_name, contract.tenant.user.last_name],
+    'company_name': lambda contract: [contract.tenant.company_name],
+    'registration_number': lambda contract: [contract.tenant.commercial_registration_number],
+    'property_name': lambda contract: [contract.unit.name],
+}
+
+
+def contract_terms(contract):
+    for field, values in CONTRACT_FIELDS.items():
+        terms = set()
+        for value in values(contract):
+            terms |= tokenize(value)
+        for term in terms:
+            yield ContractSearchTerm(contract=contract, field=field, term=term)
+
+
+def index_contracts(contracts):
+    """إعادة بناء كلمات الفهرس للعقود المعطاة"""
+    contracts = list(contracts.select_related('tenant__user', 'unit'))
+    if not contracts:
+        return 0
+    with transaction.atomic():
+        ContractSearchTerm.objects.filter(contract__in=contracts).delete()
+        terms = [term for contract in contracts for term in contract_terms(contract)]
+        ContractSearchTerm.objects.bulk_create(terms, batch_size=1000)
+    return len(terms)
+
+
+def search_contracts(queryset=None, start_date=None, end_date=None, **fields):
+    """كل كلمة في الاستعلام يجب أن تكون بداية كلمة مفهرسة في الحقل نفسه"""
+    if queryset is None:
+        queryset = RentalContract.objects.all()
+    for field, value in fields.items():
+        if field not in CONTRACT_FIELDS:
+            raise ValueError('حقل بحث غير معروف: %s' % field)
+        for word in query_words(value):
+            # نطاق على فهرس (field, term) بدلا من LIKE '%...%' على الجداول الأصلية
+            matches = ContractSearchTerm.objects.filter(field=field, term__gte=word, term__lt=word + '\uffff')
+            queryset = queryset.filter(pk__in=matches.values('contract_id'))
+    # العقود التي تتقاطع مدتها مع الفترة المطلوبة
+    if start_date:
+        queryset = queryset.filter(end_date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(start_date__lte=end_date)
+    return queryset
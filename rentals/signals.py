@@ -0,0 +1,217 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from django.contrib.auth.models import User
+
+from .models import Property, Tenant, RentalContract, Invoice, Payment, MaintenanceRequest, Document
+from . import blobs, caching, fulltext, ledger, occupancy, reconciliation, thumbnails
+from .models import OccupancyMonth
+from .dashboard import invalidate_snapshot
+from .versions import bump_version
+from .search import index_contracts
+
+
+# أي تغيير على العقارات أو المستأجرين أو الفواتير يبطل لقطة لوحة التحكم، وكذلك العقود
+# لأن عدد مستأجري المالك يُحسب منها
+@receiver([post_save, post_delete], sender=Property)
+@receiver([post_save, post_delete], sender=Tenant)
+@receiver([post_save, post_delete], sender=RentalContract)
+@receiver([post_save, post_delete], sender=Invoice)
+def invalidate_dashboard(sender, **kwargs):
+    invalidate_snapshot()
+
+
+# رسوم التقارير مبنية على الفواتير والدفعات والعقارات، وتوقع الدخل على العقود
+@receiver([post_save, post_delete], sender=Property)
+@receiver([post_save, post_delete], sender=RentalContract)
+@receiver([post_save, post_delete], sender=Invoice)
+@receiver([post_save, post_delete], sender=Payment)
+def invalidate_report_charts(sender, **kwargs):
+    bump_version('reports')
+
+
+# أرصدة العقود والمستأجرين والعقارات؛ العقد والفاتورة السابقان يُحفظان قبل الحفظ ليُعاد حسابهما إن تغيرا
+@receiver(pre_save, sender=Invoice)
+@receiver(pre_save, sender=Payment)
+def remember_previous_links(sender, instance, **kwargs):
+    fields = ('contract_id', 'pk') if sender is Invoice else ('invoice__contract_id', 'invoice_id')
+    previous = sender.objects.filter(pk=instance.pk).values_list(*fields).first() if instance.pk else None
+    instance._previous_contract, instance._previous_invoice = previous or (None, None)
+
+
+def cascaded(sender, origin):
+    """هل حُذف الكائن تبعا لحذف أب؟ origin هو الكائن أو الاستعلام الذي بدأ منه الحذف"""
+    if origin is None:
+        return False
+    return (origin.model if isinstance(origin, QuerySet) else type(origin)) is not sender
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+@receiver([post_save, post_delete], sender=Payment)
+def update_balances(sender, instance, signal, origin=None, **kwargs):
+    # الفواتير والدفعات المحذوفة مع عقدها أو عقارها أو مستأجرها يعيد الأب حساب أرصدتها مرة واحدة
+    if signal is post_delete and cascaded(sender, origin):
+        return
+    if sender is Invoice:
+        contract_id = instance.contract_id
+    else:
+        contract_id = Invoice.objects.filter(pk=instance.invoice_id).values_list('contract_id', flat=True).first()
+    ledger.refresh({contract_id, getattr(instance, '_previous_contract', None)} - {None})
+
+
+# حالة الفاتورة تتبع مجموع دفعاتها، ومنها إيرادات لوحة التحكم
+@receiver(post_save, sender=Invoice)
+@receiver([post_save, post_delete], sender=Payment)
+def reconcile_invoices(sender, instance, signal, origin=None, **kwargs):
+    # الدفعات المحذوفة مع فاتورتها أو عقدها لا تغير حالة فاتورة باقية
+    if signal is post_delete and cascaded(sender, origin):
+        return
+    invoice_id = instance.pk if sender is Invoice else instance.invoice_id
+    reconciliation.reconcile({invoice_id, getattr(instance, '_previous_invoice', None)} - {None})
+
+
+@receiver(post_save, sender=RentalContract)
+def update_contract_balance(sender, instance, created, **kwargs):
+    # العقد الجديد بلا فواتير؛ التعديل قد ينقله لمستأجر أو عقار آخر
+    if not created:
+        ledger.refresh([instance.pk])
+
+
+@receiver(post_delete, sender=RentalContract)
+def remove_contract_balance(sender, instance, origin=None, **kwargs):
+    if not cascaded(sender, origin):
+        ledger.refresh([instance.pk])
+
+
+# حذف عقار أو مستأجر يحذف عقوده وفواتيرها ودفعاتها؛ تُحفظ العقود قبل الحذف وتُعاد أرصدتها معا بعده
+@receiver(pre_delete, sender=Property)
+@receiver(pre_delete, sender=Tenant)
+def remember_deleted_contracts(sender, instance, **kwargs):
+    contracts = list(instance.contracts.values_list('pk', 'unit_id'))
+    instance._deleted_contracts = [pk for pk, unit_id in contracts]
+    # عقارات المستأجر المحذوف باقية فيُعاد إشغالها، وصفوف العقار المحذوف تُحذف معه
+    instance._deleted_units = {unit_id for pk, unit_id in contracts} if sender is Tenant else set()
+
+
+@receiver(post_delete, sender=Property)
+@receiver(post_delete, sender=Tenant)
+def remove_contract_balances(sender, instance, **kwargs):
+    ledger.refresh(getattr(instance, '_deleted_contracts', ()))
+    occupancy.refresh(getattr(instance, '_deleted_units', ()))
+
+
+# الإشغال الشهري يُعاد حسابه للعقار الذي تغيرت عقوده، وللعقار السابق إذا نُقل العقد
+@receiver(pre_save, sender=RentalContract)
+def remember_previous_unit(sender, instance, **kwargs):
+    instance._previous_unit = (
+        RentalContract.objects.filter(pk=instance.pk).values_list('unit_id', flat=True).first() if instance.pk else None
+    )
+
+
+@receiver([post_save, post_delete], sender=RentalContract)
+def update_occupancy(sender, instance, signal, origin=None, **kwargs):
+    if signal is post_delete and cascaded(sender, origin):
+        return
+    occupancy.refresh({instance.unit_id, getattr(instance, '_previous_unit', None)})
+
+
+@receiver(post_save, sender=Property)
+def start_occupancy(sender, instance, created, **kwargs):
+    if created:
+        occupancy.refresh([instance.pk])
+
+
+@receiver(post_delete, sender=Property)
+def remove_occupancy(sender, instance, **kwargs):
+    OccupancyMonth.objects.filter(unit=instance.pk).delete()
+
+
+# صفوف القوائم المخزنة: يُحذف صف الكائن وصفوف من يعرض بياناته، وتُرفع إصدارات القوائم
+@receiver([post_save, post_delete], sender=Property)
+@receiver([post_save, post_delete], sender=Tenant)
+@receiver([post_save, post_delete], sender=RentalContract)
+@receiver([post_save, post_delete], sender=MaintenanceRequest)
+@receiver([post_save, post_delete], sender=Document)
+def invalidate_cached_rows(sender, instance, **kwargs):
+    caching.invalidate(sender, [instance.pk])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_rows(sender, instance, created, update_fields=None, **kwargs):
+    # تسجيل الدخول يحفظ last_login فقط ولا يغير ما تعرضه القوائم
+    if not created and update_fields != frozenset(['last_login']):
+        caching.invalidate(User, [instance.pk])
+
+
+# فهرس بحث العقود يعتمد على بيانات العقد والعقار والمستأجر ومستخدمه
+@receiver(post_save, sender=RentalContract)
+def index_contract(sender, instance, **kwargs):
+    index_contracts(RentalContract.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Property)
+def index_property_contracts(sender, instance, created, **kwargs):
+    if not created:
+        index_contracts(instance.contracts.all())
+
+
+@receiver(post_save, sender=Tenant)
+def index_tenant_contracts(sender, instance, created, **kwargs):
+    if not created:
+        index_contracts(instance.contracts.all())
+
+
+@receiver(post_save, sender=User)
+def index_user_contracts(sender, instance, created, update_fields=None, **kwargs):
+    # تسجيل الدخول يحفظ last_login وحده، ولا يغير شيئا من نص الفهرس
+    if not created and update_fields != {'last_login'}:
+        index_contracts(RentalContract.objects.filter(tenant__user=instance))
+
+
+# الفهرس النصي الكامل يُحدَّث صفا بصف مع كل حفظ أو حذف
+@receiver(post_save, sender=Property)
+@receiver(post_save, sender=Tenant)
+@receiver(post_save, sender=MaintenanceRequest)
+@receiver(post_save, sender=Document)
+def update_fulltext(sender, instance, **kwargs):
+    fulltext.index_object(instance)
+
+
+@receiver(post_delete, sender=Property)
+@receiver(post_delete, sender=Tenant)
+@receiver(post_delete, sender=MaintenanceRequest)
+@receiver(post_delete, sender=Document)
+def remove_fulltext(sender, instance, **kwargs):
+    fulltext.remove_object(instance)
+
+
+@receiver(post_save, sender=User)
+def update_user_fulltext(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields != {'last_login'}:
+        fulltext.index_objects('tenant', Tenant.objects.select_related('user').filter(user=instance))
+
+
+# عدّ مراجع ملفات المستندات؛ الملف المشترك بين عدة مستندات يبقى حتى يُحذف آخرها
+@receiver(pre_save, sender=Document)
+def remember_document_file(sender, instance, **kwargs):
+    instance._previous_file = (
+        Document.objects.filter(pk=instance.pk).values_list('file', flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Document)
+def retain_document_file(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_file', None)
+    if instance.file.name != previous:
+        blobs.retain(instance.file.name)
+        blobs.release(previous)
+        # الصورة المصغرة تُولد في الخلفية بعد حفظ المعاملة
+        name = instance.file.name
+        transaction.on_commit(lambda: thumbnails.schedule(name))
+
+
+@receiver(post_delete, sender=Document)
+def release_document_file(sender, instance, **kwargs):
+    blobs.release(instance.file.name)
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage, storages
+
+DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """تخزين كل ملف باسم بصمة محتواه (sha256)، فالملف المكرر يُحفظ مرة واحدة.
+
+    البصمة تُحسب أثناء كتابة الملف على دفعات إلى ملف مؤقت في مجلد التخزين نفسه،
+    ثم يُنقل إلى مكانه النهائي بعملية ذرية أو يُحذف إن كان المحتوى موجودا مسبقا.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # الاسم النهائي يُحدد من المحتوى في _save، والتكرار مقصود
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.join(self.location, 'tmp')
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temp:
+            try:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            except BaseException:
+                os.unlink(temp.name)
+                raise
+
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(posixpath.dirname(name), digest[:2], digest + extension)
+        path = self.path(name)
+        if os.path.exists(path):
+            os.unlink(temp.name)
+            return name
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(temp.name, self.file_permissions_mode)
+        os.replace(temp.name, path)
+        return name
+
+    def thumbnail_name(self, name):
+        # الصورة المصغرة بجانب الملف نفسه وباسمه
+        return os.path.splitext(name)[0] + '.thumb.jpg'
+
+    def digest(self, name):
+        """بصمة المحتوى من اسم الملف، أو None للملفات المرفوعة قبل هذا التخزين"""
+        digest = os.path.splitext(posixpath.basename(name))[0]
+        return digest if DIGEST.match(digest) else None
+
+
+def document_storage():
+    return storages['documents']
@@ -0,0 +1,30 @@
+import io
+import zipfile
+
+
+class ZipStream(io.RawIOBase):
+    # مخزن مؤقت يُفرَّغ بعد كل جزء، فلا يبقى الأرشيف كاملا في الذاكرة
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_zip(files):
+    """أرشيف ZIP يُرسل ملفا بعد ملف؛ ملفات PDF مضغوطة أصلا فتُخزن دون ضغط"""
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, path in files:
+            archive.write(path, name)
+            yield stream.pop()
+    yield stream.pop()
@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import caching
+from .models import Property, RentalContract, Invoice
+from .versions import bump_version
+
+
+def active_contract_exists(today):
+    return Exists(RentalContract.objects.filter(
+        unit=OuterRef('pk'), is_active=True, start_date__lte=today, end_date__gte=today,
+    ))
+
+
+def sweep(today=None):
+    """تحديث الحالات المنتهية بعبارات UPDATE جماعية بدلا من فحص كل سجل عند حفظه.
+
+    تُرجع عدد الصفوف التي تغيرت في كل خطوة.
+    """
+    today = today or date.today()
+    now = timezone.now()
+    with transaction.atomic():
+        changed = {
+            # العقود التي انتهت مدتها
+            'contracts_expired': RentalContract.objects.filter(is_active=True, end_date__lt=today).update(is_active=False, updated_at=now),
+            # الفواتير غير المدفوعة بعد تاريخ استحقاقها
+            'invoices_overdue': Invoice.objects.filter(status='pending', due_date__lt=today).update(status='overdue'),
+            # مزامنة حالة العقار مع وجود عقد نشط اليوم؛ العقارات تحت الصيانة لا تُمس
+            'properties_rented': Property.objects.filter(status='available').filter(active_contract_exists(today)).update(status='rented', updated_at=now),
+            'properties_available': Property.objects.filter(status='rented').exclude(active_contract_exists(today)).update(status='available', updated_at=now),
+        }
+    # update() لا يرسل إشارات الحفظ، لذلك نبطل لقطات لوحة التحكم والتقارير يدويا
+    if any(changed.values()):
+        bump_version('dashboard', 'reports')
+    # الصفوف المعدلة غير معروفة، فتُبطل صفوف العقود والعقارات المخزنة كلها
+    if changed['contracts_expired'] or changed['properties_rented'] or changed['properties_available']:
+        caching.invalidate_all(RentalContract, Property)
+    return changed
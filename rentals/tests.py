@@ -1,3 +1,1436 @@
-from django.test import TestCase
+import csv
+import hashlib
+import importlib
+import io
+import json
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from PIL import Image
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import OperationalError, connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from . import billing, blobs, caching, dashboard, exports, forecast, fulltext, imports, jobs, ledger, metrics, occupancy, reconciliation, reports, sweeper, thumbnails
+from .models import Property, Tenant, RentalContract, Invoice, Payment, MaintenanceRequest, Balance, Job, OccupancyMonth, Document, Blob
+from .search import normalize_arabic, query_words, search_contracts, tokenize
+from .versions import VERSION_KEY, bump_version, get_version
+
+
+class ListViewQueryBudgetTests(TestCase):
+    # كل صفحة قائمة: استعلام للعدد واستعلام للصفحة مع العلاقات
+    QUERY_BUDGET = 3
+    # الجلسة والمستخدم الحالي، وتُقرأ مرة واحدة في الطلب
+    AUTH_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = owner = User.objects.create(username='owner')
+        today = date.today()
+        for i in range(30):
+            user = User.objects.create(username='tenant%d' % i)
+            unit = Property.objects.create(user=owner, name='عقار %d' % i, address='مسقط')
+            tenant = Tenant.objects.create(user=user, tenant_type='individual')
+            contract = RentalContract.objects.create(
+                unit=unit, tenant=tenant, start_date=today, end_date=today + timedelta(days=365), monthly_rent=100,
+            )
+            Invoice.objects.create(contract=contract, due_date=today, amount=100)
+            MaintenanceRequest.objects.create(unit=unit, title='تسريب', description='تسريب مياه')
+
+    def setUp(self):
+        # الصفحات المخزنة من اختبار سابق لا تُحسب عليها الاستعلامات
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def assertWithinBudget(self, url_name, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), self.QUERY_BUDGET + self.AUTH_QUERIES, [query['sql'] for query in queries])
+        return response
+
+    def test_list_views_stay_within_query_budget(self):
+        for url_name in ('property_list', 'tenant_list', 'rentalcontract_list', 'invoice_list', 'payment_list', 'maintenance_request_list', 'document_list'):
+            with self.subTest(url_name=url_name):
+                self.assertWithinBudget(url_name)
+
+    def test_page_size_is_configurable(self):
+        response = self.assertWithinBudget('rentalcontract_list', page_size=10, page=2)
+        self.assertEqual(len(response.context['contracts']), 10)
+        self.assertEqual(response.context['paginator'].num_pages, 3)
+
+    def test_page_size_is_capped(self):
+        with self.settings(RENTALS_MAX_PAGE_SIZE=20):
+            response = self.assertWithinBudget('tenant_list', page_size=1000)
+        self.assertEqual(response.context['paginator'].per_page, 20)
+
+    def test_invoice_cursor_walks_every_row_once(self):
+        seen = []
+        params = {'page_size': 7}
+        while True:
+            response = self.assertWithinBudget('invoice_list', **params)
+            page = response.context['page_obj']
+            seen.extend(invoice.pk for invoice in page)
+            if not page.has_next():
+                break
+            params['after'] = page.next_cursor
+        self.assertEqual(seen, list(Invoice.objects.order_by('-due_date', '-id').values_list('pk', flat=True)))
+
+        response = self.assertWithinBudget('invoice_list', page_size=7, before=page.previous_cursor)
+        self.assertEqual([invoice.pk for invoice in response.context['page_obj']], seen[-9:-2])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse('invoice_list'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class OwnerScopingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        cls.owners = [User.objects.create(username='owner%d' % i) for i in range(2)]
+        cls.admin = User.objects.create(username='admin', is_superuser=True)
+        tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        for owner in cls.owners:
+            for i in range(3):
+                unit = Property.objects.create(user=owner, name='%s %d' % (owner.username, i), address='مسقط')
+                contract = RentalContract.objects.create(
+                    unit=unit, tenant=tenant, start_date=today, end_date=today + timedelta(days=365), monthly_rent=100,
+                )
+                Invoice.objects.create(contract=contract, due_date=today, amount=100)
+                MaintenanceRequest.objects.create(unit=unit, title='تسريب', description='تسريب مياه')
+
+    def test_lists_show_only_own_rows(self):
+        owner, other = self.owners
+        self.client.force_login(owner)
+        for url_name, name, model in (
+            ('property_list', 'properties', Property),
+            ('rentalcontract_list', 'contracts', RentalContract),
+            ('invoice_list', 'invoices', Invoice),
+            ('maintenance_request_list', 'requests', MaintenanceRequest),
+        ):
+            with self.subTest(url_name=url_name):
+                response = self.client.get(reverse(url_name))
+                expected = set(model.objects.filter(**{model.owner_field: owner}).values_list('pk', flat=True))
+                self.assertEqual({obj.pk for obj in response.context[name]}, expected)
+
+    def test_other_owners_rows_are_not_found(self):
+        owner, other = self.owners
+        self.client.force_login(owner)
+        unit = other.properties.first()
+        self.assertEqual(self.client.get(reverse('property_update', args=[unit.pk])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('property_delete', args=[unit.pk])).status_code, 404)
+        self.assertTrue(Property.objects.filter(pk=unit.pk).exists())
+
+    def test_dashboard_is_per_owner(self):
+        owner, other = self.owners
+        self.client.force_login(owner)
+        self.assertEqual(self.client.get(reverse('dashboard')).context['total_units'], 3)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('dashboard')).context['total_units'], 6)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 302)
+
+    def test_anonymous_requests_are_redirected_to_login(self):
+        unit = self.owners[0].properties.first()
+        for url in (reverse('property_list'), reverse('property_update', args=[unit.pk]), reverse('search'), reverse('revenue_series')):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 302)
+        response = self.client.post(reverse('property_create'), {'name': 'مجهول', 'address': 'مسقط', 'property_type': 'apartment'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Property.objects.filter(name='مجهول').exists())
+
+    @skipUnless(fulltext.is_available(), 'SQLite FTS5 غير متاح')
+    def test_search_fills_the_page_with_own_matches_ranked_below_others(self):
+        owner, other = self.owners
+        # عقارات المالك الآخر أعلى ترتيبا (الكلمة في الاسم) فتملأ أول دفعة قبل الاستبعاد
+        for i in range(5):
+            Property.objects.create(user=other, name='برج الندى %d' % i, address='مسقط')
+        Property.objects.create(user=owner, name='بيت', address='شارع الندى')
+        fulltext.rebuild()
+        results = fulltext.search('الندى', kind='property', limit=3, user=owner)
+        self.assertEqual([row['label'] for row in results], ['بيت'])
+        self.assertEqual(len(fulltext.search('الندى', kind='property', limit=3, user=self.admin)), 3)
+
+
+class ContractSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        cls.user = User.objects.create(username='salim', first_name='سالم', last_name='البلوشي')
+        tenant = Tenant.objects.create(user=cls.user, tenant_type='company', company_name='مؤسسة الأمل', commercial_registration_number='١٢٣٤٥')
+        cls.units = [Property.objects.create(user=cls.owner, name=name, address='مسقط') for name in ('برج النخيل', 'فيلا الوادي')]
+        cls.contracts = [
+            RentalContract.objects.create(unit=unit, tenant=tenant, start_date=start, end_date=start + timedelta(days=364), monthly_rent=100)
+            for unit, start in zip(cls.units, (date(2023, 1, 1), date(2024, 1, 1)))
+        ]
+
+    def test_normalization_folds_arabic_variants(self):
+        self.assertEqual(normalize_arabic('أَحْمَـــد'), 'احمد')
+        self.assertEqual(normalize_arabic('إسلام آمنة مستشفى'), 'اسلام امنه مستشفي')
+        self.assertEqual(normalize_arabic('الرقم ٠٩ ABC'), 'الرقم 09 abc')
+        self.assertEqual(tokenize('البلوشي ال'), {'البلوشي', 'بلوشي', 'ال'})
+        self.assertEqual(query_words('البَلوشي'), {'بلوشي'})
+
+    def test_search_matches_prefixes_with_or_without_the_article(self):
+        for fields in ({'tenant_name': 'بلوشي'}, {'tenant_name': 'البلو'}, {'tenant_name': 'سالم البلوشي'}, {'company_name': 'امل'}, {'registration_number': '12345'}):
+            with self.subTest(fields=fields):
+                self.assertEqual(set(search_contracts(**fields)), set(self.contracts))
+        self.assertEqual(list(search_contracts(property_name='النخيل')), self.contracts[:1])
+        self.assertFalse(search_contracts(tenant_name='سالم الحارثي').exists())
+        self.assertEqual(list(search_contracts(tenant_name='سالم', start_date=date(2024, 6, 1))), self.contracts[1:])
+        with self.assertRaises(ValueError):
+            search_contracts(phone='1')
+
+    def test_renames_reindex_but_logins_do_not(self):
+        self.user.last_name = 'الحارثي'
+        self.user.save()
+        self.assertEqual(search_contracts(tenant_name='حارثي').count(), 2)
+        with mock.patch('rentals.signals.index_contracts') as index:
+            self.user.last_login = timezone.now()
+            self.user.save(update_fields=['last_login'])
+        index.assert_not_called()
+
+    def test_search_view_is_scoped_to_the_owner(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('contract_search'), {'property_name': 'الوادي'})
+        self.assertEqual(list(response.context['contracts']), self.contracts[1:])
+        self.client.force_login(User.objects.create(username='other'))
+        self.assertFalse(self.client.get(reverse('contract_search'), {'property_name': 'الوادي'}).context['contracts'])
+
+
+@skipUnless(fulltext.is_available(), 'SQLite FTS5 غير متاح')
+class FulltextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        cls.by_name = Property.objects.create(user=cls.owner, name='برج النخيل', address='مسقط')
+        cls.by_address = Property.objects.create(user=cls.owner, name='فيلا', address='شارع النخيل')
+        cls.user = User.objects.create(username='salim', first_name='سالم')
+        cls.tenant = Tenant.objects.create(user=cls.user, tenant_type='individual', phone_number='99112233')
+
+    def rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT rowid, label, title, body FROM %s ORDER BY rowid' % fulltext.TABLE)
+            return cursor.fetchall()
+
+    def test_index_is_an_fts5_table_kept_in_step_with_saves(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE name = %s", [fulltext.TABLE])
+            self.assertIn('fts5', cursor.fetchone()[0])
+        self.assertEqual(len(self.rows()), 3)
+        self.by_address.delete()
+        self.assertEqual([row['id'] for row in fulltext.search('نخيل')], [self.by_name.pk])
+
+    def test_title_matches_rank_above_body_matches(self):
+        results = fulltext.search('النخيل', kind='property')
+        self.assertEqual([row['id'] for row in results], [self.by_name.pk, self.by_address.pk])
+        self.assertLess(results[0]['rank'], results[1]['rank'])
+        self.assertEqual([row['kind'] for row in fulltext.search('نخ')], ['property', 'property'])
+
+    def test_query_syntax_is_escaped(self):
+        for query in ('"', 'النخيل" OR "فيلا', 'NEAR(برج مسقط)', 'AND', '*', 'body:برج', '-'):
+            with self.subTest(query=query):
+                fulltext.search(query)
+        self.assertEqual(fulltext.search('"النخيل"')[0]['id'], self.by_name.pk)
+        self.assertEqual(fulltext.search('برج OR فيلا'), [])
+
+    def test_migration_builds_the_same_index_as_rebuild(self):
+        migration = importlib.import_module('rentals.migrations.0005_fulltext_index')
+        fulltext.rebuild()
+        expected = self.rows()
+        # محرر المخطط في SQLite لا يعمل داخل معاملة الاختبار، والترحيل يحتاج منه execute فقط
+        schema_editor = mock.Mock(connection=connection, execute=lambda sql: connection.cursor().execute(sql))
+        migration.drop_index(django_apps, schema_editor)
+        self.assertRaises(OperationalError, self.rows)
+        migration.create_index(django_apps, schema_editor)
+        self.assertEqual(self.rows(), expected)
+
+    def test_logins_do_not_reindex_tenants(self):
+        with mock.patch('rentals.fulltext.index_objects') as index:
+            self.user.last_login = timezone.now()
+            self.user.save(update_fields=['last_login'])
+            index.assert_not_called()
+            self.user.save()
+            index.assert_called_once()
+
+
+class BillingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        cls.period = date.today().replace(day=1)
+        cls.contracts = [
+            RentalContract.objects.create(
+                unit=Property.objects.create(user=cls.owner, name='عقار %d' % i, address='مسقط'), tenant=tenant,
+                start_date=cls.period, end_date=cls.period + timedelta(days=365), monthly_rent=100 + i,
+            )
+            for i in range(3)
+        ]
+
+    def test_generate_invoices_is_idempotent(self):
+        self.assertEqual(billing.generate_invoices(self.period, due_day=5), 3)
+        self.assertEqual(billing.generate_invoices(self.period, due_day=5), 0)
+        self.assertEqual(Invoice.objects.filter(period=self.period).count(), 3)
+        self.assertEqual(Invoice.objects.get(contract=self.contracts[1]).due_date, self.period.replace(day=5))
+
+    def test_conflicting_rows_are_not_counted(self):
+        # فاتورة أُصدرت بعد اختيار العقود، كما لو سبق تشغيل متزامن إليها
+        Invoice.objects.create(contract=self.contracts[0], period=self.period, due_date=self.period, amount=100)
+        with mock.patch('rentals.billing.billable_contracts', return_value=RentalContract.objects.all()):
+            self.assertEqual(billing.generate_invoices(self.period), 2)
+        self.assertEqual(Invoice.objects.filter(period=self.period).count(), 3)
+
+    def test_revenue_endpoint_groups_invoices_with_a_period(self):
+        billing.generate_invoices(self.period)
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('revenue_series'))
+        self.assertEqual(response.status_code, 200)
+        [bucket] = response.json()['buckets']
+        self.assertEqual((bucket['period'], Decimal(bucket['total'])), (self.period.isoformat(), 303))
+
+
+class FrozenDate(date):
+    @classmethod
+    def today(cls):
+        return cls(2024, 6, 15)
+
+
+class SweeperTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create(username='owner')
+        tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        cls.units = {}
+        for name, status in (('ended', 'rented'), ('started', 'available'), ('repair', 'maintenance'), ('steady', 'rented')):
+            cls.units[name] = Property.objects.create(user=owner, name=name, address='مسقط', status=status)
+        cls.contracts = {
+            name: RentalContract.objects.create(unit=cls.units[name], tenant=tenant, start_date=start, end_date=end, monthly_rent=100, is_active=True)
+            for name, start, end in (
+                ('ended', date(2023, 6, 15), date(2024, 6, 14)),
+                ('started', date(2024, 6, 15), date(2025, 6, 14)),
+                ('repair', date(2024, 1, 1), date(2024, 12, 31)),
+                ('steady', date(2024, 1, 1), date(2024, 12, 31)),
+            )
+        }
+        contract = cls.contracts['steady']
+        cls.invoices = {
+            name: Invoice.objects.create(contract=contract, due_date=due, amount=100, status=status)
+            for name, due, status in (
+                ('late', date(2024, 6, 14), 'pending'), ('due_today', date(2024, 6, 15), 'pending'), ('paid', date(2024, 5, 1), 'paid'),
+            )
+        }
+        # الحالات كما كانت قبل آخر تشغيل، بلا أثر لما تفعله الإشارات عند الإنشاء
+        for name, unit in cls.units.items():
+            Property.objects.filter(pk=unit.pk).update(status=unit.status)
+        RentalContract.objects.update(is_active=True)
+        for invoice in cls.invoices.values():
+            Invoice.objects.filter(pk=invoice.pk).update(status=invoice.status)
+
+    def statuses(self):
+        return (
+            {name: Property.objects.get(pk=unit.pk).status for name, unit in self.units.items()},
+            {name: RentalContract.objects.get(pk=contract.pk).is_active for name, contract in self.contracts.items()},
+            {name: Invoice.objects.get(pk=invoice.pk).status for name, invoice in self.invoices.items()},
+        )
+
+    def test_each_transition_is_counted(self):
+        version = get_version('dashboard')
+        with mock.patch('rentals.sweeper.date', FrozenDate):
+            changed = sweeper.sweep()
+        self.assertEqual(changed, {'contracts_expired': 1, 'invoices_overdue': 1, 'properties_rented': 1, 'properties_available': 1})
+        self.assertEqual(self.statuses(), (
+            {'ended': 'available', 'started': 'rented', 'repair': 'maintenance', 'steady': 'rented'},
+            {'ended': False, 'started': True, 'repair': True, 'steady': True},
+            {'late': 'overdue', 'due_today': 'pending', 'paid': 'paid'},
+        ))
+        self.assertNotEqual(get_version('dashboard'), version)
+
+        version = get_version('dashboard')
+        self.assertEqual(set(sweeper.sweep(FrozenDate.today()).values()), {0})
+        self.assertEqual(get_version('dashboard'), version)
+
+    def test_later_day_moves_further(self):
+        sweeper.sweep(date(2024, 6, 15))
+        changed = sweeper.sweep(date(2025, 1, 1))
+        self.assertEqual(changed, {'contracts_expired': 2, 'invoices_overdue': 1, 'properties_rented': 0, 'properties_available': 1})
+
+
+class BalanceLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        cls.owner = owner = User.objects.create(username='owner')
+        cls.tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        cls.units = [Property.objects.create(user=owner, name='عقار %d' % i, address='مسقط') for i in range(2)]
+        cls.contracts = [
+            RentalContract.objects.create(unit=unit, tenant=cls.tenant, start_date=today, end_date=today + timedelta(days=365), monthly_rent=100)
+            for unit in cls.units
+        ]
+
+    def snapshot(self):
+        return sorted(Balance.objects.values_list('scope', 'contract', 'tenant', 'unit', 'invoiced', 'paid', 'outstanding', 'last_payment_date'))
+
+    def test_partial_payments_update_every_scope(self):
+        first, second = self.contracts
+        invoice = Invoice.objects.create(contract=first, due_date=date.today(), amount=100)
+        Invoice.objects.create(contract=second, due_date=date.today(), amount=250)
+        Payment.objects.create(invoice=invoice, amount_paid=40, payment_method='bank_transfer')
+
+        self.assertEqual(ledger.balance_of(first).outstanding, 60)
+        self.assertEqual(ledger.balance_of(first).last_payment_date, date.today())
+        self.assertEqual(ledger.balance_of(self.units[1]).outstanding, 250)
+        tenant = ledger.balance_of(self.tenant)
+        self.assertEqual((tenant.invoiced, tenant.paid, tenant.outstanding), (350, 40, 310))
+
+    def test_moving_and_deleting_rows_keeps_totals(self):
+        first, second = self.contracts
+        invoice = Invoice.objects.create(contract=first, due_date=date.today(), amount=100)
+        payment = Payment.objects.create(invoice=invoice, amount_paid=30, payment_method='credit_card')
+        invoice.contract = second
+        invoice.save()
+        self.assertEqual(ledger.balance_of(first).invoiced, 0)
+        self.assertEqual(ledger.balance_of(second).outstanding, 70)
+
+        payment.delete()
+        self.assertEqual(ledger.balance_of(self.tenant).outstanding, 100)
+        pk = second.pk
+        second.delete()
+        self.assertFalse(Balance.objects.filter(contract=pk).exists())
+        self.assertEqual(ledger.balance_of(self.tenant).invoiced, 0)
+
+    def test_api_patch_refreshes_the_previous_contract(self):
+        first, second = self.contracts
+        invoice = Invoice.objects.create(contract=first, due_date=date.today(), amount=100)
+        other = Invoice.objects.create(contract=second, due_date=date.today(), amount=50)
+        payment = Payment.objects.create(invoice=invoice, amount_paid=30, payment_method='credit_card')
+        self.client.force_login(self.owner)
+        url = reverse('api_resource', args=['payments'])
+        self.client.patch(url, data=json.dumps([{'id': payment.pk, 'invoice': other.pk}]), content_type='application/json')
+        self.assertEqual((ledger.balance_of(first).paid, ledger.balance_of(second).paid), (0, 30))
+
+        url = reverse('api_resource', args=['invoices'])
+        self.client.patch(url, data=json.dumps([{'id': invoice.pk, 'contract': second.pk}]), content_type='application/json')
+        self.assertEqual(ledger.balance_of(first).invoiced, 0)
+        self.assertEqual(ledger.balance_of(second).outstanding, 120)
+        incremental = self.snapshot()
+        ledger.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_cascaded_deletes_refresh_once(self):
+        for contract in self.contracts:
+            for amount in (100, 200):
+                invoice = Invoice.objects.create(contract=contract, due_date=date.today(), amount=amount)
+                Payment.objects.create(invoice=invoice, amount_paid=10, payment_method='credit_card')
+        first, second = self.contracts
+        with mock.patch('rentals.ledger.refresh', wraps=ledger.refresh) as refresh:
+            first.delete()
+        self.assertEqual(refresh.call_count, 1)
+        self.assertEqual(ledger.balance_of(self.tenant).invoiced, 300)
+
+        with mock.patch('rentals.ledger.refresh', wraps=ledger.refresh) as refresh:
+            self.units[1].delete()
+        self.assertEqual(refresh.call_count, 1)
+        self.assertEqual(ledger.balance_of(self.tenant).invoiced, 0)
+        self.assertFalse(Balance.objects.exists())
+
+    def test_rebuild_matches_incremental_updates(self):
+        for contract in self.contracts:
+            invoice = Invoice.objects.create(contract=contract, due_date=date.today(), amount=contract.pk * 10)
+            Payment.objects.create(invoice=invoice, amount_paid=5, payment_method='credit_card')
+        incremental = self.snapshot()
+        ledger.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+
+class ReconciliationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        cls.owner = owner = User.objects.create(username='owner')
+        tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        unit = Property.objects.create(user=owner, name='عقار', address='مسقط')
+        cls.contract = RentalContract.objects.create(unit=unit, tenant=tenant, start_date=today, end_date=today + timedelta(days=365), monthly_rent=100)
+        cls.invoices = [
+            Invoice.objects.create(contract=cls.contract, due_date=today + timedelta(days=30 * i - 30), amount=100, period=date(2000, i + 1, 1))
+            for i in range(3)
+        ]
+
+    def statuses(self):
+        return list(Invoice.objects.order_by('due_date').values_list('status', flat=True))
+
+    def test_payment_save_marks_invoice_paid(self):
+        first = self.invoices[0]
+        Payment.objects.create(invoice=first, amount_paid=60, payment_method='credit_card')
+        self.assertEqual(self.statuses()[0], 'overdue')
+        payment = Payment.objects.create(invoice=first, amount_paid=40, payment_method='credit_card')
+        self.assertEqual(self.statuses()[0], 'paid')
+        payment.delete()
+        self.assertEqual(self.statuses()[0], 'overdue')
+
+    def test_api_patch_reconciles_the_previous_invoice(self):
+        first, second = self.invoices[:2]
+        payment = Payment.objects.create(invoice=first, amount_paid=100, payment_method='credit_card')
+        self.assertEqual(self.statuses()[:2], ['paid', 'pending'])
+        self.client.force_login(self.owner)
+        response = self.client.patch(
+            reverse('api_resource', args=['payments']), data=json.dumps([{'id': payment.pk, 'invoice': second.pk}]), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses()[:2], ['overdue', 'paid'])
+
+    def test_bank_transfer_is_allocated_oldest_first(self):
+        Payment.objects.create(invoice=self.invoices[0], amount_paid=30, payment_method='credit_card')
+        payments = reconciliation.allocate(self.contract, 120)
+        self.assertEqual([(payment.invoice_id, payment.amount_paid) for payment in payments], [(self.invoices[0].pk, 70), (self.invoices[1].pk, 50)])
+        self.assertEqual(self.statuses(), ['paid', 'pending', 'pending'])
+        self.assertEqual(ledger.balance_of(self.contract).outstanding, 150)
+        with self.assertRaises(ValueError):
+            reconciliation.allocate(self.contract, 1000)
+        self.assertEqual(Payment.objects.count(), 3)
+
+    def test_batch_reconcile_fixes_statuses_in_bulk(self):
+        Payment.objects.bulk_create([Payment(invoice=invoice, amount_paid=100, payment_method='bank_transfer') for invoice in self.invoices[:2]])
+        Invoice.objects.filter(pk=self.invoices[2].pk).update(status='paid')
+        # استعلام مجمع واحد ثم UPDATE لكل حالة، داخل نقطة حفظ
+        with self.assertNumQueries(5):
+            changed = reconciliation.reconcile()
+        self.assertEqual(changed, {'pending': 1, 'paid': 2, 'overdue': 0})
+        self.assertEqual(self.statuses(), ['paid', 'paid', 'pending'])
+
+
+class OccupancyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        cls.tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        cls.units = [Property.objects.create(user=cls.owner, name='عقار %d' % i, address='مسقط') for i in range(2)]
+
+    def contract(self, unit, start, end):
+        return RentalContract.objects.create(unit=unit, tenant=self.tenant, start_date=start, end_date=end, monthly_rent=100)
+
+    def test_unit_months_merges_overlaps_and_attributes_gaps(self):
+        intervals = [(date(2024, 1, 10), date(2024, 2, 14)), (date(2024, 2, 1), date(2024, 2, 20)), (date(2024, 3, 1), date(2024, 3, 31))]
+        rows = occupancy.unit_months(1, date(2024, 1, 1), intervals, date(2024, 3, 15))
+        self.assertEqual(rows, [
+            [1, date(2024, 1, 1), 31, 22, 0, 0],
+            [1, date(2024, 2, 1), 29, 20, 0, 0],
+            [1, date(2024, 3, 1), 31, 31, 1, 9],
+        ])
+
+    def test_moving_a_contract_refreshes_both_units(self):
+        first, second = self.units
+        contract = self.contract(first, date(2024, 1, 1), date(2024, 1, 31))
+        self.assertEqual(OccupancyMonth.objects.get(unit=first, month=date(2024, 1, 1)).occupied_days, 31)
+        contract.unit = second
+        contract.save()
+        # دون عقود سابقة يدخل العقار المحفظة من تاريخ إضافته
+        self.assertFalse(OccupancyMonth.objects.filter(unit=first, occupied_days__gt=0).exists())
+        self.assertEqual(OccupancyMonth.objects.get(unit=second, month=date(2024, 1, 1)).occupied_days, 31)
+
+        incremental = sorted(OccupancyMonth.objects.values_list('unit', 'month', 'days', 'occupied_days', 'vacancy_gaps', 'vacancy_days'))
+        occupancy.rebuild()
+        self.assertEqual(sorted(OccupancyMonth.objects.values_list('unit', 'month', 'days', 'occupied_days', 'vacancy_gaps', 'vacancy_days')), incremental)
+
+    def test_api_patch_refreshes_the_previous_unit(self):
+        first, second = self.units
+        contract = self.contract(first, date(2024, 1, 1), date(2024, 1, 31))
+        self.client.force_login(self.owner)
+        response = self.client.patch(
+            reverse('api_resource', args=['contracts']), data=json.dumps([{'id': contract.pk, 'unit': second.pk}]), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(OccupancyMonth.objects.filter(unit=first, occupied_days__gt=0).exists())
+        self.assertEqual(OccupancyMonth.objects.get(unit=second, month=date(2024, 1, 1)).occupied_days, 31)
+
+    def test_cascaded_deletes_refresh_once(self):
+        first, second = self.units
+        tenant = Tenant.objects.create(user=User.objects.create(username='leaving'), tenant_type='individual')
+        for unit in self.units:
+            RentalContract.objects.create(unit=unit, tenant=tenant, start_date=date(2024, 1, 1), end_date=date(2024, 1, 31), monthly_rent=100)
+        with mock.patch('rentals.occupancy.refresh', wraps=occupancy.refresh) as refresh:
+            tenant.delete()
+        self.assertEqual([set(call.args[0]) for call in refresh.call_args_list], [{first.pk, second.pk}])
+        self.assertFalse(OccupancyMonth.objects.filter(occupied_days__gt=0).exists())
+
+        self.contract(first, date(2024, 1, 1), date(2024, 1, 31))
+        with mock.patch('rentals.occupancy.refresh', wraps=occupancy.refresh) as refresh:
+            first.delete()
+        self.assertFalse(any(call.args[0] for call in refresh.call_args_list))
+        self.assertFalse(OccupancyMonth.objects.filter(unit=first.pk).exists())
+
+    def test_daily_timeline_counts_each_unit_once(self):
+        first, second = self.units
+        self.contract(first, date(2024, 1, 1), date(2024, 1, 10))
+        self.contract(first, date(2024, 1, 5), date(2024, 1, 20))
+        self.contract(second, date(2024, 1, 15), date(2024, 2, 15))
+        timeline = dict(occupancy.daily_timeline(date(2024, 1, 1), date(2024, 1, 31), user=self.owner))
+        self.assertEqual((timeline[date(2024, 1, 7)], timeline[date(2024, 1, 16)], timeline[date(2024, 1, 25)]), (1, 2, 1))
+
+    def test_series_endpoint(self):
+        first, second = self.units
+        self.contract(first, date(2024, 1, 1), date(2024, 1, 31))
+        self.contract(first, date(2024, 2, 11), date(2024, 3, 31))
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('occupancy_series'), {'start_date': '2024-01-01', 'end_date': '2024-03-31', 'unit': first.pk})
+        months = response.json()['months']
+        self.assertEqual([row['occupancy_rate'] for row in months], [100, 19 * 100 / 29, 100])
+        self.assertEqual(response.json()['average_vacancy_days'], 10)
+
+        response = self.client.get(reverse('occupancy_series'), {'start_date': '2024-02-01', 'end_date': '2024-02-29', 'granularity': 'day'})
+        self.assertEqual(sum(row['occupied_units'] for row in response.json()['days']), 19)
+
+
+class ForecastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        cls.tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        cls.unit = Property.objects.create(user=cls.owner, name='عقار', address='مسقط')
+        cls.month = date.today().replace(day=1)
+        cls.contract = RentalContract.objects.create(
+            unit=cls.unit, tenant=cls.tenant, start_date=cls.month, end_date=cls.month + timedelta(days=70), monthly_rent=Decimal('100.50'),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rent_roll_counts_partial_months_and_stopped_contracts(self):
+        intervals = [
+            (True, date(2024, 1, 15), date(2024, 3, 10), 100.5),
+            # موقوف قبل نهايته: يُحسب في الأشهر السابقة للشهر الحالي فقط
+            (False, date(2023, 12, 1), date(2024, 12, 31), 200.0),
+        ]
+        contracts, expected, expiring = forecast.rent_roll(intervals, forecast.month_index(date(2024, 1, 1)), 4, forecast.month_index(date(2024, 3, 5)))
+        self.assertEqual(list(contracts), [2, 2, 1, 0])
+        self.assertEqual(list(expected), [30050, 30050, 10050, 0])
+        self.assertEqual(list(expiring), [0, 20000, 10050, 0])
+
+    def test_forecast_compares_payments_and_is_cached(self):
+        invoice = Invoice.objects.create(contract=self.contract, due_date=self.month, amount=Decimal('100.50'))
+        Payment.objects.create(invoice=invoice, amount_paid=60, payment_method='bank_transfer')
+        result = reports.cash_flow_forecast({'months': 12}, self.owner)
+        current, following = result['months'][:2]
+        self.assertEqual((current['contracts'], current['expected'], current['actual'], current['variance']), (1, Decimal('100.50'), 60, Decimal('-40.50')))
+        self.assertEqual((following['expected'], following['actual']), (Decimal('100.50'), None))
+        self.assertEqual(result['expected_total'], Decimal('301.50'))
+
+        with self.assertNumQueries(0):
+            reports.cash_flow_forecast({'months': 12}, self.owner)
+        self.contract.monthly_rent = 200
+        self.contract.save()
+        self.assertEqual(reports.cash_flow_forecast({'months': 12}, self.owner)['months'][0]['expected'], Decimal('200.00'))
+
+    def test_forecast_endpoints(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('forecast_series'), {'months': 24, 'start': self.month.strftime('%Y-%m')})
+        self.assertEqual(len(response.json()['months']), 24)
+        self.assertEqual(response.json()['months'][0]['expected'], '100.50')
+        self.assertEqual(self.client.get(reverse('forecast_series'), {'months': 60}).status_code, 400)
+        response = self.client.get(reverse('forecast'))
+        self.assertEqual(len(response.context['forecast']['months']), forecast.MIN_MONTHS)
+
+    def test_filter_choices_are_scoped_to_the_owner(self):
+        other = Property.objects.create(user=User.objects.create(username='other'), name='عقار آخر', address='صحار')
+        outsider = Tenant.objects.create(user=User.objects.create(username='outsider'), tenant_type='individual')
+        RentalContract.objects.create(unit=other, tenant=outsider, start_date=self.month, end_date=self.month + timedelta(days=70), monthly_rent=100)
+        self.client.force_login(self.owner)
+        form = self.client.get(reverse('forecast')).context['filter_form']
+        self.assertEqual(list(form.fields['unit'].queryset), [self.unit])
+        self.assertEqual(list(form.fields['tenant'].queryset), [self.tenant])
+        for params in ({'unit': other.pk}, {'tenant': outsider.pk}):
+            response = self.client.get(reverse('forecast_series'), params)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(list(response.json()['errors']), list(params))
+
+
+class ResourceApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        cls.other = User.objects.create(username='other')
+        cls.tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        cls.units = [Property.objects.create(user=cls.owner, name='عقار %d' % i, address='مسقط', property_type='apartment') for i in range(5)]
+        cls.foreign_unit = Property.objects.create(user=cls.other, name='عقار آخر', address='صحار')
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def url(self, resource):
+        return reverse('api_resource', args=[resource])
+
+    def send(self, method, resource, rows):
+        return getattr(self.client, method)(self.url(resource), data=json.dumps(rows), content_type='application/json')
+
+    def contract_row(self, unit, **values):
+        row = {'unit': unit.pk, 'tenant': self.tenant.pk, 'start_date': '2024-01-01', 'end_date': '2024-12-31', 'monthly_rent': '150.00'}
+        row.update(values)
+        return row
+
+    def test_anonymous_requests_get_401(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url('properties')).status_code, 401)
+        self.assertEqual(self.send('post', 'contracts', [self.contract_row(self.units[0])]).status_code, 401)
+        self.assertFalse(RentalContract.objects.exists())
+
+    def test_list_selects_fields_and_walks_cursors(self):
+        seen, url, params = [], self.url('properties'), {'fields': 'id,name', 'page_size': 2}
+        while url:
+            payload = self.client.get(url, params).json()
+            self.assertTrue(all(set(row) == {'id', 'name'} for row in payload['results']))
+            seen += [row['id'] for row in payload['results']]
+            url, params = payload['next'], None
+        # عقار المالك الآخر لا يظهر
+        self.assertEqual(sorted(seen), sorted(unit.pk for unit in self.units))
+
+    def test_unknown_fields_and_bad_cursors_are_rejected(self):
+        response = self.client.get(self.url('properties'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json()['errors'])
+        self.assertEqual(self.client.get(self.url('properties'), {'after': 'not-a-cursor'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url('nothing')).status_code, 404)
+
+    def test_post_creates_every_row_or_none(self):
+        response = self.send('post', 'contracts', [
+            self.contract_row(self.units[0]),
+            self.contract_row(self.foreign_unit),
+            self.contract_row(self.units[1], monthly_rent='abc', tenant=999999),
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = {error['index']: error['errors'] for error in response.json()['errors']}
+        self.assertEqual(set(errors), {1, 2})
+        self.assertEqual(set(errors[1]), {'unit'})
+        self.assertEqual(set(errors[2]), {'tenant', 'monthly_rent'})
+        self.assertFalse(RentalContract.objects.exists())
+
+        response = self.send('post', 'contracts', [self.contract_row(unit) for unit in self.units[:2]])
+        self.assertEqual(response.status_code, 201)
+        created = RentalContract.objects.filter(pk__in=response.json()['created'])
+        self.assertEqual(sorted(created.values_list('unit', flat=True)), [unit.pk for unit in self.units[:2]])
+
+    def test_malformed_batches_are_rejected(self):
+        self.assertEqual(self.send('post', 'properties', {'name': 'ليس مصفوفة'}).status_code, 400)
+        response = self.send('post', 'properties', [{'name': 'عقار', 'address': {'city': 'مسقط'}}])
+        self.assertEqual(response.json()['errors'][0]['index'], 0)
+        with self.settings(RENTALS_API_MAX_BATCH=1):
+            self.assertEqual(self.send('post', 'properties', [{}, {}]).status_code, 413)
+        self.assertEqual(self.send('post', 'documents', [{'title': 'مستند'}]).status_code, 405)
+
+    def test_conflicting_rows_return_409(self):
+        contract = RentalContract.objects.create(
+            unit=self.units[0], tenant=self.tenant, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), monthly_rent=100,
+        )
+        row = {'contract': contract.pk, 'period': '2024-01-01', 'due_date': '2024-01-05', 'amount': '100.00'}
+        response = self.send('post', 'invoices', [row, row])
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_token_requests_skip_csrf_and_session_requests_need_it(self):
+        row = {'user': self.owner.pk, 'name': 'برج', 'address': 'مسقط', 'property_type': 'apartment'}
+
+        def post(client, **headers):
+            return client.post(self.url('properties'), data=json.dumps([row]), content_type='application/json', headers=headers)
+
+        session = Client(enforce_csrf_checks=True)
+        session.force_login(self.owner)
+        self.assertEqual(post(session).status_code, 403)
+        session.cookies['csrftoken'] = 'a' * 32
+        self.assertEqual(post(session, x_csrftoken='a' * 32).status_code, 201)
+
+        scripted = Client(enforce_csrf_checks=True)
+        with self.settings(RENTALS_API_TOKENS={'secret': 'owner'}):
+            self.assertEqual(post(scripted, authorization='Bearer secret').status_code, 201)
+            self.assertEqual(post(scripted, authorization='Bearer wrong').status_code, 401)
+            response = scripted.get(self.url('properties'), {'fields': 'id'}, headers={'authorization': 'Bearer secret'})
+        self.assertEqual(len(response.json()['results']), 7)
+        self.assertEqual(Property.objects.filter(name='برج').count(), 2)
+
+    def test_derived_status_is_read_only(self):
+        contract = RentalContract.objects.create(
+            unit=self.units[0], tenant=self.tenant, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), monthly_rent=100,
+        )
+        invoice = Invoice.objects.create(contract=contract, due_date=date(2024, 1, 5), amount=100)
+        invoice.refresh_from_db()
+        response = self.send('patch', 'invoices', [{'id': invoice.pk, 'status': 'paid'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [{'index': 0, 'errors': {'status': ['حقل للقراءة فقط أو غير معروف']}}])
+        response = self.send('post', 'invoices', [{'contract': contract.pk, 'due_date': '2024-02-05', 'amount': '100.00', 'status': 'paid'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(Invoice.objects.values_list('status', flat=True)), [invoice.status])
+        self.assertNotEqual(invoice.status, 'paid')
+        # العلاقات خارج حقول النموذج، كمالك العقار، تبقى قابلة للكتابة
+        response = self.send('patch', 'properties', [{'id': self.units[0].pk, 'user': self.owner.pk}])
+        self.assertEqual(response.status_code, 200)
+
+    def test_patch_updates_only_sent_fields(self):
+        unit = self.units[0]
+        response = self.send('patch', 'properties', [{'id': unit.pk, 'name': 'الاسم الجديد'}])
+        self.assertEqual(response.json(), {'updated': [unit.pk]})
+        unit.refresh_from_db()
+        self.assertEqual((unit.name, unit.address), ('الاسم الجديد', 'مسقط'))
+
+    def test_patch_rejects_unknown_duplicate_and_boolean_ids(self):
+        first, second = self.units[:2]
+        response = self.send('patch', 'properties', [
+            {'id': True, 'name': 'أ'},
+            {'id': first.pk, 'name': 'ب'},
+            {'id': first.pk, 'name': 'ج'},
+            {'id': self.foreign_unit.pk, 'name': 'د'},
+            {'id': str(second.pk), 'name': 'هـ'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [0, 2, 3, 4])
+        self.assertFalse(Property.objects.filter(name__in=['أ', 'ب', 'ج', 'د', 'هـ']).exists())
+
+
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create(username='staff', is_staff=True)
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.client.force_login(self.staff)
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(reverse('invoice_list'))
+        self.client.get(reverse('invoice_list'))
+        stats = metrics.registry.snapshot()['invoice_list']
+        self.assertEqual(stats.requests, 2)
+        self.assertGreater(stats.queries, 0)
+        self.assertGreater(stats.template_time, 0)
+        # الواجهات الدالية تعرض بـ render داخلها، ويقيسها المحرك أيضا
+        self.client.get(reverse('profile'))
+        self.assertGreater(metrics.registry.snapshot()['profile'].template_time, 0)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('rentals_request_duration_seconds_count{view="invoice_list"} 2', body)
+        self.assertIn('rentals_request_queries_total{view="invoice_list"} %d' % stats.queries, body)
+
+    def test_metrics_require_staff_or_token(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        with self.settings(RENTALS_METRICS_TOKEN='secret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_slow_requests_are_logged(self):
+        with self.settings(RENTALS_SLOW_REQUEST_MS=0), self.assertLogs('rentals.performance', 'WARNING') as logs:
+            self.client.get(reverse('invoice_list'))
+        self.assertIn('invoice_list', logs.output[0])
+
+
+class DashboardSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        cls.tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        cls.unit = Property.objects.create(user=cls.owner, name='برج', address='مسقط')
+        cls.contract = RentalContract.objects.create(unit=cls.unit, tenant=cls.tenant, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), monthly_rent=100)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_is_reused_until_the_version_changes(self):
+        snapshot = dashboard.get_dashboard_snapshot(self.owner)
+        self.assertEqual((snapshot['total_units'], snapshot['total_tenants'], snapshot['total_invoices']), (1, 1, 0))
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard.get_dashboard_snapshot(self.owner), snapshot)
+        self.assertEqual(async_to_sync(dashboard.aget_dashboard_snapshot)(self.owner), snapshot)
+        # لقطة المشرف منفصلة عن لقطة المالك ومبنية على الإصدار نفسه
+        admin_snapshot = dashboard.get_dashboard_snapshot(User.objects.create(username='admin', is_superuser=True))
+        self.assertEqual(admin_snapshot['version'], snapshot['version'])
+        self.assertEqual(admin_snapshot['total_tenants'], 1)
+
+    def test_saves_and_deletes_bump_the_version(self):
+        invoice = Invoice(contract=self.contract, due_date=date(2024, 1, 31), amount=100)
+        other_unit = Property(user=self.owner, name='فيلا', address='صحار')
+        tenant = Tenant(user=User.objects.create(username='second'), tenant_type='individual')
+        for label, change in (
+            ('property save', other_unit.save),
+            ('property delete', other_unit.delete),
+            ('tenant save', tenant.save),
+            ('tenant delete', tenant.delete),
+            ('invoice save', invoice.save),
+            ('invoice delete', invoice.delete),
+        ):
+            with self.subTest(label):
+                before = dashboard.get_dashboard_snapshot(self.owner)
+                change()
+                self.assertNotEqual(get_version('dashboard'), before['version'])
+
+        version = get_version('dashboard')
+        MaintenanceRequest.objects.create(unit=self.unit, title='تسريب', description='تسريب مياه')
+        self.assertEqual(get_version('dashboard'), version)
+
+    def test_snapshot_reflects_the_change(self):
+        self.assertEqual(dashboard.get_dashboard_snapshot(self.owner)['total_invoices'], 0)
+        Invoice.objects.create(contract=self.contract, due_date=date(2024, 1, 31), amount=100)
+        self.assertEqual(dashboard.get_dashboard_snapshot(self.owner)['total_invoices'], 1)
+
+    def test_contracts_refresh_the_owners_tenant_count(self):
+        self.assertEqual(dashboard.get_dashboard_snapshot(self.owner)['total_tenants'], 1)
+        second = Tenant.objects.create(user=User.objects.create(username='second'), tenant_type='individual')
+        contract = RentalContract.objects.create(unit=self.unit, tenant=second, start_date=date(2025, 1, 1), end_date=date(2025, 12, 31), monthly_rent=100)
+        self.assertEqual(dashboard.get_dashboard_snapshot(self.owner)['total_tenants'], 2)
+        contract.delete()
+        self.assertEqual(dashboard.get_dashboard_snapshot(self.owner)['total_tenants'], 1)
+
+        self.client.force_login(self.owner)
+        row = {'unit': self.unit.pk, 'tenant': second.pk, 'start_date': '2025-01-01', 'end_date': '2025-12-31', 'monthly_rent': '100.00'}
+        response = self.client.post(reverse('api_resource', args=['contracts']), data=json.dumps([row]), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(dashboard.get_dashboard_snapshot(self.owner)['total_tenants'], 2)
+
+
+class RevenueSeriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        cls.tenants = [Tenant.objects.create(user=User.objects.create(username='tenant%d' % i), tenant_type='individual') for i in range(2)]
+        cls.units = [Property.objects.create(user=cls.owner, name='عقار %d' % i, address='مسقط') for i in range(2)]
+        other = Property.objects.create(user=User.objects.create(username='other'), name='عقار آخر', address='صحار')
+        contracts = [
+            RentalContract.objects.create(unit=unit, tenant=tenant, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), monthly_rent=100)
+            for unit, tenant in ((cls.units[0], cls.tenants[0]), (cls.units[1], cls.tenants[1]), (other, cls.tenants[0]))
+        ]
+        for contract, day, amount in (
+            (contracts[0], date(2024, 1, 10), 100), (contracts[1], date(2024, 1, 20), 50),
+            (contracts[0], date(2024, 3, 10), 100), (contracts[1], date(2024, 5, 10), 70),
+            (contracts[2], date(2024, 1, 10), 999),
+        ):
+            invoice = Invoice.objects.create(contract=contract, due_date=day, amount=amount)
+            Invoice.objects.filter(pk=invoice.pk).update(invoice_date=day)
+
+    def totals(self, **filters):
+        return [(row['period'], Decimal(row['total'])) for row in reports.revenue_series(user=self.owner, **filters)]
+
+    def test_month_and_quarter_grouping(self):
+        self.assertEqual(self.totals(), [(date(2024, 1, 1), 150), (date(2024, 3, 1), 100), (date(2024, 5, 1), 70)])
+        self.assertEqual(self.totals(period='quarter'), [(date(2024, 1, 1), 250), (date(2024, 4, 1), 70)])
+        self.assertEqual(reports.revenue_series()[0]['total'], 1149)
+
+    def test_filters(self):
+        self.assertEqual(self.totals(start_date=date(2024, 2, 1), end_date=date(2024, 4, 30)), [(date(2024, 3, 1), 100)])
+        self.assertEqual(self.totals(unit=self.units[1]), [(date(2024, 1, 1), 50), (date(2024, 5, 1), 70)])
+        self.assertEqual(self.totals(tenant=self.tenants[0], period='quarter'), [(date(2024, 1, 1), 200)])
+
+    def test_endpoint(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('revenue_series'), {'period': 'quarter', 'unit': self.units[0].pk})
+        self.assertEqual(response.json()['period'], 'quarter')
+        self.assertEqual([(row['period'], Decimal(row['total'])) for row in response.json()['buckets']], [('2024-01-01', 200)])
+        response = self.client.get(reverse('revenue_series'), {'period': 'week'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('period', response.json()['errors'])
+
+    def test_filter_choices_are_scoped_to_the_owner(self):
+        other = Property.objects.get(name='عقار آخر')
+        outsider = Tenant.objects.create(user=User.objects.create(username='outsider'), tenant_type='individual')
+        RentalContract.objects.create(unit=other, tenant=outsider, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), monthly_rent=100)
+        self.client.force_login(self.owner)
+        form = self.client.get(reverse('generate_reports')).context['filter_form']
+        self.assertEqual(set(form.fields['unit'].queryset), set(self.units))
+        self.assertEqual(set(form.fields['tenant'].queryset), set(self.tenants))
+        for params in ({'unit': other.pk}, {'tenant': outsider.pk}):
+            response = self.client.get(reverse('revenue_series'), params)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(list(response.json()['errors']), list(params))
+
+
+class ReportChartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        unit = Property.objects.create(user=cls.owner, name='برج', address='مسقط')
+        contract = RentalContract.objects.create(unit=unit, tenant=tenant, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), monthly_rent=100)
+        cls.invoices = []
+        for day, amount in ((date(2024, 1, 5), 100), (date(2024, 2, 5), 150), (date(2024, 4, 5), 200)):
+            invoice = Invoice.objects.create(contract=contract, due_date=day, amount=amount)
+            # invoice_date يُملأ تلقائيا بتاريخ اليوم
+            Invoice.objects.filter(pk=invoice.pk).update(invoice_date=day)
+            cls.invoices.append(invoice)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_chart_titles_follow_the_period(self):
+        monthly = reports.revenue_chart({'period': 'month', 'user': self.owner})
+        self.assertEqual(monthly['data'][0]['x'], ['2024-01', '2024-02', '2024-04'])
+        self.assertEqual(monthly['data'][0]['y'], [100.0, 150.0, 200.0])
+        self.assertEqual((monthly['layout']['title']['text'], monthly['layout']['xaxis']['title']['text']), ('الإيرادات الشهرية', 'الشهر'))
+        quarterly = reports.revenue_chart({'period': 'quarter', 'user': self.owner})
+        self.assertEqual((quarterly['data'][0]['x'], quarterly['data'][0]['y']), (['2024-Q1', '2024-Q2'], [250.0, 200.0]))
+        self.assertEqual(quarterly['layout']['title']['text'], 'الإيرادات الربعية')
+        self.assertIsNone(reports.revenue_chart({'period': 'month', 'user': User.objects.create(username='empty')}))
+
+    def test_specs_are_cached_until_the_data_changes(self):
+        filters = {'period': 'month'}
+        context = reports.build_report_context(filters, self.owner)
+        with self.assertNumQueries(0):
+            self.assertEqual(reports.build_report_context(filters, self.owner), context)
+        self.assertEqual(async_to_sync(reports.abuild_report_context)(filters, self.owner)['revenue_chart'], context['revenue_chart'])
+
+        invoice = Invoice.objects.get(pk=self.invoices[0].pk)
+        invoice.amount = 120
+        invoice.save()
+        self.assertEqual(reports.build_report_context(filters, self.owner)['revenue_chart']['data'][0]['y'][0], 120.0)
+
+    def test_versions_and_specs_expire(self):
+        with self.settings(RENTALS_CACHE_TIMEOUT=60), \
+                mock.patch.object(cache, 'set', wraps=cache.set) as cache_set, \
+                mock.patch.object(cache, 'add', wraps=cache.add) as cache_add, \
+                mock.patch.object(cache, 'touch', wraps=cache.touch) as cache_touch:
+            reports.build_report_context({'period': 'month'}, self.owner)
+            bump_version('reports')
+        self.assertTrue(cache_set.call_args_list and cache_add.call_args_list)
+        self.assertEqual({call.kwargs['timeout'] for call in cache_set.call_args_list + cache_add.call_args_list}, {60})
+        cache_touch.assert_called_once_with(VERSION_KEY % 'reports', 60)
+
+
+class CachedListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        cls.owner = User.objects.create(username='owner')
+        tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        cls.units = [Property.objects.create(user=cls.owner, name='عقار %d' % i, address='مسقط') for i in range(3)]
+        for unit in cls.units:
+            RentalContract.objects.create(unit=unit, tenant=tenant, start_date=today, end_date=today + timedelta(days=365), monthly_rent=100)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def test_unchanged_page_is_served_without_data_queries(self):
+        first = self.client.get(reverse('property_list'))
+        self.assertIn('ETag', first)
+        # الجلسة والمستخدم فقط
+        with self.assertNumQueries(2):
+            again = self.client.get(reverse('property_list'))
+        self.assertEqual(again.content, first.content)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('property_list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_saving_invalidates_the_row_and_its_dependents(self):
+        first = self.client.get(reverse('property_list'))
+        self.client.get(reverse('rentalcontract_list'))
+        changed, untouched = self.units[0], self.units[1]
+        changed.name = 'برج جديد'
+        changed.save()
+
+        self.assertIsNone(cache.get(caching.row_keys('property_row', [changed.pk])[0]))
+        self.assertIsNotNone(cache.get(caching.row_keys('property_row', [untouched.pk])[0]))
+        response = self.client.get(reverse('property_list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'برج جديد')
+        self.assertContains(self.client.get(reverse('rentalcontract_list')), 'برج جديد')
+
+    def test_bulk_updates_invalidate_all_rows(self):
+        self.client.get(reverse('property_list'))
+        Property.objects.update(status='maintenance')
+        caching.invalidate_all(Property)
+        self.assertContains(self.client.get(reverse('property_list')), 'تحت الصيانة', count=3)
+
+
+class ConcurrentAggregateTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        today = date.today()
+        self.owner = User.objects.create(username='owner')
+        tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        for i, status in enumerate(('available', 'rented', 'rented')):
+            unit = Property.objects.create(user=self.owner, name='عقار %d' % i, address='مسقط', status=status)
+            contract = RentalContract.objects.create(unit=unit, tenant=tenant, start_date=today, end_date=today + timedelta(days=365), monthly_rent=100)
+            invoice = Invoice.objects.create(contract=contract, invoice_date=today, due_date=today, amount=100, status='pending')
+            Payment.objects.create(invoice=invoice, amount_paid=100, payment_method='cash')
+
+    def test_concurrent_results_match_sequential(self):
+        self.assertEqual(async_to_sync(dashboard.acompute_metrics)(self.owner), dashboard.compute_metrics(self.owner))
+        self.assertEqual(async_to_sync(reports.areport_summary)(self.owner), reports.report_summary(self.owner))
+        filters = {'user': self.owner}
+        self.assertEqual(async_to_sync(reports.arevenue_chart)(filters), reports.revenue_chart(filters))
+
+    def test_open_transaction_is_visible(self):
+        # الاتصالات المنفصلة لا ترى ما لم يُثبت، فتعمل الاستعلامات على اتصال الطلب
+        with transaction.atomic():
+            Property.objects.create(user=self.owner, name='جديد', address='صحار')
+            metrics = async_to_sync(dashboard.acompute_metrics)(self.owner)
+        self.assertEqual(metrics['total_units'], 4)
+
+    def test_async_views_render(self):
+        metrics.registry.reset()
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['rented_units'], 2)
+        # استعلامات خيوط التجميع تُحسب على الطلب: الجلسة والمستخدم ثم المؤشرات الثلاثة
+        self.assertEqual(metrics.registry.snapshot()['dashboard'].queries, 5)
+        response = self.client.get(reverse('generate_reports'))
+        self.assertEqual(response.context['total_revenue'], 300)
+        self.assertEqual(response.context['revenue_chart']['data'][0]['y'], [300.0])
+        self.assertEqual(self.client.get(reverse('revenue_series'), {'period': 'quarter'}).status_code, 200)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        tenant = Tenant.objects.create(user=User.objects.create(username='@tenant'), tenant_type='individual')
+        for name in ('=HYPERLINK("http://x")', 'برج النخيل'):
+            unit = Property.objects.create(user=cls.owner, name=name, address='مسقط', property_type='apartment')
+            RentalContract.objects.create(unit=unit, tenant=tenant, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), monthly_rent=-5)
+        other = Property.objects.create(user=User.objects.create(username='other'), name='عقار آخر', address='صحار')
+        RentalContract.objects.create(unit=other, tenant=tenant, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), monthly_rent=100)
+
+    def test_csv_escapes_formulas_and_keeps_numbers(self):
+        content = ''.join(exports.stream('contracts', 'csv', user=self.owner))
+        self.assertTrue(content.startswith('\ufeff'))
+        header, *rows = csv.reader(io.StringIO(content.lstrip('\ufeff')))
+        self.assertEqual(header, exports.header('contracts'))
+        self.assertEqual([(row[1], row[2], row[6], row[7]) for row in rows], [
+            ("'=HYPERLINK(\"http://x\")", "'@tenant", '-5.00', 'False'),
+            ('برج النخيل', "'@tenant", '-5.00', 'False'),
+        ])
+
+    def test_xlsx_writes_text_as_inline_strings(self):
+        content = b''.join(exports.stream('contracts', 'xlsx', user=self.owner))
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row '), 3)
+        self.assertNotIn('<f>', sheet)
+        self.assertIn('<c r="B2" t="inlineStr"><is><t>=HYPERLINK("http://x")</t></is></c>', sheet)
+        self.assertIn('<c r="G2"><v>-5.00</v></c>', sheet)
+        self.assertIn('<c r="H2" t="inlineStr"><is><t>لا</t></is></c>', sheet)
+
+    def test_export_view_streams_owner_rows(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('export', args=['contracts', 'csv']), {'start_date': '2024-01-01'})
+        self.assertEqual(response['Content-Type'], exports.FORMATS['csv'])
+        self.assertEqual(b''.join(response.streaming_content).decode().count('\n'), 3)
+        self.assertEqual(self.client.get(reverse('export', args=['contracts', 'csv']), {'start_date': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export', args=['owners', 'csv'])).status_code, 404)
+
+
+class StubRenderer:
+    # بديل مجمع العمليات: render_pdf يُرجع نص الفاتورة نفسه، والفواتير في hang لا تنتهي أبدا
+    def __init__(self, hang=()):
+        self.hang = hang
+        self.futures = []
+
+    def submit(self, function, html):
+        future = Future()
+        if not any(marker in html for marker in self.hang):
+            future.set_result(b'%PDF ' + html.encode())
+        self.futures.append(future)
+        return future
+
+
+class CsvImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        cls.other = User.objects.create(username='other')
+        cls.tenant = Tenant.objects.create(user=User.objects.create(username='salim'), tenant_type='individual')
+        for name in ('برج', 'فيلا', 'فيلا'):
+            Property.objects.create(user=cls.owner, name=name, address='مسقط', property_type='apartment')
+        Property.objects.create(user=cls.other, name='مجمع', address='صحار', property_type='apartment')
+
+    def run_import(self, name, text, **kwargs):
+        return imports.import_rows(name, io.StringIO(text), user=self.owner, **kwargs)
+
+    def test_invalid_rows_are_reported_by_line_and_the_rest_created(self):
+        result = self.run_import('contracts', (
+            'unit,tenant,start_date,end_date,monthly_rent\n'
+            'برج,salim,not-a-date,2024-12-31,100\n'
+            '\n'
+            'برج,salim,2025-01-01,2025-12-31,-\n'
+            'برج,salim,2024-01-01,2024-12-31,100\n'
+        ))
+        # حقول النموذج مشتركة بين الصفوف، فالصف الصحيح بعد المرفوض لا يرث أخطاءه
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([(line, sorted(errors)) for line, errors in result['errors']], [(2, ['start_date']), (4, ['monthly_rent'])])
+        self.assertEqual(RentalContract.objects.get().monthly_rent, 100)
+
+    def test_relations_must_be_unique_and_owned(self):
+        result = self.run_import('contracts', (
+            'الوحدة,المستأجر,تاريخ البدء,تاريخ النهاية,الايجار الشهري\n'
+            'فيلا,salim,2024-01-01,2024-12-31,100\n'
+            'مجمع,salim,2024-01-01,2024-12-31,100\n'
+            'برج,,2024-01-01,2024-12-31,100\n'
+        ))
+        self.assertEqual(result['created'], 0)
+        self.assertEqual([errors for line, errors in result['errors']], [
+            {'unit': ['أكثر من سجل بالقيمة "فيلا".']},
+            {'unit': ['لا يوجد سجل بالقيمة "مجمع".']},
+            {'tenant': ['هذا الحقل مطلوب.']},
+        ])
+
+    def test_defaults_fill_empty_relations(self):
+        result = imports.import_rows(
+            'properties', io.StringIO('name,address,property_type,status,user\nبيت,نزوى,apartment,available,\nشقة,صور,apartment,available,other\n'),
+            defaults={'user': 'owner'},
+        )
+        self.assertEqual(result, {'created': 2, 'errors': []})
+        self.assertEqual(dict(Property.objects.filter(name__in=['بيت', 'شقة']).values_list('name', 'user__username')), {'بيت': 'owner', 'شقة': 'other'})
+        # مع user لا يُربط إلا بحسابه هو
+        result = self.run_import('properties', 'name,address,property_type,status,user\nدكان,صور,apartment,available,other\n')
+        self.assertEqual(result['errors'], [(2, {'user': ['لا يوجد سجل بالقيمة "other".']})])
+
+    def test_dry_run_validates_without_saving(self):
+        version = get_version('dashboard')
+        result = self.run_import('contracts', 'unit,tenant,start_date,end_date,monthly_rent\nبرج,salim,2024-01-01,2024-12-31,100\n', dry_run=True)
+        self.assertEqual(result, {'created': 1, 'errors': []})
+        self.assertFalse(RentalContract.objects.exists())
+        self.assertEqual(get_version('dashboard'), version)
+
+    def test_header_problems_are_rejected(self):
+        with self.assertRaisesMessage(ValueError, 'الملف فارغ'):
+            self.run_import('contracts', '')
+        with self.assertRaisesMessage(ValueError, 'monthly_rent'):
+            self.run_import('contracts', 'unit,tenant,start_date,end_date\n')
+
+
+class InvoicePdfTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+        tenant = Tenant.objects.create(user=User.objects.create(username='tenant'), tenant_type='individual')
+        unit = Property.objects.create(user=cls.owner, name='برج', address='مسقط')
+        contract = RentalContract.objects.create(unit=unit, tenant=tenant, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), monthly_rent=100)
+        cls.invoices = [Invoice.objects.create(contract=contract, due_date=date(2024, 3, day), amount=100 + day) for day in (1, 2)]
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.enterContext(self.settings(INVOICE_PDF_CACHE_DIR=cache_dir.name, INVOICE_PDF_TIMEOUT=0.01))
+        self.client.force_login(self.owner)
+
+    def stub(self, *hang):
+        renderer = StubRenderer(hang)
+        self.enterContext(mock.patch('rentals.pdf.get_executor', return_value=renderer))
+        return renderer
+
+    def test_invoice_pdf_is_rendered_once_and_cached(self):
+        renderer = self.stub()
+        url = reverse('generate_invoice_pdf', args=[self.invoices[0].pk])
+        first = b''.join(self.client.get(url).streaming_content)
+        self.assertTrue(first.startswith(b'%PDF'))
+        self.assertEqual(b''.join(self.client.get(url).streaming_content), first)
+        self.assertEqual(len(renderer.futures), 1)
+
+    def test_render_timeout_cancels_and_returns_504(self):
+        renderer = self.stub('102')
+        response = self.client.get(reverse('generate_invoice_pdf', args=[self.invoices[1].pk]))
+        self.assertEqual((response.status_code, response['Retry-After']), (504, '30'))
+        self.assertTrue(renderer.futures[0].cancelled())
+
+        renderer = self.stub('101')
+        self.assertEqual(self.client.get(reverse('invoice_pdf_batch'), {'period': '2024-03'}).status_code, 504)
+        self.assertTrue(all(future.cancelled() or future.done() for future in renderer.futures))
+
+    def test_batch_zips_the_month(self):
+        self.stub()
+        response = self.client.get(reverse('invoice_pdf_batch'), {'period': '2024-03'})
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), ['invoice-%d.pdf' % invoice.pk for invoice in self.invoices])
+
+    def test_malformed_period_is_a_bad_request(self):
+        response = self.client.get(reverse('invoice_pdf_batch'), {'period': '2024-13'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('period', response.json()['errors'])
+
+
+def _broken_task(job):
+    raise RuntimeError('تعذر الاتصال')
+
+
+class JobQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner')
+
+    def setUp(self):
+        files_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(files_dir.cleanup)
+        self.enterContext(self.settings(RENTALS_JOB_FILES_DIR=files_dir.name))
+        self.enterContext(mock.patch.dict(jobs.TASKS, {'broken': jobs.Task(_broken_task, 2)}))
+
+    def test_claim_is_exclusive(self):
+        job = jobs.enqueue('sweep_statuses')
+        self.assertEqual(jobs.claim('first', 5), [job.pk])
+        self.assertEqual(jobs.claim('second', 5), [])
+
+    def test_failures_are_retried_with_backoff(self):
+        job = jobs.enqueue('broken')
+        jobs.claim('worker', 1)
+        with self.assertLogs('rentals.jobs', 'WARNING'):
+            jobs.execute(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=9))
+        self.assertEqual(jobs.claim('worker', 1), [])
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        jobs.claim('worker', 1)
+        with self.assertLogs('rentals.jobs', 'WARNING'):
+            jobs.execute(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertEqual(jobs.status(job)['error'], 'RuntimeError: تعذر الاتصال')
+
+    def test_stale_jobs_are_released(self):
+        job = jobs.enqueue('sweep_statuses')
+        jobs.claim('worker', 1)
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(jobs.release_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+
+    def test_background_import_is_polled_by_its_owner(self):
+        self.client.force_login(self.owner)
+        upload = SimpleUploadedFile('properties.csv', 'name,address,property_type,status\nبرج,مسقط,apartment,available\n'.encode())
+        response = self.client.post(reverse('import'), {'name': 'properties', 'file': upload, 'background': 'on'})
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('job_detail', args=[job.pk]))
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.pk])).json()['status'], 'queued')
+
+        jobs.claim('worker', 1)
+        jobs.execute(job.pk)
+        status = self.client.get(reverse('job_status', args=[job.pk])).json()
+        self.assertEqual((status['status'], status['result']['created']), ('succeeded', 1))
+        self.assertTrue(Property.objects.filter(user=self.owner, name='برج').exists())
+        self.assertContains(self.client.get(reverse('job_detail', args=[job.pk])), 'سجلات مستوردة: 1')
+
+        self.client.force_login(User.objects.create(username='other'))
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.pk])).status_code, 404)
+
+
+class JobWorkerTests(TransactionTestCase):
+    def test_worker_drains_the_queue(self):
+        queued = [jobs.enqueue('sweep_statuses'), jobs.enqueue('reconcile_invoices'), jobs.enqueue('rebuild_balances')]
+        # قاعدة SQLite في الذاكرة تقفل الجداول بين الكتّاب المتزامنين، فيكفي خيط واحد هنا
+        self.assertEqual(jobs.work(workers=1, once=True, poll_interval=0.01), 3)
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {'succeeded'})
+        self.assertEqual(Job.objects.get(pk=queued[2].pk).result, {'contracts': 0})
+
+
+class DocumentStorageTests(TestCase):
+    content = b'0123456789abcdef'
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=media.name))
+
+    def upload(self, title):
+        return Document.objects.create(title=title, file=SimpleUploadedFile('عقد.pdf', self.content))
+
+    def test_duplicate_uploads_share_one_counted_file(self):
+        first, second = self.upload('الأول'), self.upload('الثاني')
+        storage = first.file.storage
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(storage.digest(first.file.name), hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(Blob.objects.get().references, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(second.file.name))
+        self.assertEqual(Blob.objects.get().references, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(second.file.name))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_file_retained_again_before_commit_is_kept(self):
+        name = self.upload('مستند').file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            blobs.release(name)
+            blobs.retain(name)
+        self.assertTrue(Document.file.field.storage.exists(name))
+        self.assertEqual(Blob.objects.get(name=name).references, 1)
+
+    def test_download_sends_etag_and_byte_ranges(self):
+        document = self.upload('مستند')
+        url = reverse('document_download', args=[document.pk])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create(username='owner'))
+        response = self.client.get(url)
+        etag = '"%s"' % hashlib.sha256(self.content).hexdigest()
+        self.assertEqual((response.status_code, response['ETag'], response['Accept-Ranges']), (200, etag, 'bytes'))
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        response = self.client.get(url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 2-5/16'))
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        response = self.client.get(url, headers={'Range': 'bytes=-3'})
+        self.assertEqual(b''.join(response.streaming_content), b'def')
+        response = self.client.get(url, headers={'Range': 'bytes=20-'})
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */16'))
+        # If-Range لنسخة أخرى يعيد الملف كاملا
+        response = self.client.get(url, headers={'Range': 'bytes=2-5', 'If-Range': '"قديم"'})
+        self.assertEqual(response.status_code, 200)
+
+
+class SyncExecutor:
+    # بديل مجمع العمليات ينفذ المهمة فورا في العملية نفسها
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=media.name, THUMBNAIL_SIZE=64))
+        self.enterContext(mock.patch('rentals.thumbnails.get_executor', return_value=SyncExecutor()))
+        image = io.BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(image, 'PNG')
+        self.document = Document.objects.create(title='صورة', file=SimpleUploadedFile('صورة.png', image.getvalue()))
+
+    def test_thumbnail_is_generated_once_and_flagged(self):
+        self.assertFalse(self.document.has_thumbnail)
+        version = get_version('documents')
+        self.assertTrue(thumbnails.schedule(self.document.file.name).result())
+        self.assertTrue(self.document.has_thumbnail)
+        self.assertNotEqual(get_version('documents'), version)
+        with Image.open(self.document.file.storage.path(self.document.file.storage.thumbnail_name(self.document.file.name))) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ('JPEG', (64, 32)))
+        # المحتوى المكرر يشارك الصورة نفسها فلا يُرسل للمجمع مرة أخرى
+        self.assertIsNone(thumbnails.schedule(self.document.file.name))
+
+    def test_unsupported_files_have_no_thumbnail(self):
+        text = Document.objects.create(title='نص', file=SimpleUploadedFile('ملاحظات.txt', b'not an image'))
+        self.assertFalse(thumbnails.schedule(text.file.name).result())
+        with mock.patch('rentals.thumbnail_worker.shutil.which', return_value=None):
+            pdf_document = Document.objects.create(title='عقد', file=SimpleUploadedFile('عقد.pdf', b'%PDF-1.4'))
+            self.assertFalse(thumbnails.schedule(pdf_document.file.name).result())
+        self.assertFalse(text.has_thumbnail or pdf_document.has_thumbnail)
+
+    def test_thumbnail_view(self):
+        url = reverse('document_thumbnail', args=[self.document.pk])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create(username='owner'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        thumbnails.schedule(self.document.file.name)
+        response = self.client.get(url)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/jpeg'))
+        self.assertEqual(self.client.get(reverse('document_thumbnail', args=[self.document.pk + 1])).status_code, 404)
@@ -0,0 +1,44 @@
+# تُنفَّذ داخل عمليات منفصلة، لذلك لا تستورد Django حتى تبقى العملية خفيفة
+import os
+import shutil
+import subprocess
+import tempfile
+
+
+def render_thumbnail(source, target, size):
+    """صورة مصغرة JPEG للصورة أو لأول صفحة من ملف PDF؛ تُرجع False للصيغ غير المدعومة"""
+    if os.path.splitext(source)[1].lower() == '.pdf':
+        return _render_pdf_page(source, target, size)
+
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    try:
+        with Image.open(source) as image:
+            # draft يفك ترميز JPEG بدقة مخفضة مباشرة بدلا من الصورة الكاملة
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            _save(image.convert('RGB'), target)
+    except UnidentifiedImageError:
+        return False
+    return True
+
+
+def _render_pdf_page(source, target, size):
+    # Pillow لا يقرأ PDF؛ نستخدم pdftoppm (poppler-utils) إن كان مثبتا
+    pdftoppm = shutil.which('pdftoppm')
+    if not pdftoppm:
+        return False
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(target)) as directory:
+        prefix = os.path.join(directory, 'page')
+        subprocess.run(
+            [pdftoppm, '-f', '1', '-l', '1', '-singlefile', '-jpeg', '-scale-to', str(size), source, prefix],
+            check=True, capture_output=True, timeout=60,
+        )
+        os.replace(prefix + '.jpg', target)
+    return True
+
+
+def _save(image, target):
+    tmp_path = '%s.%d.tmp' % (target, os.getpid())
+    image.save(tmp_path, 'JPEG', quality=80, optimize=True)
+    os.replace(tmp_path, target)
@@ -0,0 +1,53 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .storage import document_storage
+from .thumbnail_worker import render_thumbnail
+from .versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """مجمع عمليات منفصل عن مجمع الفواتير حتى لا تنتظر الصور المصغرة خلف دفعات PDF"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'THUMBNAIL_WORKERS', 1),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def schedule(name):
+    """إرسال توليد الصورة المصغرة للمجمع دون انتظار النتيجة.
+
+    الصورة تُحفظ بجانب الملف المخزن، فالمحتوى المكرر لا تُولد له صورة ثانية.
+    """
+    if not name:
+        return None
+    storage = document_storage()
+    target = storage.thumbnail_name(name)
+    if storage.exists(target):
+        return None
+    future = get_executor().submit(
+        render_thumbnail, storage.path(name), storage.path(target), getattr(settings, 'THUMBNAIL_SIZE', 240),
+    )
+    future.add_done_callback(lambda future: _report(name, future))
+    return future
+
+
+def _report(name, future):
+    if future.exception() is not None:
+        logger.warning('تعذر توليد صورة مصغرة للملف %s: %s', name, future.exception())
+    elif future.result():
+        # الصورة خارج صفوف القائمة المخزنة، لكن الصفحة كاملة مخزنة فيُرفع إصدارها
+        bump_version('documents')
@@ -1,5 +1,6 @@
 from django.urls import path
-from .views import dashboard,PropertyListView,PropertyCreateView,PropertyUpdateView,PropertyDeleteView,TenantListView,TenantCreateView,TenantUpdateView,TenantDeleteView,RentalContractListView,RentalContractCreateView,RentalContractUpdateView,RentalContractDeleteView,InvoiceListView,PaymentCreateView, MaintenanceRequestListView, MaintenanceRequestCreateView, MaintenanceRequestUpdateView, MaintenanceRequestDeleteView, generate_reports, DocumentListView, DocumentCreateView, DocumentUpdateView, DocumentDeleteView, profile_view, change_password_view
+from .api import ResourceView, api_index
+from .views import dashboard,PropertyListView,PropertyCreateView,PropertyUpdateView,PropertyDeleteView,TenantListView,TenantCreateView,TenantUpdateView,TenantDeleteView,RentalContractListView,RentalContractCreateView,RentalContractUpdateView,RentalContractDeleteView,ContractSearchView,InvoiceListView,generate_invoice_pdf,invoice_pdf_batch,export_view,import_view,job_detail,job_status,job_download,PaymentListView,PaymentCreateView,ArrearsListView,payment_allocate, MaintenanceRequestListView, MaintenanceRequestCreateView, MaintenanceRequestUpdateView, MaintenanceRequestDeleteView, generate_reports, revenue_series_view, occupancy_series_view, forecast_view, forecast_series_view, DocumentListView, DocumentCreateView, DocumentUpdateView, DocumentDeleteView, document_download, document_thumbnail, search_view, metrics_view, profile_view, change_password_view
 
 urlpatterns = [
     path('dashboard/', dashboard, name='dashboard'),
@@ -15,18 +16,38 @@ urlpatterns = [
     path('rental-contracts/create/', RentalContractCreateView.as_view(), name='rentalcontract_create'),
     path('rental-contracts/<int:pk>/update/', RentalContractUpdateView.as_view(), name='rentalcontract_update'),
     path('rental-contracts/<int:pk>/delete/', RentalContractDeleteView.as_view(), name='rentalcontract_delete'),
+    path('rental-contracts/search/', ContractSearchView.as_view(), name='contract_search'),
     path('invoices/', InvoiceListView.as_view(), name='invoice_list'),
+    path('payments/', PaymentListView.as_view(), name='payment_list'),
     path('payments/create/', PaymentCreateView.as_view(), name='payment_create'),
+    path('payments/allocate/', payment_allocate, name='payment_allocate'),
+    path('payments/arrears/', ArrearsListView.as_view(), name='arrears_list'),
     path('maintenance-requests/', MaintenanceRequestListView.as_view(), name='maintenance_request_list'),
     path('maintenance-requests/create/', MaintenanceRequestCreateView.as_view(), name='maintenance_request_create'),
     path('maintenance-requests/<int:pk>/update/', MaintenanceRequestUpdateView.as_view(), name='maintenance_request_update'),
     path('maintenance-requests/<int:pk>/delete/', MaintenanceRequestDeleteView.as_view(), name='maintenance_request_delete'),
     path('reports/', generate_reports, name='generate_reports'),
+    path('reports/revenue/', revenue_series_view, name='revenue_series'),
+    path('reports/occupancy/', occupancy_series_view, name='occupancy_series'),
+    path('reports/forecast/', forecast_view, name='forecast'),
+    path('reports/forecast/series/', forecast_series_view, name='forecast_series'),
     path('documents/', DocumentListView.as_view(), name='document_list'),
     path('documents/create/', DocumentCreateView.as_view(), name='document_create'),
     path('documents/<int:pk>/update/', DocumentUpdateView.as_view(), name='document_update'),
     path('documents/<int:pk>/delete/', DocumentDeleteView.as_view(), name='document_delete'),
+    path('documents/<int:pk>/download/', document_download, name='document_download'),
+    path('documents/<int:pk>/thumbnail/', document_thumbnail, name='document_thumbnail'),
+    path('search/', search_view, name='search'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('api/v1/', api_index, name='api_index'),
+    path('api/v1/<slug:resource>/', ResourceView.as_view(), name='api_resource'),
     path('profile/', profile_view, name='profile'),
     path('profile/change-password/', change_password_view, name='change_password'),
-    #path('invoices/pdf/<int:pk>/', generate_invoice_pdf, name='generate_invoice_pdf'),
+    path('invoices/pdf/<int:pk>/', generate_invoice_pdf, name='generate_invoice_pdf'),
+    path('invoices/pdf/batch/', invoice_pdf_batch, name='invoice_pdf_batch'),
+    path('exports/<slug:name>.<slug:fmt>', export_view, name='export'),
+    path('imports/', import_view, name='import'),
+    path('jobs/<int:pk>/', job_detail, name='job_detail'),
+    path('jobs/<int:pk>/status/', job_status, name='job_status'),
+    path('jobs/<int:pk>/download/', job_download, name='job_download'),
 ]
\ No newline at end of file
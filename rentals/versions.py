@@ -0,0 +1,88 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# أرقام إصدار للبيانات المخزنة في الكاش؛ رفع الإصدار يبطل كل ما خُزّن تحته
+VERSION_KEY = 'rentals:version:%s'
+CACHED_KEY = 'rentals:cached:%s:%s:%s'
+_MISSING = object()
+
+
+def cache_timeout():
+    # القيم المبنية على إصدار قديم لا يطلبها أحد بعد رفعه، فتنتهي بدل أن تبقى في الكاش للأبد؛
+    # وانتهاء مفتاح الإصدار نفسه آمن لأن الإصدار الجديد قيمة زمنية لم تُستخدم
+    return getattr(settings, 'RENTALS_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def _new_version():
+    # نبدأ من قيمة زمنية حتى لا تعود بيانات قديمة إذا حُذف مفتاح الإصدار من الكاش
+    return time.time_ns()
+
+
+def get_version(name):
+    key = VERSION_KEY % name
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=cache_timeout())
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(name):
+    key = VERSION_KEY % name
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _new_version(), timeout=cache_timeout())
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(*names):
+    for name in names:
+        key = VERSION_KEY % name
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=cache_timeout())
+        else:
+            # incr في بعض الخلفيات يعيد الحفظ بالمدة الافتراضية، فتُضبط المدة بعده
+            cache.touch(key, cache_timeout())
+
+
+def _params_digest(params):
+    # النماذج تُمثَّل بالمفتاح الأساسي حتى يبقى المفتاح ثابتا بين الطلبات
+    parts = sorted('%s=%s' % (name, getattr(value, 'pk', value)) for name, value in params.items())
+    return hashlib.md5('&'.join(parts).encode()).hexdigest()
+
+
+def versioned_key(name, version_names, params):
+    """مفتاح يتغير مع إصدار أي من البيانات التي بُنيت منها القيمة"""
+    versions = '.'.join(str(get_version(version_name)) for version_name in version_names)
+    return CACHED_KEY % (name, versions, _params_digest(params))
+
+
+async def aversioned_key(name, version_names, params):
+    versions = '.'.join([str(await aget_version(version_name)) for version_name in version_names])
+    return CACHED_KEY % (name, versions, _params_digest(params))
+
+
+def cached(name, version_name, params, build):
+    """إرجاع النتيجة من الكاش ما دام إصدار البيانات لم يتغير، وإلا إعادة حسابها"""
+    key = versioned_key(name, (version_name,), params)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = build()
+        cache.set(key, value, timeout=cache_timeout())
+    return value
+
+
+async def acached(name, version_name, params, build):
+    """مثل cached لكن build دالة غير متزامنة، فلا يُحجب حلقة الأحداث أثناء الحساب"""
+    key = await aversioned_key(name, (version_name,), params)
+    value = await cache.aget(key, _MISSING)
+    if value is _MISSING:
+        value = await build()
+        await cache.aset(key, value, timeout=cache_timeout())
+    return value
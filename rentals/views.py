@@ -1,16 +1,24 @@
-from django.shortcuts import render, get_object_or_404, redirct
-from django.db.models import Count, Sum
-from .models import Property, Invoice, Tenant, RentalContract, Payment, MaintenanceRequest, Document
-from django.urls import reverse_lazy
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView
-from .forms import PropertyForm, TenantForm, RentalContractForm, PaymentForm, MaintenanceRequestForm, DocumentForm, ProfileUpdateForm, CustomPasswordChangeForm
-import pandas as pd
-import plotly.express as px
-from plotly.offline import plot
+import io
+import os
+from itertools import chain
+
+from asgiref.sync import sync_to_async
+
+from django.shortcuts import render, get_object_or_404, redirect
+from .models import Property, Invoice, Tenant, RentalContract, Payment, MaintenanceRequest, Document, Balance, Job
+from django.urls import reverse, reverse_lazy
+from django.views.generic import CreateView, UpdateView, DeleteView
+from . import downloads, exports, fulltext, imports, jobs, metrics, occupancy, pdf, reconciliation, reports, streaming
+from .billing import parse_period
+from .dashboard import aget_dashboard_snapshot
+from .search import search_contracts
+from .mixins import CachedListMixin, OwnerScopedMixin, RelatedListView, KeysetListView
+from .forms import PropertyForm, TenantForm, RentalContractForm, PaymentForm, MaintenanceRequestForm, DocumentForm, PaymentAllocationForm, ProfileUpdateForm, CustomPasswordChangeForm, RevenueFilterForm, ForecastForm, ContractSearchForm, ExportFilterForm, ImportForm
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth import update_session_auth_hash
-#from django.http import HttpResponse
-#from weasyprint import HTML
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 
 # عرض وتحديث الملف الشخصي
 @login_required
@@ -19,7 +27,7 @@ def profile_view(request):
         profile_form = ProfileUpdateForm(request.POST, instance=request.user)
         if profile_form.is_valid():
             profile_form.save()
-            return redirct('profile')
+            return redirect('profile')
     else:
         profile_form = ProfileUpdateForm(instance=request.user)
     context = {'profile_form': profile_form}
@@ -33,231 +41,435 @@ def change_password_view(request):
         if form.is_valid():
             form.save()
             update_session_auth_hash(request, form.user)
-            return redirct('profile')
+            return redirect('profile')
     else:
         form = CustomPasswordChangeForm(user=request.user)
     context = {'form': form}
     return render(request, 'users/change_password.html', context)
 
-def dashboard(request):
-  # ملخص شامل للعقارات
-    total_units = Property.objects.count()
-    available_units = Property.objects.filter(status='available').count()
-    rented_units = Property.objects.filter(status='rented').count()
-  # ملخص شامل للمستأجرون
-    total_tenants = Tenant.objects.count()
-  # الايجارات المستحقة
-    total_invoices = Invoice.objects.count()
-    overdue_invoices = Invoice.objects.filter(status='overdue').count()
-    total_income = Invoice.objects.filter(status= 'paid').aggregate(total=Sum('amount'))['total'] or 0
-    # chart.js البيانات لتكامل الرسوم البيانية مع
-    unit_data = {
-      'labels': ['متوفر', 'مؤجرة', 'تحت الصيانة'],
-      'data': [
-        Property.objects.filter(status='available').count(),
-        Property.objects.filter(status='rented').count(),
-        Property.objects.filter(status='maintenance').count(),
-      ]
-    }
-
-    overdue_data = {
-      'labels': ['متأخرة', 'مدفوعة', 'معلق'],
-      'data': [
-        Invoice.objects.filter(status='overdue').count(),
-        Invoice.objects.filter(status='paid').count(),
-        Invoice.objects.filter(status='pending').count(),
-      ]
-    }
-
-    context = {
-        'total_units': total_units,
-        'available_units': available_units,
-        'rented_units': rented_units,
-        'total_tenants': total_tenants,
-        'total_invoices': total_invoices,
-        'overdue_invoices': overdue_invoices,
-        'total_income': total_income,
-        'unit_data': unit_data,
-        'overdue_data': overdue_data,
-    }
-    return render(request, 'dashboard.html', context)
+@login_required
+async def dashboard(request):
+    # المؤشرات تأتي من لقطة مخزنة تُبطل عند حفظ أو حذف العقارات والمستأجرين والفواتير،
+    # وعند حسابها تعمل استعلاماتها المستقلة معا
+    context = await aget_dashboard_snapshot(await request.auser())
+    return await sync_to_async(render)(request, 'dashboard.html', context)
 
 # عرض قائمة العقارات
-class PropertyListView(ListView):
+class PropertyListView(CachedListMixin, OwnerScopedMixin, RelatedListView):
     model = Property
     template_name = 'properties/property_list.html'
     context_object_name = 'properties'
+    ordering = ['-id']
 
 # إضافة عقار جديد
-class PropertyCreateView(CreateView):
+class PropertyCreateView(LoginRequiredMixin, CreateView):
     model = Property
     form_class = PropertyForm
     template_name = 'properties/property_form.html'
     success_url = reverse_lazy('property_list')
 
+    def form_valid(self, form):
+        form.instance.user = self.request.user
+        return super().form_valid(form)
+
 # تعديل عقار
-class PropertyUpdateView(UpdateView):
+class PropertyUpdateView(OwnerScopedMixin, UpdateView):
     model = Property
     form_class = PropertyForm
     template_name = 'properties/property_form.html'
     success_url = reverse_lazy('property_list')
 
 # حذف عقار
-class PropertyDeleteView(DeleteView):
+class PropertyDeleteView(OwnerScopedMixin, DeleteView):
     model = Property
     template_name = 'properties/property_confirm_delete.html'
     success_url = reverse_lazy('property_list')
 
 # عرض قائمة المستأجرين
-class TenantListView(ListView):
+class TenantListView(CachedListMixin, LoginRequiredMixin, RelatedListView):
     model = Tenant
     template_name = 'tenants/tenant_list.html'
     context_object_name = 'tenants'
+    ordering = ['-id']
+    list_select_related = ('user',)
 
 # إضافة مستأجر جديد
-class TenantCreateView(CreateView):
+class TenantCreateView(LoginRequiredMixin, CreateView):
     model = Tenant
     form_class = TenantForm
     template_name = 'tenants/tenant_form.html'
     success_url = reverse_lazy('tenant_list')
 
 # تعديل مستأجر
-class TenantUpdateView(UpdateView):
+class TenantUpdateView(LoginRequiredMixin, UpdateView):
     model = Tenant
     form_class = TenantForm
     template_name = 'tenants/tenant_form.html'
     success_url = reverse_lazy('tenant_list')
 
 # حذف مستأجر
-class TenantDeleteView(DeleteView):
+class TenantDeleteView(LoginRequiredMixin, DeleteView):
     model = Tenant
     template_name = 'tenants/tenant_confirm_delete.html'
     success_url = reverse_lazy('tenant_list')
 
 # عرض قائمة العقود
-class RentalContractListView(ListView):
+class RentalContractListView(CachedListMixin, OwnerScopedMixin, RelatedListView):
     model = RentalContract
     template_name = 'contracts/rentalcontract_list.html'
     context_object_name = 'contracts'
+    ordering = ['-start_date', '-id']
+    list_select_related = ('unit', 'tenant__user')
+
+# البحث في العقود عبر فهرس الكلمات المطبّعة
+class ContractSearchView(OwnerScopedMixin, RelatedListView):
+    model = RentalContract
+    template_name = 'search/contract_search.html'
+    context_object_name = 'contracts'
+    ordering = ['-start_date', '-id']
+    list_select_related = ('unit', 'tenant__user')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        self.form = ContractSearchForm(self.request.GET or None)
+        if not self.form.is_valid():
+            return queryset.none()
+        filters = {name: value for name, value in self.form.cleaned_data.items() if value}
+        if not filters:
+            return queryset.none()
+        return search_contracts(queryset, **filters)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['form'] = self.form
+        return context
 
 # إضافة عقد إيجار جديد
-class RentalContractCreateView(CreateView):
+class RentalContractCreateView(OwnerScopedMixin, CreateView):
     model = RentalContract
     form_class = RentalContractForm
+    owner_choice_fields = ('unit',)
     template_name = 'contracts/rentalcontract_form.html'
     success_url = reverse_lazy('rentalcontract_list')
 
 # تعديل عقد إيجار
-class RentalContractUpdateView(UpdateView):
+class RentalContractUpdateView(OwnerScopedMixin, UpdateView):
     model = RentalContract
     form_class = RentalContractForm
+    owner_choice_fields = ('unit',)
     template_name = 'contracts/rentalcontract_form.html'
     success_url = reverse_lazy('rentalcontract_list')
 
 # حذف عقد إيجار
-class RentalContractDeleteView(DeleteView):
+class RentalContractDeleteView(OwnerScopedMixin, DeleteView):
     model = RentalContract
     template_name = 'contracts/rentalcontract_confirm_delete.html'
     success_url = reverse_lazy('rentalcontract_list')
 
 # عرض قائمة الفواتير
-class InvoiceListView(ListView):
+class InvoiceListView(OwnerScopedMixin, KeysetListView):
     model = Invoice
     template_name = 'invoices/invoice_list.html'
     context_object_name = 'invoices'
+    keyset = ('-due_date', '-id')
+    list_select_related = ('contract__unit',)
+
+# ردّ انتهاء مهلة مجمع PDF؛ العميل يعيد المحاولة بعد قليل
+def render_timeout():
+    response = HttpResponse('تعذر توليد الملف في الوقت المحدد، حاول مرة أخرى', status=504, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = 30
+    return response
+
+# توليد فاتورة PDF؛ الملف يُولَّد في مجمع عمليات ويُحفظ حسب بصمة محتواه
+@login_required
+def generate_invoice_pdf(request, pk):
+    invoice = get_object_or_404(Invoice.objects.for_owner(request.user).select_related('contract__unit', 'contract__tenant__user'), pk=pk)
+    try:
+        path = pdf.invoice_pdf_path(invoice)
+    except pdf.RenderTimeout:
+        return render_timeout()
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename='invoice-%d.pdf' % invoice.pk, content_type='application/pdf')
+
+# تصدير فواتير شهر كامل في ملف ZIP يُبث أثناء التوليد
+@login_required
+def invoice_pdf_batch(request):
+    try:
+        period = parse_period(request.GET.get('period', ''))
+    except ValueError:
+        return JsonResponse({'errors': {'period': ['صيغة الفترة غير صحيحة، استخدم YYYY-MM']}}, status=400)
+    # الدفعات الكبيرة تُولد في طابور الخلفية، وتُتابع من صفحة المهمة
+    if request.GET.get('background'):
+        job = jobs.enqueue('invoice_pdf_batch', user=request.user, period=period.strftime('%Y-%m'))
+        return redirect('job_detail', job.pk)
+    files = pdf.invoice_batch(request.user, period)
+    # الملف الأول يُولد قبل إرسال الترويسات، فانتهاء المهلة مبكرا يعطي 504 لا أرشيفا مقطوعا
+    try:
+        first = next(files, None)
+    except pdf.RenderTimeout:
+        return render_timeout()
+    files = chain([first] if first else [], files)
+    response = StreamingHttpResponse(streaming.stream_zip(files), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="invoices-%s.zip"' % period.strftime('%Y-%m')
+    return response
+
+# تصدير العقود والفواتير والدفعات بصيغة CSV أو XLSX؛ الملف يُبث صفا بعد صف
+@login_required
+def export_view(request, name, fmt):
+    if name not in exports.EXPORTS or fmt not in exports.FORMATS:
+        raise Http404('نوع التصدير غير معروف')
+    form = ExportFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    response = StreamingHttpResponse(exports.stream(name, fmt, user=request.user, **form.cleaned_data), content_type=exports.FORMATS[fmt])
+    response['Content-Disposition'] = 'attachment; filename="%s"' % exports.filename(name, fmt)
+    return response
+
+# استيراد ملف CSV كامل بدلا من إضافة السجلات واحدا تلو الآخر
+@login_required
+def import_view(request):
+    form = ImportForm(request.POST or None, request.FILES or None)
+    result = None
+    if request.method == 'POST' and form.is_valid():
+        upload = form.cleaned_data['file']
+        if form.cleaned_data['background']:
+            job = jobs.enqueue(
+                'import_rows', user=request.user, name=form.cleaned_data['name'],
+                path=jobs.save_upload(upload), dry_run=form.cleaned_data['dry_run'],
+            )
+            return redirect('job_detail', job.pk)
+        defaults = {'user': request.user.username}
+        try:
+            result = imports.import_rows(
+                form.cleaned_data['name'], io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''),
+                defaults=defaults, dry_run=form.cleaned_data['dry_run'], user=request.user,
+            )
+        except (UnicodeDecodeError, ValueError) as exc:
+            form.add_error('file', str(exc))
+    return render(request, 'imports/import.html', {'form': form, 'result': result})
+
+# متابعة مهمة خلفية: الصفحة تتحدث حتى تنتهي المهمة، و status بصيغة JSON للاستعلام الدوري
+@login_required
+def job_detail(request, pk):
+    job = get_object_or_404(Job.objects.for_owner(request.user), pk=pk)
+    return render(request, 'jobs/job_detail.html', {'job': job, 'status': jobs.status(job)})
+
+@login_required
+def job_status(request, pk):
+    job = get_object_or_404(Job.objects.for_owner(request.user), pk=pk)
+    data = jobs.status(job)
+    if job.status == 'succeeded' and (job.result or {}).get('file'):
+        data['download'] = request.build_absolute_uri(reverse('job_download', args=[job.pk]))
+    return JsonResponse(data)
+
+@login_required
+def job_download(request, pk):
+    job = get_object_or_404(Job.objects.for_owner(request.user), pk=pk, status='succeeded')
+    name = (job.result or {}).get('file')
+    path = jobs.job_file(job.pk, name) if name else None
+    if not path or not os.path.exists(path):
+        raise Http404('لا يوجد ملف لهذه المهمة')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
+
+# سجل الدفعات
+class PaymentListView(OwnerScopedMixin, KeysetListView):
+    model = Payment
+    template_name = 'payments/payment_list.html'
+    context_object_name = 'payments'
+    keyset = ('-payment_date', '-id')
+    list_select_related = ('invoice__contract__unit',)
+
+# المتأخرات: أكبر المبالغ المتبقية لكل عقد أو مستأجر أو عقار من جدول الأرصدة مباشرة
+class ArrearsListView(OwnerScopedMixin, KeysetListView):
+    model = Balance
+    template_name = 'payments/arrears_list.html'
+    context_object_name = 'balances'
+    keyset = ('-outstanding', '-id')
+    list_select_related = ('contract__tenant__user', 'contract__unit', 'tenant__user', 'unit')
+
+    def get_queryset(self):
+        self.scope = self.request.GET.get('scope')
+        if self.scope not in dict(Balance.SCOPE_CHOICES):
+            self.scope = 'contract'
+        return super().get_queryset().filter(scope=self.scope, outstanding__gt=0)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['scope'] = self.scope
+        context['scopes'] = Balance.SCOPE_CHOICES
+        return context
 
 # إضافة دفعة جديدة
-class PaymentCreateView(CreateView):
+class PaymentCreateView(OwnerScopedMixin, CreateView):
     model = Payment
     form_class = PaymentForm
+    owner_choice_fields = ('invoice',)
     template_name = 'payments/payment_form.html'
     success_url = reverse_lazy('invoice_list')
 
+# توزيع تحويل بنكي واحد على فواتير العقد المفتوحة، الأقدم استحقاقا أولا
+@login_required
+def payment_allocate(request):
+    form = PaymentAllocationForm(request.POST or None)
+    form.fields['contract'].queryset = form.fields['contract'].queryset.for_owner(request.user)
+    if request.method == 'POST' and form.is_valid():
+        try:
+            reconciliation.allocate(form.cleaned_data['contract'], form.cleaned_data['amount'], form.cleaned_data['payment_method'])
+        except ValueError as exc:
+            form.add_error('amount', str(exc))
+        else:
+            return redirect('payment_list')
+    return render(request, 'payments/payment_allocate.html', {'form': form})
+
 # عرض قائمة طلبات الصيانة
-class MaintenanceRequestListView(ListView):
+class MaintenanceRequestListView(CachedListMixin, OwnerScopedMixin, RelatedListView):
     model = MaintenanceRequest
     template_name = 'maintenance_requests/maintenance_request_list.html'
     context_object_name = 'requests'
+    ordering = ['-requested_at', '-id']
+    list_select_related = ('unit',)
 
 # إضافة طلب صيانة جديد
-class MaintenanceRequestCreateView(CreateView):
+class MaintenanceRequestCreateView(OwnerScopedMixin, CreateView):
     model = MaintenanceRequest
     form_class = MaintenanceRequestForm
+    owner_choice_fields = ('unit',)
     template_name = 'maintenance_requests/maintenance_request_form.html'
     success_url = reverse_lazy('maintenance_request_list')
 
 # تعديل طلب صيانة
-class MaintenanceRequestUpdateView(UpdateView):
+class MaintenanceRequestUpdateView(OwnerScopedMixin, UpdateView):
     model = MaintenanceRequest
     form_class = MaintenanceRequestForm
+    owner_choice_fields = ('unit',)
     template_name = 'maintenance_requests/maintenance_request_form.html'
     success_url = reverse_lazy('maintenance_request_list')
 
 # حذف طلب صيانة
-class MaintenanceRequestDeleteView(DeleteView):
+class MaintenanceRequestDeleteView(OwnerScopedMixin, DeleteView):
     model = MaintenanceRequest
     template_name = 'maintenance_requests/maintenance_request_confirm_delete.html'
     success_url = reverse_lazy('maintenance_request_list')
 
-def generate_reports(request):
-    # 1. الايرادات
-    total_revenue = Payment.objects.aggregate(total=Sum('amount_paid'))['total'] or 0
-
-    # 2. المصروفات (افتراض ان المصروفات تاتي من طلبات الصيانة)
-    maintenance_expenses = Property.objects.annotate(total_expenses=Sum('maintenance_requests__expense_amount')).aggrgate(total=Sum('total_expenses'))['total'] or 0
-
-    # 3. معدلات الإشغال
-    total_unit = Property.objects.count()
-    occupied_units = Property.objects.filter(status='rented').count()
-    occupancy_rate = (occupied_units / total_unit) * 100 if total_unit > 0 else 0
-
-    # بيانات إضافية: تحليل الايرادات عبر الاشهر
-    invoices = Invoice.objects.values('invoice_date', 'amount')
-    df = pd.DataFrame(invoices)
-    if not df.empty:
-        df['invoice_date'] = pd.to_datetime(df['invoice_date'])
-        df['month'] = df['invoice_date'].dt.to_period('M')
-        revenue_by_month = df.groupby('month')['amount'].sum().reset_index()
-    else:
-        revenue_by_month = pd.DataFrame(columns=['month', 'amount'])
-    # إنشاء الرسم البياني باستخدام Plotly
-    if not revenue_by_month.empty:
-        fig = px.bar(revenue_by_month, x='month', y='amount', title="إيرادات الشهرية", labels={'month': 'الشهر', 'amount': 'الايرادات'},)
-        revenue_chart = plot(fig, output_type='div')
-    else:
-        revenue_chart = "<p>لا يوجد بيانات للايرادات الشهرية.</p>"
+# خيارات العقار والمستأجر في نماذج تصفية التقارير من سجلات المالك فقط، كما في توزيع الدفعات
+def scope_filter_choices(form, user):
+    form.fields['unit'].queryset = form.fields['unit'].queryset.for_owner(user)
+    # المستأجرون مشتركون بين الملاك، فيُعرض منهم من له عقد في عقارات المالك
+    if not user.is_superuser:
+        form.fields['tenant'].queryset = form.fields['tenant'].queryset.filter(pk__in=RentalContract.objects.for_owner(user).values('tenant'))
+    return form
+
+# التقارير: مكتبات التحليل تُحمّل داخل rentals.reports عند أول طلب فقط
+@login_required
+async def generate_reports(request):
+    user = await request.auser()
+    form = scope_filter_choices(RevenueFilterForm(request.GET or None), user)
+    # التحقق من العقار والمستأجر وعرض النموذج يستعلمان قاعدة البيانات، فيعملان خارج حلقة الأحداث
+    filters = form.cleaned_data if await sync_to_async(form.is_valid)() else None
+    context = await reports.abuild_report_context(filters, user)
+    context['filter_form'] = form
+    return await sync_to_async(render)(request, 'reports/report.html', context)
+
+# سلسلة الإيرادات الزمنية بصيغة JSON
+@login_required
+def revenue_series_view(request):
+    form = scope_filter_choices(RevenueFilterForm(request.GET), request.user)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    buckets = reports.revenue_series(user=request.user, **form.cleaned_data)
+    return JsonResponse({'period': form.cleaned_data['period'], 'buckets': buckets})
+
+# الإشغال الشهري من الجدول المحسوب مسبقا، أو عدد العقارات المشغولة يوميا (granularity=day) حتى سنة
+@login_required
+def occupancy_series_view(request):
+    form = scope_filter_choices(RevenueFilterForm(request.GET), request.user)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    filters = reports.occupancy_filters(dict(form.cleaned_data, user=request.user))
+    if request.GET.get('granularity') == 'day':
+        if (filters['end_date'] - filters['start_date']).days > 366:
+            return JsonResponse({'errors': {'end_date': ['الحد الأقصى للسلسلة اليومية سنة واحدة']}}, status=400)
+        timeline = occupancy.daily_timeline(filters['start_date'], filters['end_date'], user=request.user, unit=filters['unit'])
+        return JsonResponse({'days': [{'date': day, 'occupied_units': count} for day, count in timeline]})
+    series = occupancy.monthly_series(**filters)
+    return JsonResponse({'months': series, 'average_vacancy_days': occupancy.average_vacancy_days(series)})
+
+# توقع الدخل من العقود للأشهر القادمة ومقارنته بالدفعات المستلمة
+@login_required
+def forecast_view(request):
+    form = scope_filter_choices(ForecastForm(request.GET or None), request.user)
+    result = reports.cash_flow_forecast(form.cleaned_data if form.is_valid() else None, request.user)
+    context = {'filter_form': form, 'forecast': result, 'forecast_chart': reports.forecast_chart(result)}
+    return render(request, 'reports/forecast.html', context)
 
-    # تمرير البيانات إلى القالب
-        context = {
-            'total_revenue': total_revenue,
-            'maintenance_expenses': maintenance_expenses,
-            'occupancy_rate': occupancy_rate,
-            'revenue_chart': revenue_chart,
-        }
-        return render(request, 'reports/reports.html', context)
+@login_required
+def forecast_series_view(request):
+    form = scope_filter_choices(ForecastForm(request.GET), request.user)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    return JsonResponse(reports.cash_flow_forecast(form.cleaned_data, request.user))
+
+# قياسات الأداء بصيغة Prometheus؛ للموظفين أو لمن يرسل RENTALS_METRICS_TOKEN في ترويسة Authorization
+def metrics_view(request):
+    token = getattr(settings, 'RENTALS_METRICS_TOKEN', None)
+    authorized = request.user.is_staff or (token and request.headers.get('Authorization') == 'Bearer %s' % token)
+    if not authorized:
+        raise Http404()
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# البحث النصي الموحد في العقارات والمستأجرين وطلبات الصيانة والمستندات
+@login_required
+def search_view(request):
+    query = request.GET.get('q', '')
+    kind = request.GET.get('kind') or None
+    if kind not in fulltext.SOURCES:
+        kind = None
+    context = {
+        'query': query,
+        'kind': kind,
+        'kinds': [(name, source.label) for name, source in fulltext.SOURCES.items()],
+        'results': fulltext.search(query, kind=kind, user=request.user),
+    }
+    return render(request, 'search/search.html', context)
 
 # عرض قائمة المستندات
-class DocumentListView(ListView):
+class DocumentListView(CachedListMixin, LoginRequiredMixin, RelatedListView):
     model = Document
     template_name = 'documents/document_list.html'
     context_object_name = 'documents'
+    ordering = ['-updated_at', '-id']
+
+# تنزيل مستند؛ المتصفح يستأنف التنزيل بـ Range ويعيد استخدام نسخته بـ ETag
+@login_required
+def document_download(request, pk):
+    document = get_object_or_404(Document, pk=pk)
+    filename = document.title + os.path.splitext(document.file.name)[1]
+    return downloads.serve(request, document.file.storage, document.file.name, filename)
+
+# الصورة المصغرة للمستند، تظهر في القائمة بدلا من فتح الملف كاملا
+@login_required
+def document_thumbnail(request, pk):
+    document = get_object_or_404(Document, pk=pk)
+    if not document.file:
+        raise Http404('لا يوجد ملف')
+    storage = document.file.storage
+    return downloads.serve(request, storage, storage.thumbnail_name(document.file.name), document.title + '.jpg')
 
 # إضافة مستند جديد
-class DocumentCreateView(CreateView):
+class DocumentCreateView(LoginRequiredMixin, CreateView):
     model = Document
     form_class = DocumentForm
     template_name = 'documents/document_form.html'
     success_url = reverse_lazy('document_list')
 
 # تعديل مستند
-class DocumentUpdateView(UpdateView):
+class DocumentUpdateView(LoginRequiredMixin, UpdateView):
     model = Document
     form_class = DocumentForm
     template_name = 'documents/document_form.html'
     success_url = reverse_lazy('document_list')
 
 # حذف مستند
-class DocumentDeleteView(DeleteView):
+class DocumentDeleteView(LoginRequiredMixin, DeleteView):
     model = Document
     template_name = 'documents/document_confirm_delete.html'
     success_url = reverse_lazy('document_list')
\ No newline at end of file